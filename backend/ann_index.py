@@ -0,0 +1,115 @@
+import argparse
+import os
+import pickle
+import time
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+
+ANN_INDEX_PATH = os.getenv("ANN_INDEX_PATH", "recipe_ann_index.pkl")
+DEFAULT_COMPONENTS = 128
+# Lists scanned per query. Higher means better recall and more latency.
+DEFAULT_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+
+def _normalize(x):
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return x / norms
+
+class AnnIndex:
+    """
+    Dense LSA embeddings of the TF-IDF rows with an IVF (inverted file) index on top.
+    Rows are grouped by their nearest k-means centroid; a query scans only the
+    `nprobe` closest lists. Uses hnswlib instead when it is installed and asked for.
+    """
+
+    def __init__(self, svd, embeddings, centroids=None, order=None, offsets=None, hnsw=None):
+        self.svd = svd
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+        self.hnsw = hnsw
+        self.n_rows = embeddings.shape[0]
+
+    @property
+    def backend(self):
+        return "hnsw" if self.hnsw is not None else "ivf"
+
+    def embed(self, query_tfidf):
+        return _normalize(self.svd.transform(query_tfidf).astype(np.float32))
+
+    def search(self, query_tfidf, k=50, nprobe=DEFAULT_NPROBE):
+        """Returns (row indices, cosine scores in embedding space) for the candidates scanned."""
+        q = self.embed(query_tfidf)[0]
+        if self.hnsw is not None:
+            self.hnsw.set_ef(max(k, nprobe * 16))
+            labels, distances = self.hnsw.knn_query(q, k=min(k, self.n_rows))
+            return labels[0].astype(np.int64), (1 - distances[0]).astype(np.float32)
+
+        nprobe = max(1, min(nprobe, len(self.centroids)))
+        nearest_lists = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        candidates = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in nearest_lists])
+        return candidates, self.embeddings[candidates] @ q
+
+def build_ann_index(tfidf_matrix, n_components=DEFAULT_COMPONENTS, n_lists=None, backend="ivf", seed=42):
+    n_rows, n_terms = tfidf_matrix.shape
+    n_components = max(2, min(n_components, n_terms - 1, n_rows - 1))
+    svd = TruncatedSVD(n_components=n_components, random_state=seed)
+    embeddings = _normalize(svd.fit_transform(tfidf_matrix).astype(np.float32))
+
+    if backend == "hnsw":
+        import hnswlib
+        hnsw = hnswlib.Index(space="cosine", dim=n_components)
+        hnsw.init_index(max_elements=n_rows, ef_construction=200, M=16, random_seed=seed)
+        hnsw.add_items(embeddings, np.arange(n_rows))
+        return AnnIndex(svd, embeddings, hnsw=hnsw)
+
+    n_lists = n_lists or max(1, int(np.sqrt(n_rows)))
+    kmeans = MiniBatchKMeans(n_clusters=n_lists, random_state=seed, batch_size=4096, n_init=3)
+    assignments = kmeans.fit_predict(embeddings)
+    centroids = _normalize(kmeans.cluster_centers_.astype(np.float32))
+    order = np.argsort(assignments, kind="stable").astype(np.int64)
+    offsets = np.searchsorted(assignments[order], np.arange(n_lists + 1)).astype(np.int64)
+    return AnnIndex(svd, embeddings, centroids=centroids, order=order, offsets=offsets)
+
+def save_ann_index(index, path=ANN_INDEX_PATH):
+    if index.hnsw is not None:
+        index.hnsw.save_index(path + ".hnsw")
+        hnsw, index.hnsw = index.hnsw, None
+        try:
+            with open(path, 'wb') as f:
+                pickle.dump({"index": index, "hnsw_path": path + ".hnsw"}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        finally:
+            index.hnsw = hnsw
+        return
+    with open(path, 'wb') as f:
+        pickle.dump({"index": index, "hnsw_path": None}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+def load_ann_index(path=ANN_INDEX_PATH):
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+    index = data["index"]
+    if data.get("hnsw_path"):
+        import hnswlib
+        index.hnsw = hnswlib.Index(space="cosine", dim=index.embeddings.shape[1])
+        index.hnsw.load_index(data["hnsw_path"], max_elements=index.n_rows)
+    return index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the dense ANN index for the recipe TF-IDF model.")
+    parser.add_argument("--model", default="recipe_recommender_model.pkl")
+    parser.add_argument("--out", default=ANN_INDEX_PATH)
+    parser.add_argument("--components", type=int, default=DEFAULT_COMPONENTS)
+    parser.add_argument("--lists", type=int, default=None, help="IVF lists (default sqrt(n))")
+    parser.add_argument("--backend", choices=["ivf", "hnsw"], default="ivf")
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        matrix = pickle.load(f)['tfidf_matrix']
+    t0 = time.perf_counter()
+    index = build_ann_index(matrix, args.components, args.lists, args.backend)
+    save_ann_index(index, args.out)
+    print(f"Built {index.backend} index over {index.n_rows} recipes ({index.embeddings.shape[1]} dims) "
+          f"in {time.perf_counter() - t0:.1f}s -> {args.out}")
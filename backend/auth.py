@@ -24,6 +24,7 @@ class UserInDB(BaseModel):
     is_admin: bool = False
     profile: Dict[str, Any] = {}
     interactions: List[Dict[str, Any]] = []
+    preference: Dict[str, Any] = {} # incrementally updated by /interaction, see personalization.py
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -42,6 +43,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return user_from_token(token)
+
+def user_from_token(token: str):
+    """Blocking (one find_one); outside a FastAPI dependency, call it from a worker thread."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -69,5 +74,6 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         hashed_password=user_doc["hashed_password"],
         is_admin=user_doc.get("is_admin", False),
         profile=user_doc.get("profile", {}),
-        interactions=user_doc.get("interactions", [])
+        interactions=user_doc.get("interactions", []),
+        preference=user_doc.get("preference", {})
     )
@@ -0,0 +1,83 @@
+"""
+Recall@k and latency of ANN retrieval against the exact scoring path.
+
+    cd backend
+    python -m benchmarks.bench_ann --recipes 100000 --probes 1 2 4 8 16 32 --out bench_ann.json
+
+Recall is measured on the final combined ranking (ingredients + time), i.e. the share
+of the exact path's top-k recipes that the ANN path also returns in its top-k. Run with
+ANN_DENSE_WEIGHT=0 to isolate candidate-generation recall from the synonym blend.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from ann_index import build_ann_index
+from benchmarks.run import BENCH_DIR, git_commit, load_app, sample_queries, summarize
+from benchmarks.synthetic import write_model
+
+
+def recall_at_k(exact, approx, k):
+    return len(set(exact[:k]) & set(approx[:k])) / k
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="ANN recall/latency benchmark.")
+    parser.add_argument("--recipes", type=int, default=100000)
+    parser.add_argument("--components", type=int, default=128)
+    parser.add_argument("--backend", choices=["ivf", "hnsw"], default="ivf")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--out", default="bench_ann.json")
+    args = parser.parse_args(argv)
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    model_path = os.path.join(BENCH_DIR, f"bench_model_{args.recipes}.pkl")
+    if not os.path.exists(model_path):
+        write_model(model_path, args.recipes)
+    main = load_app(model_path)
+
+    t0 = time.perf_counter()
+    main.ann_index = build_ann_index(main.tfidf_matrix, args.components, backend=args.backend)
+    build_seconds = time.perf_counter() - t0
+    print(f"Built {main.ann_index.backend} index in {build_seconds:.1f}s")
+
+    queries = [[main.clean_ingredient_text(i) for i in q.split(',')] for q in sample_queries(args.queries)]
+    exact_top, exact_ms = [], []
+    for q in queries:
+        start = time.perf_counter()
+        combined = main.calculate_similarity(q, 20, 30)
+        exact_top.append(np.argsort(-combined, kind="stable")[:50])
+        exact_ms.append((time.perf_counter() - start) * 1000)
+
+    report = {"meta": {"commit": git_commit(), "recipes": args.recipes, "components": args.components,
+                       "backend": main.ann_index.backend, "build_seconds": round(build_seconds, 2),
+                       "dense_weight": main.ANN_DENSE_WEIGHT},
+              "exact": summarize(exact_ms), "ann": {}}
+    print(f"exact: median {report['exact']['median_ms']:.3f} ms")
+
+    for nprobe in args.probes:
+        recalls9, recalls50, latencies = [], [], []
+        for q, exact in zip(queries, exact_top):
+            start = time.perf_counter()
+            candidates, combined = main.calculate_similarity_ann(q, 20, 30, top_n=50, nprobe=nprobe)
+            approx = candidates[np.argsort(-combined, kind="stable")[:50]]
+            latencies.append((time.perf_counter() - start) * 1000)
+            recalls9.append(recall_at_k(exact, approx, 9))
+            recalls50.append(recall_at_k(exact, approx, 50))
+        stats = summarize(latencies)
+        stats.update({"recall@9": round(float(np.mean(recalls9)), 4), "recall@50": round(float(np.mean(recalls50)), 4)})
+        report["ann"][str(nprobe)] = stats
+        print(f"nprobe={nprobe:3d}: recall@9 {stats['recall@9']:.3f}  recall@50 {stats['recall@50']:.3f}  "
+              f"median {stats['median_ms']:.3f} ms")
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
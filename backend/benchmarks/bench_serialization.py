@@ -0,0 +1,109 @@
+"""
+Bytes on the wire and serialisation time for the large JSON responses.
+
+    cd backend
+    python -m benchmarks.bench_serialization --recipes 10000 --out bench_serialization.json
+
+Payloads are real /recommend results (9 hydrated recipes with instructions and missing
+ingredient links) and a synthetic /admin/users listing. Each is encoded with the old
+path (jsonable_encoder + json.dumps), Pydantic's dump_json and json_dumps (orjson when
+installed), in full and with a list-view field selection, then compressed with gzip and,
+when the brotli module is installed, brotli.
+"""
+import argparse
+import json
+import os
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import compression
+from benchmarks.run import BENCH_DIR, git_commit, load_app, measure, sample_queries
+from benchmarks.synthetic import write_model
+from serialization import json_dumps, orjson, select_fields
+
+LIST_VIEW_FIELDS = ["id", "name", "translated_name", "match_score", "prep_time", "cook_time", "cuisine", "diet", "youtube_link"]
+
+
+def wire_sizes(body):
+    sizes = {"raw": len(body), "gzip": len(compression.compress(body, "gzip"))}
+    if compression.brotli is not None:
+        sizes["br"] = len(compression.compress(body, "br"))
+    return sizes
+
+
+def admin_users_payload(n_users):
+    return [{"email": f"user{i}@example.com", "id": f"{i:024x}", "is_admin": i % 50 == 0, "joined_at": "2024-01-01",
+             "total_interactions": (i * 7) % 120, "total_likes": (i * 3) % 40} for i in range(n_users)]
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Serialisation and compression benchmark.")
+    parser.add_argument("--recipes", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--users", type=int, default=2000, help="Users in the /admin/users payload")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--out", default="bench_serialization.json")
+    args = parser.parse_args(argv)
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    model_path = os.path.join(BENCH_DIR, f"bench_model_{args.recipes}.pkl")
+    if not os.path.exists(model_path):
+        write_model(model_path, args.recipes)
+    main = load_app(model_path)
+
+    payloads = []
+    for query in sample_queries(args.queries):
+        request = main.RecipeRequest(ingredients=query, prep_time=20, cook_time=30)
+        recipes, _ = main.rank_recommendations(request, main.parse_ingredient_query(query), None)
+        for recipe in recipes:
+            recipe.youtube_link = main.get_youtube_link(recipe.name)
+        payloads.append(recipes)
+    adapter = TypeAdapter(List[main.Recipe])
+    users = admin_users_payload(args.users)
+
+    def cycle(fn):
+        state = {"i": 0}
+        def run():
+            state["i"] = (state["i"] + 1) % len(payloads)
+            return fn(payloads[state["i"]])
+        return run
+
+    encoders = {
+        "jsonable_encoder+json": lambda recipes: json.dumps(jsonable_encoder(recipes)).encode(),
+        "pydantic_dump_json": lambda recipes: adapter.dump_json(recipes),
+        "json_dumps": lambda recipes: json_dumps(select_fields(recipes, None)),
+        "json_dumps_list_view": lambda recipes: json_dumps(select_fields(recipes, LIST_VIEW_FIELDS)),
+    }
+    report = {"meta": {"commit": git_commit(), "recipes": args.recipes, "orjson": orjson is not None,
+                       "brotli": compression.brotli is not None}, "recommend": {}, "admin_users": {}}
+
+    print(f"/recommend ({len(payloads[0])} recipes per response)")
+    for name, encode in encoders.items():
+        stats = measure(cycle(encode), repeat=args.repeat)
+        sizes = {k: int(sum(wire_sizes(encode(p))[k] for p in payloads) / len(payloads)) for k in wire_sizes(encode(payloads[0]))}
+        report["recommend"][name] = {"encode": stats, "bytes": sizes}
+        print(f"  {name:24s} median {stats['median_ms']:.3f} ms  bytes {sizes}")
+
+    for comp in ["gzip"] + (["br"] if compression.brotli is not None else []):
+        body = json_dumps(select_fields(payloads[0], None))
+        stats = measure(lambda: compression.compress(body, comp), repeat=args.repeat)
+        report["recommend"][f"compress_{comp}"] = stats
+        print(f"  compress {comp:15s} median {stats['median_ms']:.3f} ms")
+
+    print(f"/admin/users ({args.users} users)")
+    for name, encode in {"jsonable_encoder+json": lambda: json.dumps(jsonable_encoder(users)).encode(),
+                         "json_dumps": lambda: json_dumps(users)}.items():
+        stats = measure(encode, repeat=max(10, args.repeat // 10))
+        sizes = wire_sizes(encode())
+        report["admin_users"][name] = {"encode": stats, "bytes": sizes}
+        print(f"  {name:24s} median {stats['median_ms']:.3f} ms  bytes {sizes}")
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
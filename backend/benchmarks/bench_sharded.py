@@ -0,0 +1,84 @@
+"""
+Single-request latency of the sharded exact scorer from 1 to N shards.
+
+    cd backend
+    python -m benchmarks.bench_sharded --recipes 100000 --shards 1 2 4 8 --out bench_sharded.json
+
+Each shard count is timed on the same queries as the single-threaded calculate_similarity
+path, and its top-50 is checked against that path (agreement should be 1.0; ties may be
+ordered differently). Speed-up is bounded by the cores actually available, reported in meta.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.run import BENCH_DIR, git_commit, load_app, sample_queries, summarize
+from benchmarks.synthetic import write_model
+from sharded_scorer import ShardedScorer
+
+
+def overlap_at_k(exact, other, k):
+    return len(set(exact[:k]) & set(other[:k])) / k
+
+
+def main_cli(argv=None):
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Sharded scoring scaling benchmark.")
+    parser.add_argument("--recipes", type=int, default=100000)
+    parser.add_argument("--shards", type=int, nargs="+",
+                        default=sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1))) or [1])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top", type=int, default=50)
+    parser.add_argument("--out", default="bench_sharded.json")
+    args = parser.parse_args(argv)
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    model_path = os.path.join(BENCH_DIR, f"bench_model_{args.recipes}.pkl")
+    if not os.path.exists(model_path):
+        write_model(model_path, args.recipes)
+    main = load_app(model_path)
+
+    queries = [[main.clean_ingredient_text(i) for i in q.split(',')] for q in sample_queries(args.queries)]
+    exact_top, exact_ms = [], []
+    for q in queries:
+        start = time.perf_counter()
+        combined = main.calculate_similarity(q, 20, 30)
+        exact_top.append(np.argsort(-combined, kind="stable")[:args.top])
+        exact_ms.append((time.perf_counter() - start) * 1000)
+
+    report = {"meta": {"commit": git_commit(), "recipes": args.recipes, "cpu_count": cores,
+                       "matrix_dtype": str(main.tfidf_matrix.dtype), "top": args.top},
+              "exact": summarize(exact_ms), "sharded": {}}
+    print(f"exact (calculate_similarity): median {report['exact']['median_ms']:.3f} ms")
+
+    for n_shards in args.shards:
+        t0 = time.perf_counter()
+        scorer = ShardedScorer(main.tfidf_matrix, main.prep_times, main.cook_times,
+                               main.max_prep_time, main.max_cook_time, n_shards)
+        build_seconds = time.perf_counter() - t0
+        latencies, agreement = [], []
+        for q in queries[:3]:
+            scorer.top_k(main.build_query_vector(q), 20, 30, args.top)  # warm the pool
+        for q, exact in zip(queries, exact_top):
+            start = time.perf_counter()
+            indices, _ = scorer.top_k(main.build_query_vector(q), 20, 30, args.top)
+            latencies.append((time.perf_counter() - start) * 1000)
+            agreement.append(overlap_at_k(exact, indices, args.top))
+        scorer.shutdown()
+        stats = summarize(latencies)
+        stats.update({"build_seconds": round(build_seconds, 3), f"agreement@{args.top}": round(float(np.mean(agreement)), 4),
+                      "speedup_vs_exact": round(report["exact"]["median_ms"] / stats["median_ms"], 2)})
+        report["sharded"][str(n_shards)] = stats
+        print(f"shards={n_shards:3d}: median {stats['median_ms']:.3f} ms  p95 {stats['p95_ms']:.3f} ms  "
+              f"x{stats['speedup_vs_exact']:.2f}  agreement@{args.top} {stats[f'agreement@{args.top}']:.4f}")
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,40 @@
+"""
+Compares two benchmark result files stage by stage.
+
+    python -m benchmarks.compare baseline.json candidate.json
+"""
+import argparse
+import json
+
+
+def compare(baseline, candidate, metric="median_ms", threshold=1.10):
+    regressions = []
+    for size, stages in candidate["results"].items():
+        base_stages = baseline["results"].get(size, {})
+        print(f"\n== {size} recipes ({baseline['meta']['commit']} -> {candidate['meta']['commit']}) ==")
+        for stage, stats in stages.items():
+            if stage not in base_stages:
+                print(f"  {stage:28s} new: {stats[metric]:.3f} ms")
+                continue
+            before, after = base_stages[stage][metric], stats[metric]
+            ratio = after / before if before else float("inf")
+            flag = "  REGRESSION" if ratio > threshold else ""
+            print(f"  {stage:28s} {before:9.3f} -> {after:9.3f} ms  x{ratio:.2f}{flag}")
+            if flag:
+                regressions.append((size, stage, ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--metric", default="median_ms")
+    parser.add_argument("--threshold", type=float, default=1.10, help="Slowdown ratio reported as a regression")
+    args = parser.parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    regressions = compare(baseline, candidate, args.metric, args.threshold)
+    raise SystemExit(1 if regressions else 0)
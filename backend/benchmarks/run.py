@@ -0,0 +1,184 @@
+"""
+Benchmarks for the recommendation hot path on synthetic catalogs.
+
+    cd backend
+    python -m benchmarks.run --sizes 10000 100000 --out bench_results.json
+
+Each stage (clean_ingredient_text, calculate_similarity, get_recommendations_logic,
+apply_profile_filters, process_recipe_row) is timed on its own, then /recommend is
+timed end to end through an in-process ASGI client. YouTube search and Ollama are
+stubbed so the numbers only measure our code.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from benchmarks.synthetic import BASE_INGREDIENTS, write_model
+
+BENCH_DIR = os.getenv("BENCH_DIR", "bench_data")
+
+
+def measure(fn, repeat=50, warmup=3):
+    """Runs fn repeatedly and returns latency statistics in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "min_ms": round(samples[0], 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def sample_queries(n, seed=7):
+    rng = random.Random(seed)
+    return [', '.join(rng.sample(BASE_INGREDIENTS, rng.randint(3, 6))) for _ in range(n)]
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+# --- App wiring ---
+
+def load_app(model_path):
+    """Imports main against the given model and replaces external services with stubs."""
+    os.environ["MODEL_PATH"] = model_path
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    import main
+    from auth import UserInDB
+
+    if main.MODEL_PATH != model_path:
+        main.MODEL_PATH = model_path
+        main.load_model()
+
+    main.get_youtube_link = lambda query: "https://www.youtube.com/watch?v=benchmark"
+    main.call_ollama = lambda prompt: {"message": {"content": json.dumps({
+        "name": "Benchmark Curry", "ingredients": "onion, tomato", "instructions": ["Cook."],
+        "prep_time": 10, "cook_time": 20, "servings": 2,
+    })}}
+    bench_user = UserInDB(email="bench@example.com", hashed_password="x",
+                          profile={"allergies": ["peanut"], "dietary_preferences": ["Vegetarian"]})
+    main.app.dependency_overrides[main.get_current_user] = lambda: bench_user
+    return main
+
+
+def bench_stages(main, queries, repeat):
+    results = {}
+    it = iter(range(10 ** 9))
+
+    def next_query():
+        return queries[next(it) % len(queries)]
+
+    results["clean_ingredient_text"] = measure(lambda: main.clean_ingredient_text(next_query()), repeat=repeat * 4)
+
+    def cleaned():
+        return [main.clean_ingredient_text(i) for i in next_query().split(',')]
+
+    prepared = [cleaned() for _ in range(len(queries))]
+    results["calculate_similarity"] = measure(
+        lambda: main.calculate_similarity(prepared[next(it) % len(prepared)], 20, 30), repeat=repeat)
+    results["get_recommendations_logic"] = measure(
+        lambda: main.get_recommendations_logic(prepared[next(it) % len(prepared)], 20, 30, top_n=50), repeat=repeat)
+
+    candidates = main.get_recommendations_logic(prepared[0], 20, 30, top_n=50)
+    constraints = {"allergies": ["peanut"], "dietary_preferences": ["Vegetarian"]}
+    results["apply_profile_filters"] = measure(lambda: main.apply_profile_filters(candidates, constraints), repeat=repeat)
+
+    rows = [row for _, row in candidates.head(9).iterrows()]
+    results["process_recipe_row"] = measure(
+        lambda: main.process_recipe_row(rows[next(it) % len(rows)], prepared[0]), repeat=repeat * 2)
+    return results
+
+
+def bench_endpoint(main, queries, repeat):
+    import httpx
+
+    async def run():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def call(query):
+                response = await client.post("/recommend", json={"ingredients": query, "prep_time": 20, "cook_time": 30})
+                response.raise_for_status()
+
+            for query in queries[:3]:
+                await call(query)
+            samples = []
+            for i in range(repeat):
+                start = time.perf_counter()
+                await call(queries[i % len(queries)])
+                samples.append((time.perf_counter() - start) * 1000)
+            return summarize(samples)
+
+    return asyncio.run(run())
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation hot path.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000])
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--skip-endpoint", action="store_true")
+    parser.add_argument("--out", default="bench_results.json")
+    args = parser.parse_args(argv)
+
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    queries = sample_queries(args.queries)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+
+    for size in args.sizes:
+        model_path = os.path.join(BENCH_DIR, f"bench_model_{size}.pkl")
+        if not os.path.exists(model_path):
+            write_model(model_path, size)
+        main = load_app(model_path)
+        print(f"\n== {size} recipes ==")
+        results = bench_stages(main, queries, args.repeat)
+        if not args.skip_endpoint:
+            results["recommend_endpoint"] = bench_endpoint(main, queries, args.repeat)
+        for stage, stats in results.items():
+            print(f"  {stage:28s} median {stats['median_ms']:9.3f} ms   p95 {stats['p95_ms']:9.3f} ms")
+        report["results"][str(size)] = results
+
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nWrote {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,102 @@
+"""
+Synthetic recipe catalog and TF-IDF model with the same shape as recipe_recommender_model.pkl.
+
+    python -m benchmarks.synthetic --recipes 100000 --out bench_model_100k.pkl
+"""
+import argparse
+import pickle
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+BASE_INGREDIENTS = [
+    "onion", "tomato", "potato", "garlic", "ginger", "green chilli", "red chilli", "turmeric", "cumin", "coriander",
+    "mustard", "curry", "garam masala", "paneer", "chicken", "mutton", "fish", "prawns", "egg", "milk", "curd",
+    "ghee", "butter", "cream", "rice", "basmati rice", "wheat flour", "besan", "sooji", "poha", "toor dal",
+    "moong dal", "chana dal", "urad dal", "rajma", "chickpeas", "spinach", "methi", "cabbage", "cauliflower",
+    "brinjal", "bhindi", "capsicum", "carrot", "beans", "peas", "cucumber", "lemon", "tamarind", "jaggery",
+    "sugar", "coconut", "cashew", "almonds", "raisins", "cardamom", "cinnamon", "cloves", "bay leaf", "asafoetida",
+    "mint", "pasta", "cheese", "bread", "mushroom", "corn", "spring onion", "soy sauce", "vinegar", "honey",
+]
+CUISINES = ["Indian", "South Indian Recipes", "North Indian Recipes", "Bengali Recipes", "Continental", "Italian Recipes", "Chinese"]
+COURSES = ["Lunch", "Dinner", "Breakfast", "Snack", "Side Dish", "Dessert", "Appetizer"]
+DIETS = ["Vegetarian", "Non Vegeterian", "Eggetarian", "Vegan", "High Protein Vegetarian", "Diabetic Friendly"]
+QUANTITIES = ["1 cup", "2 tablespoons", "1 teaspoon", "200 grams", "2", "1/2 cup", "a pinch of", "3 cloves"]
+
+
+def ingredient_vocabulary(size, rng):
+    """The base pantry plus made-up ingredient names, so vocabulary grows with the catalog like a real one."""
+    extra = max(0, size - len(BASE_INGREDIENTS))
+    syllables = np.array(["ka", "ri", "mo", "ta", "pa", "shi", "lo", "na", "de", "vu", "ba", "zi"])
+    made_up = [''.join(rng.choice(syllables, 3)) + str(i) for i in range(extra)]
+    return BASE_INGREDIENTS + made_up
+
+
+def generate_catalog(n_recipes, seed=42, vocab_size=None, min_ingredients=5, max_ingredients=14):
+    """Returns a DataFrame with the catalog columns the API reads. Ingredient popularity is Zipf-distributed."""
+    rng = np.random.default_rng(seed)
+    vocab_size = vocab_size or int(min(20000, 200 + n_recipes ** 0.6))
+    vocab = ingredient_vocabulary(vocab_size, rng)
+    weights = 1.0 / np.arange(1, len(vocab) + 1) ** 1.1
+    weights /= weights.sum()
+
+    counts = rng.integers(min_ingredients, max_ingredients + 1, n_recipes)
+    picks = rng.choice(len(vocab), size=int(counts.sum()), p=weights)
+    quantities = rng.choice(len(QUANTITIES), size=len(picks))
+    ingredients, docs = [], []
+    offset = 0
+    for count in counts:
+        idx = picks[offset:offset + count]
+        q = quantities[offset:offset + count]
+        offset += count
+        ingredients.append(', '.join(f"{QUANTITIES[qi]} {vocab[i]}" for qi, i in zip(q, idx)))
+        docs.append(' '.join(vocab[i] for i in idx))
+
+    srno = np.arange(1, n_recipes + 1)
+    df = pd.DataFrame({
+        "Srno": srno,
+        "RecipeName": [f"Synthetic Recipe {i}" for i in srno],
+        "TranslatedRecipeName": [f"Synthetic Recipe {i}" for i in srno],
+        "Ingredients": ingredients,
+        "PrepTimeInMins": rng.integers(5, 60, n_recipes),
+        "CookTimeInMins": rng.integers(5, 120, n_recipes),
+        "TotalTimeInMins": 0,
+        "Servings": rng.integers(1, 8, n_recipes),
+        "Cuisine": rng.choice(CUISINES, n_recipes),
+        "Course": rng.choice(COURSES, n_recipes),
+        "Diet": rng.choice(DIETS, n_recipes),
+        "Instructions": "Heat the oil in a pan. Add the onions and saute. Add the remaining ingredients and cook until done. Serve hot.",
+        "URL": [f"https://example.com/recipe/{i}" for i in srno],
+    })
+    df["TotalTimeInMins"] = df["PrepTimeInMins"] + df["CookTimeInMins"]
+    return df, docs
+
+
+def build_model(df, docs):
+    """Fits the vectorizer on the already-clean synthetic documents and returns the pickle payload."""
+    vectorizer = TfidfVectorizer()
+    tfidf_matrix = vectorizer.fit_transform(docs).tocsr()
+    return {"tfidf_vectorizer": vectorizer, "tfidf_matrix": tfidf_matrix, "dataframe": df}
+
+
+def write_model(path, n_recipes, seed=42):
+    t0 = time.perf_counter()
+    df, docs = generate_catalog(n_recipes, seed=seed)
+    model_data = build_model(df, docs)
+    with open(path, 'wb') as f:
+        pickle.dump(model_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    matrix = model_data["tfidf_matrix"]
+    print(f"Wrote {path}: {n_recipes} recipes, {matrix.shape[1]} terms, {matrix.nnz} non-zeros "
+          f"in {time.perf_counter() - t0:.1f}s")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--recipes", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+    write_model(args.out or f"bench_model_{args.recipes}.pkl", args.recipes, args.seed)
@@ -0,0 +1,178 @@
+"""
+Shrinks the pickled TF-IDF model and reports what it costs in ranking quality.
+
+    python compact_model.py --model recipe_recommender_model.pkl --out recipe_recommender_model.compact.pkl \
+        --dtype float32 --min-df 2 --min-weight 0.01
+
+Point MODEL_PATH at the output. Rebuild the ANN index and similar-recipes table afterwards:
+both are tied to the original rows and terms, and the server ignores them when they no longer match.
+"""
+import argparse
+import copy
+import os
+import pickle
+import random
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+
+from text_processing import clean_ingredient_text, preprocess_text
+
+# float16 halves the matrix again on disk, but scipy can't multiply it, so it is served as float32
+STORAGE_DTYPES = {"float64": np.float64, "float32": np.float32, "float16": np.float16}
+DEFAULT_MIN_DF = 2
+DEFAULT_MIN_WEIGHT = 0.0
+
+def matrix_nbytes(matrix):
+    return matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes
+
+def downcast(matrix, dtype=np.float32):
+    """CSR copy with `dtype` values and int32 indices/indptr (when nnz fits)."""
+    matrix = matrix.tocsr()
+    index_dtype = np.int32 if max(matrix.nnz, matrix.shape[1]) < np.iinfo(np.int32).max else np.int64
+    return sp.csr_matrix((matrix.data.astype(dtype), matrix.indices.astype(index_dtype), matrix.indptr.astype(index_dtype)),
+                         shape=matrix.shape)
+
+def serving_matrix(matrix, dtype=None):
+    """
+    The matrix as scored at runtime: downcast to `dtype` when given; float16 storage is always
+    widened to float32. Query vectors must use the same dtype or every query upcasts the matrix.
+    """
+    target = np.dtype(dtype) if dtype else matrix.dtype
+    if target == np.float16:
+        target = np.dtype(np.float32)
+    if target == matrix.dtype and matrix.indices.dtype == np.int32:
+        return matrix
+    return downcast(matrix, target)
+
+def prune(vectorizer, matrix, dataframe, min_df=DEFAULT_MIN_DF, min_weight=DEFAULT_MIN_WEIGHT, drop_empty_rows=True):
+    """
+    Zeroes weights below `min_weight`, drops terms left in fewer than `min_df` recipes and
+    re-normalises the rows. Recipes with no terms left are dropped along with their DataFrame rows.
+    Returns (vectorizer, matrix, dataframe); the inputs are not modified.
+    """
+    matrix = matrix.tocsr().copy()
+    if min_weight > 0:
+        matrix.data[matrix.data < min_weight] = 0
+        matrix.eliminate_zeros()
+    df = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    keep_terms = np.flatnonzero(df >= max(1, min_df))
+    matrix = normalize(matrix[:, keep_terms], norm="l2", copy=False)
+
+    if drop_empty_rows:
+        keep_rows = np.flatnonzero(np.diff(matrix.indptr) > 0)
+        if len(keep_rows) < matrix.shape[0]:
+            matrix = matrix[keep_rows]
+            dataframe = dataframe.iloc[keep_rows].reset_index(drop=True)
+
+    terms = vectorizer.get_feature_names_out()
+    idf = vectorizer.idf_
+    vectorizer = copy.deepcopy(vectorizer)
+    vectorizer.vocabulary_ = {terms[old]: new for new, old in enumerate(keep_terms)}
+    vectorizer.idf_ = idf[keep_terms]
+    # The idf_ setter doesn't update the inner transformer's input-width check
+    if hasattr(getattr(vectorizer, "_tfidf", None), "n_features_in_"):
+        vectorizer._tfidf.n_features_in_ = len(keep_terms)
+    if hasattr(vectorizer, "stop_words_"):
+        vectorizer.stop_words_ = None  # kept only for introspection and often larger than the vocabulary
+    return vectorizer, matrix, dataframe
+
+def compact_model(model, dtype=np.float32, min_df=DEFAULT_MIN_DF, min_weight=DEFAULT_MIN_WEIGHT, drop_empty_rows=True):
+    """A new model dict with a pruned vocabulary and a downcast matrix."""
+    vectorizer, matrix, dataframe = prune(model['tfidf_vectorizer'], model['tfidf_matrix'], model['dataframe'],
+                                          min_df, min_weight, drop_empty_rows)
+    matrix = downcast(matrix, dtype)
+    vectorizer.dtype = serving_matrix(matrix).dtype.type
+    return {**model, 'tfidf_vectorizer': vectorizer, 'tfidf_matrix': matrix, 'dataframe': dataframe}
+
+# --- Accuracy report ---
+
+def sample_queries(dataframe, n, seed=7):
+    """(ingredients, prep, cook) drawn from real recipes: 3-6 of their ingredients and their times."""
+    rng = random.Random(seed)
+    queries = []
+    for row in rng.sample(range(len(dataframe)), min(n, len(dataframe))):
+        recipe = dataframe.iloc[row]
+        items = [clean_ingredient_text(i) for i in str(recipe['Ingredients']).split(',')]
+        items = [i for i in items if i]
+        if items:
+            queries.append((rng.sample(items, min(len(items), rng.randint(3, 6))),
+                            float(recipe['PrepTimeInMins']), float(recipe['CookTimeInMins'])))
+    return queries
+
+class Ranker:
+    """Top-k Srnos under the same 80/10/10 ingredient/prep/cook blend as main.calculate_similarity."""
+
+    def __init__(self, model):
+        self.vectorizer = model['tfidf_vectorizer']
+        self.matrix = serving_matrix(model['tfidf_matrix'])
+        self.srnos = model['dataframe']['Srno'].to_numpy()
+        self.prep = model['dataframe']['PrepTimeInMins'].to_numpy(dtype=np.float32)
+        self.cook = model['dataframe']['CookTimeInMins'].to_numpy(dtype=np.float32)
+        self.max_prep = float(self.prep.max()) or 1.0
+        self.max_cook = float(self.cook.max()) or 1.0
+
+    def top(self, ingredients, prep, cook, k):
+        query = self.vectorizer.transform([preprocess_text(', '.join(ingredients))])
+        combined = (cosine_similarity(query, self.matrix)[0] * 0.8
+                    + (1 - np.abs(self.prep - prep) / self.max_prep) * 0.1
+                    + (1 - np.abs(self.cook - cook) / self.max_cook) * 0.1)
+        top = np.argpartition(-combined, k - 1)[:k] if k < len(combined) else np.arange(len(combined))
+        return self.srnos[top[np.argsort(-combined[top], kind="stable")]]
+
+def ranking_agreement(original, compacted, queries, ks=(9, 50)):
+    """Mean overlap@k of the compacted model's top-k with the original's, plus per-query latency."""
+    base, small = Ranker(original), Ranker(compacted)
+    overlaps = {k: [] for k in ks}
+    timings = {"original": [], "compacted": []}
+    for ingredients, prep, cook in queries:
+        t0 = time.perf_counter()
+        expected = base.top(ingredients, prep, cook, max(ks))
+        t1 = time.perf_counter()
+        actual = small.top(ingredients, prep, cook, max(ks))
+        timings["original"].append(t1 - t0)
+        timings["compacted"].append(time.perf_counter() - t1)
+        for k in ks:
+            overlaps[k].append(len(set(expected[:k]) & set(actual[:k])) / k)
+    report = {f"overlap@{k}": round(float(np.mean(v)), 4) for k, v in overlaps.items()}
+    report.update({f"{name}_median_ms": round(float(np.median(v)) * 1000, 3) for name, v in timings.items()})
+    return report
+
+def describe(model, path=None):
+    matrix = model['tfidf_matrix']
+    info = {"recipes": matrix.shape[0], "terms": matrix.shape[1], "nnz": matrix.nnz,
+            "dtype": str(matrix.dtype), "matrix_mb": round(matrix_nbytes(matrix) / 1e6, 2),
+            "serving_matrix_mb": round(matrix_nbytes(serving_matrix(matrix)) / 1e6, 2)}
+    if path and os.path.exists(path):
+        info["file_mb"] = round(os.path.getsize(path) / 1e6, 2)
+    return info
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compact the recipe TF-IDF model and measure ranking agreement.")
+    parser.add_argument("--model", default="recipe_recommender_model.pkl")
+    parser.add_argument("--out", default="recipe_recommender_model.compact.pkl")
+    parser.add_argument("--dtype", choices=sorted(STORAGE_DTYPES), default="float32", help="Stored value dtype")
+    parser.add_argument("--min-df", type=int, default=DEFAULT_MIN_DF, help="Drop terms found in fewer recipes")
+    parser.add_argument("--min-weight", type=float, default=DEFAULT_MIN_WEIGHT, help="Zero TF-IDF weights below this")
+    parser.add_argument("--keep-empty-rows", action="store_true", help="Keep recipes that lose every term")
+    parser.add_argument("--queries", type=int, default=500, help="Sampled queries for the agreement report")
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        original = pickle.load(f)
+    t0 = time.perf_counter()
+    compacted = compact_model(original, STORAGE_DTYPES[args.dtype], args.min_df, args.min_weight, not args.keep_empty_rows)
+    with open(args.out, 'wb') as f:
+        pickle.dump(compacted, f, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"Wrote {args.out} in {time.perf_counter() - t0:.1f}s")
+
+    before, after = describe(original, args.model), describe(compacted, args.out)
+    for key in before:
+        print(f"  {key:18s} {before[key]!s:>12} -> {after.get(key)!s:>12}")
+    print(f"  serving matrix saves {before['serving_matrix_mb'] - after['serving_matrix_mb']:.2f} MB "
+          f"({1 - after['serving_matrix_mb'] / max(before['serving_matrix_mb'], 1e-9):.0%})")
+    report = ranking_agreement(original, compacted, sample_queries(original['dataframe'], args.queries))
+    print("  " + "  ".join(f"{key} {value}" for key, value in report.items()))
@@ -0,0 +1,103 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript")
+
+def parse_accept_encoding(header):
+    """Returns {encoding: q} from an Accept-Encoding header."""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+def choose_encoding(header):
+    """Brotli when the client takes it and the brotli module is installed, else gzip, else None."""
+    accepted = parse_accept_encoding(header or "")
+    wildcard = accepted.get("*", 0.0)
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for encoding in candidates:
+        q = accepted.get(encoding, wildcard)
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+class CompressionMiddleware:
+    """
+    Negotiated br/gzip compression for complete JSON and text responses.
+    Streamed bodies (e.g. /recommend/stream NDJSON) pass through untouched so each line
+    still reaches the client as soon as it is written.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        encoding = choose_encoding(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        pending = {"start": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                pending["start"] = message  # held until we see whether the body comes in one piece
+                return
+            start = pending["start"]
+            if message["type"] != "http.response.body" or start is None:
+                await send(message)
+                return
+
+            pending["start"] = None
+            body = message.get("body", b"")
+            response_headers = list(start.get("headers") or [])
+            names = {k.lower(): v for k, v in response_headers}
+            content_type = names.get(b"content-type", b"").decode("latin-1")
+            if (message.get("more_body", False) or len(body) < self.minimum_size or b"content-encoding" in names
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                await send(start)
+                await send(message)
+                return
+
+            compressed = compress(body, encoding)
+            response_headers = [(k, v) for k, v in response_headers if k.lower() not in (b"content-length", b"vary")]
+            vary = names.get(b"vary")
+            response_headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(compressed)).encode("latin-1")),
+                (b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"),
+            ]
+            await send({**start, "headers": response_headers})
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
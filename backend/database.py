@@ -1,6 +1,10 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 import os
 
+from logging_setup import get_logger
+
+logger = get_logger("database")
+
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = "ai_cooking_db"
 
@@ -11,10 +15,10 @@ try:
     mongo_client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=2000)
     # Trigger a connection attempt
     mongo_client.server_info()
-    print("Connected to MongoDB successfully.")
+    logger.info("Connected to MongoDB successfully.")
     mongo_db = mongo_client[DB_NAME]
 except Exception as e:
-    print(f"FAILED to connect to MongoDB: {e}")
+    logger.error(f"FAILED to connect to MongoDB: {e}")
     mongo_client = None
     mongo_db = None
 
@@ -28,3 +32,24 @@ def get_users_collection():
         return mongo_db["users"]
     return None
 
+def get_translations_collection():
+    if mongo_db is not None:
+        return mongo_db["translations"]
+    return None
+
+def get_result_cache_collection():
+    if mongo_db is not None:
+        return mongo_db["result_cache"]
+    return None
+
+def bulk_upsert_recipes(collection, records, batch_size=1000):
+    """Upserts recipe records keyed on Srno in unordered batches. Returns number of docs written."""
+    written = 0
+    for start in range(0, len(records), batch_size):
+        batch = records[start:start + batch_size]
+        ops = [UpdateOne({"Srno": rec["Srno"]}, {"$set": rec}, upsert=True) for rec in batch]
+        if not ops:
+            continue
+        result = collection.bulk_write(ops, ordered=False)
+        written += result.upserted_count + result.matched_count
+    return written
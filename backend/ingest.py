@@ -0,0 +1,283 @@
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from text_processing import recipe_document
+
+# Constants
+MODEL_PATH = "recipe_recommender_model.pkl"
+DEFAULT_BATCH_SIZE = 500
+# Share of ingested tokens that the fitted vocabulary does not know about
+# before we pay for a full refit of the vectorizer.
+DEFAULT_DRIFT_THRESHOLD = 0.15
+# IDF weights describe the catalog as it was at the last fit. Once the recipes ingested since
+# then reach this share of the catalog, refit even if the vocabulary itself hasn't drifted.
+DEFAULT_REFIT_FRACTION = 0.25
+
+
+def load_model_data(path=MODEL_PATH):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def save_model_data(model_data, path=MODEL_PATH):
+    """Writes the model next to the old one and swaps it in, so a crash never leaves a half-written pickle."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(model_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def pending_path(model_path):
+    """Journal of Srnos whose Mongo documents still have to be brought in line with the saved model."""
+    return model_path + ".mongo-pending.json"
+
+
+def load_pending(model_path):
+    path = pending_path(model_path)
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return set(json.load(f))
+
+
+def save_pending(srnos, model_path):
+    tmp_path = pending_path(model_path) + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(sorted(int(s) for s in srnos), f)
+    os.replace(tmp_path, pending_path(model_path))
+
+
+def clear_pending(model_path):
+    if os.path.exists(pending_path(model_path)):
+        os.remove(pending_path(model_path))
+
+
+def read_recipes(path):
+    if path.endswith(".csv"):
+        return pd.read_csv(path)
+    if path.endswith(".jsonl"):
+        return pd.read_json(path, lines=True)
+    if path.endswith(".json"):
+        return pd.read_json(path)
+    raise ValueError(f"Unsupported recipe file: {path}")
+
+
+def assign_srnos(new_df, existing_df):
+    """Gives rows without a Srno fresh ids after the current maximum."""
+    new_df = new_df.copy()
+    if 'Srno' not in new_df.columns:
+        new_df['Srno'] = np.nan
+    missing = new_df['Srno'].isna()
+    if missing.any():
+        start = int(existing_df['Srno'].max()) + 1 if len(existing_df) else 1
+        new_df.loc[missing, 'Srno'] = np.arange(start, start + missing.sum())
+    new_df['Srno'] = new_df['Srno'].astype(int)
+    return new_df.drop_duplicates(subset='Srno', keep='last')
+
+
+def vocabulary_drift(docs, vectorizer, stats):
+    """Updates the running token / out-of-vocabulary counters and returns the drift ratio."""
+    analyzer = vectorizer.build_analyzer()
+    vocab = vectorizer.vocabulary_
+    for doc in docs:
+        tokens = analyzer(doc)
+        stats['tokens_seen'] += len(tokens)
+        stats['oov_tokens'] += sum(1 for t in tokens if t not in vocab)
+    if stats['tokens_seen'] == 0:
+        return 0.0
+    return stats['oov_tokens'] / stats['tokens_seen']
+
+
+def replace_rows(matrix, positions, new_rows):
+    """Overwrites the given CSR rows without densifying: M' = keep_mask @ M + scatter @ new_rows."""
+    n_rows = matrix.shape[0]
+    keep = np.ones(n_rows, dtype=matrix.dtype)
+    keep[positions] = 0
+    scatter = sparse.csr_matrix(
+        (np.ones(len(positions), dtype=matrix.dtype), (positions, np.arange(len(positions)))),
+        shape=(n_rows, len(positions))
+    )
+    return (sparse.diags(keep) @ matrix + scatter @ new_rows).tocsr()
+
+
+def refit_model(model_data):
+    """Full refit of the vectorizer and matrix over the whole catalog."""
+    df = model_data['dataframe']
+    old = model_data['tfidf_vectorizer']
+    vectorizer = TfidfVectorizer(**old.get_params())
+    docs = [recipe_document(x) for x in df['Ingredients']]
+    model_data['tfidf_matrix'] = vectorizer.fit_transform(docs).tocsr()
+    model_data['tfidf_vectorizer'] = vectorizer
+    model_data['ingest_stats'] = {'tokens_seen': 0, 'oov_tokens': 0, 'docs_since_refit': 0}
+    return model_data
+
+
+def ingest_recipes(model_data, new_df, drift_threshold=DEFAULT_DRIFT_THRESHOLD, refit_fraction=DEFAULT_REFIT_FRACTION):
+    """
+    Adds or replaces recipes in an in-memory model without refitting the vectorizer.
+    New rows are transformed with the existing vocabulary and appended to the matrix
+    and dataframe; rows whose Srno already exists are replaced in place. The vectorizer
+    is refit once the vocabulary drifts past `drift_threshold` or the recipes ingested
+    since the last fit reach `refit_fraction` of the catalog.
+    Returns (model_data, ingested_rows, report).
+    """
+    t0 = time.perf_counter()
+    df = model_data['dataframe']
+    vectorizer = model_data['tfidf_vectorizer']
+    matrix = sparse.csr_matrix(model_data['tfidf_matrix'])
+
+    new_df = assign_srnos(new_df, df)
+    position_by_srno = pd.Series(np.arange(len(df)), index=df['Srno'].values)
+    existing = new_df['Srno'].isin(position_by_srno.index).values
+    update_positions = position_by_srno.loc[new_df['Srno'][existing]].values
+
+    if existing.any():
+        # Upsert semantics: only the columns supplied for an existing recipe change
+        df = df.copy()
+        for pos, (_, row) in zip(update_positions, new_df[existing].iterrows()):
+            for col, value in row.items():
+                if pd.notna(value):
+                    df.at[df.index[pos], col] = value
+        new_df = pd.concat([df.iloc[update_positions], new_df[~existing]], ignore_index=True)
+        existing = np.arange(len(new_df)) < len(update_positions)
+
+    docs = [recipe_document(x) for x in new_df.get('Ingredients', pd.Series([""] * len(new_df)))]
+    new_rows = vectorizer.transform(docs).astype(matrix.dtype)
+
+    stats = model_data.setdefault('ingest_stats', {'tokens_seen': 0, 'oov_tokens': 0, 'docs_since_refit': 0})
+    drift = vocabulary_drift(docs, vectorizer, stats)
+    stats['docs_since_refit'] += len(new_df)
+
+    if existing.any():
+        matrix = replace_rows(matrix, update_positions, new_rows[np.flatnonzero(existing)])
+    appended = new_df[~existing].copy()
+    for col, dtype in df.dtypes.items():
+        # Keep integer columns integral; the serving code casts them with int()
+        if pd.api.types.is_integer_dtype(dtype) and col in appended.columns:
+            appended[col] = appended[col].fillna(0).astype(dtype)
+    if len(appended):
+        matrix = sparse.vstack([matrix, new_rows[np.flatnonzero(~existing)]], format='csr')
+        df = pd.concat([df, appended], ignore_index=True)
+
+    model_data['dataframe'] = df
+    model_data['tfidf_matrix'] = matrix
+
+    docs_since_refit = stats['docs_since_refit']
+    stale = refit_fraction is not None and len(df) > 0 and docs_since_refit >= refit_fraction * len(df)
+    refit = drift > drift_threshold or stale
+    if drift > drift_threshold:
+        print(f"Vocabulary drift {drift:.1%} exceeds {drift_threshold:.1%}. Refitting TF-IDF model...")
+    elif stale:
+        print(f"{docs_since_refit} recipes ingested since the last fit ({docs_since_refit / len(df):.1%} of the catalog). "
+              f"Refitting TF-IDF model...")
+    if refit:
+        model_data = refit_model(model_data)
+
+    elapsed = time.perf_counter() - t0
+    report = {
+        "ingested": int(len(new_df)),
+        "appended": int(len(appended)),
+        "updated": int(existing.sum()),
+        "total_recipes": int(len(model_data['dataframe'])),
+        "vocabulary_drift": round(drift, 4),
+        "docs_since_refit": int(docs_since_refit),
+        "refit": refit,
+        "seconds": round(elapsed, 3),
+        "recipes_per_sec": round(len(new_df) / elapsed, 1) if elapsed > 0 else None,
+    }
+    return model_data, new_df, report
+
+
+def upsert_to_mongo(new_df, batch_size=DEFAULT_BATCH_SIZE, collection=None):
+    """Writes rows to the recipes collection keyed on Srno ($set upserts, so replaying a batch is harmless)."""
+    from database import get_recipe_collection, bulk_upsert_recipes
+
+    collection = collection if collection is not None else get_recipe_collection()
+    if collection is None:
+        print("MongoDB not connected. Skipping upsert.")
+        return 0, 0.0
+    t0 = time.perf_counter()
+    df_clean = new_df.astype(object).where(pd.notnull(new_df), None)
+    written = 0
+    for start in range(0, len(df_clean), batch_size):
+        records = df_clean.iloc[start:start + batch_size].to_dict(orient='records')
+        written += bulk_upsert_recipes(collection, records, batch_size=batch_size)
+    collection.create_index("Srno", unique=True)
+    return written, time.perf_counter() - t0
+
+
+def sync_pending_to_mongo(model_data, model_path, batch_size=DEFAULT_BATCH_SIZE, collection=None):
+    """
+    Upserts the saved model's rows for every Srno in the pending journal, then clears it.
+    Srnos the model doesn't have (a run that died before saving) are dropped: Mongo only
+    ever gets what the model on disk has. Returns the number of docs written, or None if
+    Mongo isn't reachable and the journal was kept for the next run.
+    """
+    pending = load_pending(model_path)
+    if not pending:
+        return 0
+    df = model_data['dataframe']
+    rows = df[df['Srno'].isin(pending)]
+    written, mongo_secs = upsert_to_mongo(rows, batch_size=batch_size, collection=collection)
+    if mongo_secs == 0 and len(rows):
+        print(f"  {len(pending)} recipes stay pending for Mongo; rerun to sync them.")
+        return None
+    clear_pending(model_path)
+    if mongo_secs > 0:
+        print(f"  Mongo: upserted {written} docs at {written / mongo_secs:.1f} recipes/sec")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Append recipes to the TF-IDF model and MongoDB without a full rebuild.")
+    parser.add_argument("recipes", help="CSV, JSON or JSONL file with recipe rows (same columns as the catalog)")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--drift-threshold", type=float, default=DEFAULT_DRIFT_THRESHOLD)
+    parser.add_argument("--refit-fraction", type=float, default=DEFAULT_REFIT_FRACTION)
+    parser.add_argument("--skip-mongo", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.model):
+        print("Model file not found!")
+        sys.exit(1)
+
+    new_df = read_recipes(args.recipes)
+    print(f"Loaded {len(new_df)} recipes from {args.recipes}.")
+
+    model_data = load_model_data(args.model)
+    total_ingested = 0
+    ingested_srnos = set()
+    t0 = time.perf_counter()
+    for start in range(0, len(new_df), args.batch_size):
+        chunk = new_df.iloc[start:start + args.batch_size]
+        model_data, ingested, report = ingest_recipes(model_data, chunk, drift_threshold=args.drift_threshold,
+                                                      refit_fraction=args.refit_fraction)
+        total_ingested += report['ingested']
+        ingested_srnos.update(ingested['Srno'].tolist())
+        print(f"Batch {start // args.batch_size + 1}: {report}")
+
+    # The model is the source of truth for Srnos, so it is saved before Mongo sees any of them.
+    # The journal goes down first: if we die before the Mongo writes finish, the next run replays them.
+    if not args.skip_mongo:
+        save_pending(load_pending(args.model) | ingested_srnos, args.model)
+    save_model_data(model_data, args.model)
+    if not args.skip_mongo:
+        sync_pending_to_mongo(model_data, args.model, batch_size=args.batch_size)
+    elapsed = time.perf_counter() - t0
+    rate = total_ingested / elapsed if elapsed > 0 else 0.0
+    print(f"Ingest Complete. {total_ingested} recipes in {elapsed:.2f}s ({rate:.1f} recipes/sec). "
+          f"Catalog size: {len(model_data['dataframe'])}")
+
+
+if __name__ == "__main__":
+    main()
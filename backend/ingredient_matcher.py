@@ -0,0 +1,293 @@
+import math
+import re
+from collections import deque
+
+from text_processing import COOKING_STOPWORDS, english_stopwords
+
+# Shelf-life classes, as (days_to_expiry, priority) in the format analyze_perishability returns
+SHELF_LIFE = {
+    "high": (2, "High"),      # raw meat, seafood, leafy greens
+    "medium": (7, "Medium"),  # eggs, dairy, most fresh vegetables and fruit
+    "long": (30, "Low"),      # hardy produce: onions, potatoes, garlic, ginger, hard cheese
+    "pantry": (999, "Low"),   # grains, flours, pulses, spices, sugar, oil
+}
+
+# (shelf-life class, names...). The name the catalog uses most becomes the canonical form;
+# the first one is used when none of them are in the TF-IDF vocabulary.
+INGREDIENT_SYNONYMS = [
+    ("high", "chicken", "murgh"),
+    ("high", "mutton", "goat meat"),
+    ("high", "fish", "machli", "machhi"),
+    ("high", "prawns", "shrimp", "jhinga"),
+    ("high", "spinach", "palak"),
+    ("high", "fenugreek leaves", "methi", "methi leaves"),
+    ("high", "mint", "pudina", "mint leaves"),
+    ("high", "coriander leaves", "cilantro", "dhania", "hara dhania"),
+    ("high", "curry leaves", "kadi patta", "curry patta"),
+    ("high", "mushroom", "mushrooms"),
+    ("medium", "egg", "eggs", "anda"),
+    ("medium", "milk", "doodh"),
+    ("medium", "curd", "yogurt", "yoghurt", "dahi"),
+    ("medium", "paneer", "cottage cheese"),
+    ("medium", "cream", "malai", "fresh cream"),
+    ("medium", "butter", "makhan", "makkhan"),
+    ("medium", "tomato", "tamatar"),
+    ("medium", "bhindi", "okra", "lady finger", "ladies finger", "ladyfinger"),
+    ("medium", "brinjal", "eggplant", "aubergine", "baingan"),
+    ("medium", "capsicum", "bell pepper", "shimla mirch"),
+    ("medium", "green chilli", "green chili", "hari mirch"),
+    ("medium", "cauliflower", "gobi", "phool gobi"),
+    ("medium", "cabbage", "patta gobi", "band gobi"),
+    ("medium", "green peas", "peas", "matar", "mattar"),
+    ("medium", "carrot", "gajar"),
+    ("medium", "radish", "mooli"),
+    ("medium", "beetroot", "beet", "chukandar"),
+    ("medium", "cucumber", "kheera"),
+    ("medium", "bitter gourd", "karela"),
+    ("medium", "bottle gourd", "lauki", "dudhi"),
+    ("medium", "ridge gourd", "turai", "tori"),
+    ("medium", "drumstick", "moringa", "saijan"),
+    ("medium", "french beans", "beans"),
+    ("medium", "spring onion", "scallion", "green onion"),
+    ("medium", "lemon", "nimbu"),
+    ("medium", "corn", "sweet corn", "bhutta", "makai"),
+    ("long", "onion", "pyaz", "pyaaz", "kanda"),
+    ("long", "potato", "aloo", "alu"),
+    ("long", "sweet potato", "shakarkandi"),
+    ("long", "pumpkin", "kaddu"),
+    ("long", "colocasia", "arbi"),
+    ("long", "garlic", "lahsun", "lehsun"),
+    ("long", "ginger", "adrak"),
+    ("long", "coconut", "nariyal"),
+    ("long", "cheese", "cheddar", "processed cheese"),
+    ("pantry", "ghee", "clarified butter"),
+    ("pantry", "rice", "chawal"),
+    ("pantry", "basmati rice", "basmati"),
+    ("pantry", "poha", "flattened rice", "beaten rice"),
+    ("pantry", "wheat flour", "atta", "whole wheat flour"),
+    ("pantry", "maida", "all purpose flour", "refined flour", "plain flour"),
+    ("pantry", "besan", "gram flour", "chickpea flour"),
+    ("pantry", "sooji", "suji", "semolina", "rava", "rawa"),
+    ("pantry", "toor dal", "arhar dal", "tuvar dal", "pigeon peas"),
+    ("pantry", "moong dal", "split green gram"),
+    ("pantry", "urad dal", "black gram"),
+    ("pantry", "chana dal", "split bengal gram"),
+    ("pantry", "rajma", "kidney beans"),
+    ("pantry", "chickpeas", "kabuli chana", "chole", "garbanzo beans"),
+    ("pantry", "pasta", "penne", "spaghetti", "macaroni"),
+    ("pantry", "bread", "pav"),
+    ("pantry", "turmeric", "haldi"),
+    ("pantry", "cumin", "jeera", "zeera"),
+    ("pantry", "mustard", "rai", "sarson"),
+    ("pantry", "asafoetida", "hing"),
+    ("pantry", "red chilli", "lal mirch", "red chili"),
+    ("pantry", "garam masala",),
+    ("pantry", "cardamom", "elaichi"),
+    ("pantry", "cinnamon", "dalchini"),
+    ("pantry", "bay leaf", "tej patta"),
+    ("pantry", "tamarind", "imli"),
+    ("pantry", "jaggery", "gur", "gud"),
+    ("pantry", "sugar", "chini"),
+    ("pantry", "salt", "namak"),
+    ("pantry", "oil", "cooking oil", "refined oil"),
+    ("pantry", "cashew", "cashews", "kaju"),
+    ("pantry", "almonds", "almond", "badam"),
+    ("pantry", "raisins", "kishmish"),
+    ("pantry", "soy sauce",),
+    ("pantry", "vinegar", "sirka"),
+    ("pantry", "honey", "shahad"),
+]
+
+# Vocabulary words that describe an ingredient rather than name one
+DESCRIPTOR_WORDS = {
+    "finely", "roughly", "thinly", "coarsely", "cut", "pieces", "piece", "inch", "inches", "big", "little", "handful",
+    "few", "cups", "teaspoons", "tablespoons", "grams", "sprigs", "soaked", "overnight", "cooked", "mashed", "optional",
+    "needed", "required", "per", "thick", "thin", "lengthwise", "julienned", "deseeded", "tender", "ripe", "raw",
+    "frozen", "canned", "split", "mixed", "plain", "green", "red", "yellow", "white", "black", "sweet", "juice", "paste",
+}
+# Words between ingredients in free text ("some onions and a few tomatoes")
+FILLER_WORDS = {"have", "got", "some", "few", "bit", "left", "also", "plus", "like", "want", "use", "using", "leftover"}
+
+# Single words that name an ingredient. A TF-IDF vocabulary word only joins the dictionary if it
+# (or its singular) is here: the vocabulary also holds verbs, brands and every other word in the
+# ingredient strings. Multi-word names and Indian names belong in INGREDIENT_SYNONYMS.
+INGREDIENT_LEXICON = frozenset("""
+    apple apricot artichoke arugula asparagus avocado bacon banana barley basil bean beef blackberry blueberry
+    broccoli buckwheat buttermilk cantaloupe caper caraway carrot cashew celery chard cherry chervil chestnut
+    chia chickpea chive chocolate cilantro citron clam clove cocoa cod coffee corn cornflour cornmeal cornstarch
+    couscous crab cranberry cream cucumber currant date dill duck edamame egg endive fennel feta fig flaxseed
+    garlic gelatin gherkin ginger gooseberry grape grapefruit guava haddock halibut ham hazelnut herring
+    jalapeno jackfruit kale ketchup kiwi kohlrabi lamb leek lemon lemongrass lentil lettuce lime litchi lobster
+    lychee macadamia mackerel mango margarine marjoram mayonnaise melon millet miso molasses mozzarella
+    mushroom mussel mustard nectarine noodle nutmeg oat oats okra olive onion orange oregano oyster papaya
+    paprika parmesan parsley parsnip pea peach peanut pear pecan pepper peppercorn persimmon pickle pineapple
+    pistachio plum pomegranate pork prune pumpkin quinoa radish raisin raspberry ricotta rosemary rutabaga
+    saffron sage salmon sardine sausage scallop sesame shallot soya soybean spinach sprout squash strawberry
+    tahini tapioca tarragon thyme tofu tomato tuna turkey turnip vanilla vermicelli walnut watercress
+    watermelon wheat yam yeast zucchini
+    ajwain amchur anardana bajra besan chironji dalia jowar kalonji kokum makhana masoor methi moong nachni
+    paneer poha ragi rajma sabudana sooji urad
+""".split())
+
+SEGMENT_SPLIT = re.compile(r"[,;\n]|\band\b|&|\+", re.IGNORECASE)
+TOKEN = re.compile(r"[a-z]+")
+MIN_DOCUMENT_FREQUENCY = 3
+
+def normalise_phrase(text):
+    return " ".join(TOKEN.findall(text.lower()))
+
+def singular_forms(token):
+    """Simple singular spellings of a token (tomatoes -> tomato, berries -> berry), most specific first."""
+    for suffix, replacement in (("ies", "y"), ("es", ""), ("s", "")):
+        if token.endswith(suffix) and len(token) > len(suffix) + 2:
+            yield token[:-len(suffix)] + replacement
+
+def ignored_words():
+    """Words that never name an ingredient on their own: stopwords, quantities, descriptors and filler."""
+    return COOKING_STOPWORDS | english_stopwords() | FILLER_WORDS | DESCRIPTOR_WORDS
+
+class IngredientMatcher:
+    """
+    Aho-Corasick automaton over word tokens. Finds every dictionary phrase in a text in one pass
+    and keeps the leftmost-longest non-overlapping matches, each mapped to its canonical name.
+    """
+
+    def __init__(self, phrases, shelf_life=None):
+        """`phrases` maps a normalised phrase to its canonical ingredient name."""
+        self.canonical = {}
+        self.shelf_life = shelf_life or {}
+        self._token_ids = {}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._ignored = ignored_words()
+        for phrase, canonical in phrases.items():
+            tokens = phrase.split()
+            if tokens:
+                self._add(tokens, canonical)
+        self._build_links()
+
+    def __len__(self):
+        return len(self.canonical)
+
+    def _add(self, tokens, canonical):
+        state = 0
+        for token in tokens:
+            token_id = self._token_ids.setdefault(token, len(self._token_ids))
+            next_state = self._goto[state].get(token_id)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][token_id] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((len(tokens), canonical))
+        self.canonical[" ".join(tokens)] = canonical
+
+    def _build_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token_id, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and token_id not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(token_id, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def _token_id(self, token):
+        """Dictionary id for a token, trying simple singular forms (tomatoes -> tomato) when needed."""
+        token_id = self._token_ids.get(token)
+        if token_id is not None:
+            return token_id
+        for singular in singular_forms(token):
+            token_id = self._token_ids.get(singular)
+            if token_id is not None:
+                return token_id
+        return -1
+
+    def find(self, tokens):
+        """Leftmost-longest matches in a token list, as (start, end, canonical)."""
+        matches = []
+        state = 0
+        for i, token in enumerate(tokens):
+            token_id = self._token_id(token)
+            while state and token_id not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token_id, 0)
+            for length, canonical in self._out[state]:
+                matches.append((i - length + 1, i + 1, canonical))
+        matches.sort(key=lambda m: (m[0], m[0] - m[1]))
+        selected, covered_to = [], 0
+        for start, end, canonical in matches:
+            if start >= covered_to:
+                selected.append((start, end, canonical))
+                covered_to = end
+        return selected
+
+    def resolve(self, text):
+        """
+        Canonical ingredients mentioned in free text, in order and de-duplicated, plus the runs
+        of words around and between them that the dictionary doesn't know ("tomato kohlrabi"
+        gives ["tomato"], ["kohlrabi"]).
+        """
+        found, unresolved = [], []
+        for segment in SEGMENT_SPLIT.split(text):
+            tokens = TOKEN.findall(segment.lower())
+            if not tokens:
+                continue
+            position = 0
+            for start, end, canonical in self.find(tokens) + [(len(tokens), len(tokens), None)]:
+                leftover = [t for t in tokens[position:start] if t not in self._ignored and len(t) > 1]
+                if leftover and " ".join(leftover) not in unresolved:
+                    unresolved.append(" ".join(leftover))
+                if canonical is not None and canonical not in found:
+                    found.append(canonical)
+                position = end
+        return found, unresolved
+
+    def shelf_life_of(self, name):
+        """(days_to_expiry, priority) when `name` resolves to exactly one ingredient with a known class."""
+        found, unresolved = self.resolve(name)
+        if len(found) == 1 and not unresolved:
+            return self.shelf_life.get(found[0])
+        return None
+
+def build_ingredient_matcher(vectorizer=None, n_docs=None, synonyms=INGREDIENT_SYNONYMS, min_df=MIN_DOCUMENT_FREQUENCY,
+                             lexicon=INGREDIENT_LEXICON):
+    """
+    Dictionary from the synonym table plus every TF-IDF vocabulary word that `lexicon` knows as
+    an ingredient and that occurs in at least `min_df` recipes. Without a vectorizer only the
+    synonym table is used.
+    """
+    idf = {}
+    if vectorizer is not None:
+        idf = dict(zip(vectorizer.get_feature_names_out(), vectorizer.idf_))
+
+    def document_frequency(phrase):
+        # smooth_idf: idf = ln((1 + n) / (1 + df)) + 1; a phrase is as common as its rarest word
+        weights = [idf.get(token) for token in phrase.split()]
+        if not weights or any(w is None for w in weights) or not n_docs:
+            return 0
+        return min((1 + n_docs) / math.exp(w - 1) - 1 for w in weights)
+
+    phrases, shelf_life = {}, {}
+    for life, *names in synonyms:
+        members = [normalise_phrase(name) for name in names]
+        # Plural spellings the catalog uses are members too
+        members += [m + suffix for m in members if " " not in m for suffix in ("s", "es") if m + suffix in idf]
+        canonical = max(members, key=lambda m: (document_frequency(m), -members.index(m)))
+        shelf_life[canonical] = SHELF_LIFE[life]
+        for member in members:
+            phrases.setdefault(member, canonical)
+
+    if n_docs:
+        ignored = ignored_words()
+        for term in idf:
+            if (term.isalpha() and len(term) > 2 and term not in phrases and term not in ignored
+                    and (term in lexicon or any(s in lexicon for s in singular_forms(term)))
+                    and document_frequency(term) >= min_df):
+                phrases[term] = term
+    return IngredientMatcher(phrases, shelf_life)
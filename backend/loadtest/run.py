@@ -0,0 +1,278 @@
+"""
+Offline load test: serves the API over real HTTP with every external dependency replaced
+by a local stand-in, then replays a weighted traffic mix at a target request rate.
+
+    cd backend
+    python -m loadtest.run --rps 20 --duration 60 \
+        --latency openrouter=800,ollama=1500,youtube=300,translate=120 \
+        --error-rate openrouter=0.05,youtube=0.02
+
+Latency is measured from each request's scheduled start, so a saturated server shows
+up as queueing delay instead of silently lowering the offered load.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import threading
+import time
+
+from loadtest.stubs import (
+    FakeCollection, FakeYoutubeSearch, FlakyTranslatorBackend, HttpStub, SmtpStub, StubConfig,
+    find_free_port, ollama_response, openrouter_response,
+)
+
+DEPENDENCIES = ["openrouter", "ollama", "youtube", "translate", "smtp", "mongo"]
+DEFAULT_MIX = "recommend=45,recipe=20,detect=10,chat=10,translate=13,forgot_password=2"
+STEP_TEXTS = [
+    "Heat oil in a kadai and add cumin seeds.",
+    "Add chopped onions and saute until golden brown.",
+    "Add ginger garlic paste and cook for a minute.",
+    "Add tomatoes, turmeric and chilli powder and cook until soft.",
+    "Garnish with coriander leaves and serve hot.",
+]
+PANTRIES = ["onion, tomato, potato", "paneer, peas, onion", "brinjal, onion, garlic", "rice, dal, ghee",
+            "chicken, curd, ginger, garlic", "bhindi, onion, tomato", "spinach, paneer, cream"]
+
+
+def parse_pairs(text, cast=float):
+    pairs = {}
+    for item in filter(None, (text or "").split(",")):
+        key, value = item.split("=")
+        pairs[key.strip()] = cast(value)
+    return pairs
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * (len(sorted_values) - 1)))))
+    return round(sorted_values[index], 2)
+
+
+# --- Environment ---
+
+class Harness:
+    def __init__(self, latency, error_rates, model_path):
+        self.configs = {name: StubConfig(latency_ms=latency.get(name, 0.0), jitter_ms=latency.get(name, 0.0) * 0.2,
+                                         error_rate=error_rates.get(name, 0.0)) for name in DEPENDENCIES}
+        self.model_path = model_path
+        self.openrouter = HttpStub("openrouter", openrouter_response, self.configs["openrouter"])
+        self.ollama = HttpStub("ollama", ollama_response, self.configs["ollama"])
+        self.smtp = SmtpStub(self.configs["smtp"])
+        self.translator = FlakyTranslatorBackend(self.configs["translate"])
+        self.users = FakeCollection(self.configs["mongo"])
+        self.server = None
+        self.port = find_free_port()
+
+    def start(self):
+        self.openrouter.start()
+        self.ollama.start()
+        self.smtp.start()
+
+        # These must be in place before main (and the ollama client) are imported
+        os.environ.update({
+            "MODEL_PATH": self.model_path,
+            "OPENROUTER_URL": f"{self.openrouter.url}/api/v1/chat/completions",
+            "OPENROUTER_API_KEY": "stub",
+            "OLLAMA_HOST": self.ollama.url,
+            "SMTP_SERVER": "127.0.0.1",
+            "SMTP_PORT": str(self.smtp.port),
+            "SMTP_USER": "stub",
+            "SMTP_PASSWORD": "stub",
+            "SMTP_STARTTLS": "0",
+            "MONGO_URI": os.getenv("LOADTEST_MONGO_URI", "mongodb://127.0.0.1:1"),
+            "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+        })
+        import uvicorn
+        import auth
+        import main
+        import translation
+
+        FakeYoutubeSearch.config = self.configs["youtube"]
+        main.YoutubeSearch = FakeYoutubeSearch
+        translation.set_translator_backend(self.translator)
+        main.get_users_collection = lambda: self.users
+        auth.get_users_collection = lambda: self.users
+
+        config = uvicorn.Config(main.app, host="127.0.0.1", port=self.port, log_level="warning", access_log=False)
+        self.server = uvicorn.Server(config)
+        threading.Thread(target=self.server.run, name="api", daemon=True).start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def stop(self):
+        if self.server:
+            self.server.should_exit = True
+        self.openrouter.stop()
+        self.ollama.stop()
+        self.smtp.stop()
+
+    def dependency_stats(self):
+        return {
+            "openrouter": self.openrouter.stats.as_dict(),
+            "ollama": self.ollama.stats.as_dict(),
+            "youtube": FakeYoutubeSearch.stats.as_dict(),
+            "translate": self.translator.stats.as_dict(),
+            "smtp": self.smtp.stats.as_dict(),
+            "mongo": self.users.stats.as_dict(),
+        }
+
+
+# --- Traffic ---
+
+def tiny_jpeg():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (200, 80, 40)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def build_requests(recipe_ids):
+    image = tiny_jpeg()
+    context = json.dumps({"recipe_name": "Aloo Gobi", "step_label": "Step 2", "instruction": STEP_TEXTS[1]})
+
+    def recommend():
+        return "POST", "/recommend", {"json": {"ingredients": random.choice(PANTRIES),
+                                               "prep_time": random.choice([10, 15, 20, 30]),
+                                               "cook_time": random.choice([15, 20, 30, 45])}}
+
+    def recipe():
+        return "GET", f"/recipe/{random.choice(recipe_ids)}", {}
+
+    def detect():
+        return "POST", "/detect-ingredients", {"files": {"file": ("fridge.jpg", image, "image/jpeg")}}
+
+    def chat():
+        return "POST", "/chat", {"data": {"text_input": "Is the onion brown enough?", "context": context}}
+
+    def translate():
+        return "POST", "/translate", {"json": {"text": random.choice(STEP_TEXTS), "target_lang": random.choice(["hi", "es", "fr"])}}
+
+    def forgot_password():
+        return "POST", "/forgot-password", {"json": {"email": "loadtest@example.com"}}
+
+    return {"recommend": recommend, "recipe": recipe, "detect": detect, "chat": chat,
+            "translate": translate, "forgot_password": forgot_password}
+
+
+async def run_load(base_url, token, mix, rps, duration, max_in_flight, recipe_ids, timeout):
+    import httpx
+
+    builders = build_requests(recipe_ids)
+    names = [n for n in mix if mix[n] > 0]
+    weights = [mix[n] for n in names]
+    results = {name: {"latencies": [], "errors": 0, "status": {}} for name in names}
+    semaphore = asyncio.Semaphore(max_in_flight)
+    limits = httpx.Limits(max_connections=max_in_flight, max_keepalive_connections=max_in_flight)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits,
+                                 headers={"Authorization": f"Bearer {token}"}) as client:
+        async def fire(name, scheduled):
+            method, path, kwargs = builders[name]()
+            outcome = results[name]
+            async with semaphore:
+                try:
+                    response = await client.request(method, path, **kwargs)
+                    code = str(response.status_code)
+                    if response.status_code >= 400:
+                        outcome["errors"] += 1
+                except Exception as e:
+                    code = type(e).__name__
+                    outcome["errors"] += 1
+            outcome["latencies"].append((time.perf_counter() - scheduled) * 1000)
+            outcome["status"][code] = outcome["status"].get(code, 0) + 1
+
+        tasks = []
+        start = time.perf_counter()
+        total = int(rps * duration)
+        for i in range(total):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(fire(random.choices(names, weights)[0], scheduled)))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    report = {}
+    for name, outcome in results.items():
+        latencies = sorted(outcome["latencies"])
+        count = len(latencies)
+        report[name] = {
+            "requests": count,
+            "throughput_rps": round(count / elapsed, 2),
+            "error_rate": round(outcome["errors"] / count, 4) if count else 0.0,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+            "status": outcome["status"],
+        }
+    return report, elapsed
+
+
+def register_user(base_url):
+    import httpx
+    response = httpx.post(f"{base_url}/register", json={"email": "loadtest@example.com", "password": "loadtest"}, timeout=30)
+    if response.status_code == 400:
+        response = httpx.post(f"{base_url}/token", data={"username": "loadtest@example.com", "password": "loadtest"}, timeout=30)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test with local stand-ins for external services.")
+    parser.add_argument("--rps", type=float, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of offered load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted endpoint mix, e.g. recommend=50,recipe=30,chat=20")
+    parser.add_argument("--latency", default="", help="Per-dependency latency in ms: " + ",".join(f"{d}=N" for d in DEPENDENCIES))
+    parser.add_argument("--error-rate", default="", help="Per-dependency error rate 0-1, same keys as --latency")
+    parser.add_argument("--max-in-flight", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--recipes", type=int, default=10000, help="Size of the synthetic catalog to serve")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    from benchmarks.synthetic import write_model
+    bench_dir = os.getenv("BENCH_DIR", "bench_data")
+    os.makedirs(bench_dir, exist_ok=True)
+    model_path = os.path.join(bench_dir, f"bench_model_{args.recipes}.pkl")
+    if not os.path.exists(model_path):
+        write_model(model_path, args.recipes)
+
+    harness = Harness(parse_pairs(args.latency), parse_pairs(args.error_rate), model_path).start()
+    try:
+        token = register_user(harness.base_url)
+        recipe_ids = list(range(1, args.recipes + 1))
+        mix = parse_pairs(args.mix)
+        print(f"Offering {args.rps} rps for {args.duration}s against {harness.base_url} (mix: {args.mix})")
+        report, elapsed = asyncio.run(run_load(harness.base_url, token, mix, args.rps, args.duration,
+                                               args.max_in_flight, recipe_ids, args.timeout))
+    finally:
+        harness.stop()
+
+    print(f"\n{'endpoint':18s}{'reqs':>7s}{'rps':>8s}{'err%':>7s}{'p50 ms':>10s}{'p95 ms':>10s}{'p99 ms':>10s}")
+    for name, stats in report.items():
+        print(f"{name:18s}{stats['requests']:7d}{stats['throughput_rps']:8.2f}{stats['error_rate'] * 100:7.1f}"
+              f"{stats['p50_ms'] or 0:10.1f}{stats['p95_ms'] or 0:10.1f}{stats['p99_ms'] or 0:10.1f}")
+    dependencies = harness.dependency_stats()
+    print(f"\nDependency calls: {json.dumps(dependencies)}")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({"args": vars(args), "elapsed_s": round(elapsed, 2), "endpoints": report,
+                       "dependencies": dependencies}, f, indent=2)
+        print(f"Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,328 @@
+"""
+Local stand-ins for every external dependency the API talks to.
+
+HTTP services (OpenRouter, Ollama) and SMTP run as real servers on localhost so the
+app exercises its network code paths. Services reached through libraries we can't
+point elsewhere (YouTube search, Google Translate, MongoDB) are replaced with
+in-process fakes. Every stand-in takes a latency and an error rate.
+"""
+import json
+import random
+import socket
+import socketserver
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+
+    def delay(self):
+        if self.latency_ms or self.jitter_ms:
+            time.sleep(max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000)
+
+    def should_fail(self):
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+
+class StubStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, failed):
+        with self._lock:
+            self.calls += 1
+            self.errors += int(failed)
+
+    def as_dict(self):
+        return {"calls": self.calls, "errors": self.errors}
+
+
+# --- HTTP stubs ---
+
+DETECTION_REPLY = "Onion [120, 80, 340, 300], Tomato [400, 500, 620, 700], Brinjal [100, 600, 300, 900], Coriander"
+CHAT_REPLY = "Looks perfect ji! Keep stirring on a low flame so the masala doesn't catch."
+PERISHABILITY_REPLY = json.dumps({"ingredients": [
+    {"name": "Onion", "days_to_expiry": 20, "priority": "Low"},
+    {"name": "Tomato", "days_to_expiry": 6, "priority": "Medium"},
+    {"name": "Brinjal", "days_to_expiry": 5, "priority": "Medium"},
+    {"name": "Coriander", "days_to_expiry": 3, "priority": "High"},
+]})
+RECIPE_REPLY = json.dumps({
+    "name": "Load Test Sabzi", "description": "Stub recipe", "ingredients": "2 onions, 2 tomatoes",
+    "instructions": ["Chop everything.", "Cook for 10 minutes."], "prep_time": 10, "cook_time": 15,
+    "cuisine": "Indian", "diet": "Vegetarian", "course": "Main Course", "servings": 2,
+})
+
+
+def _make_handler(config, stats, respond):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else b""
+            config.delay()
+            failed = config.should_fail()
+            stats.record(failed)
+            if failed:
+                status, payload = random.choice([429, 500, 503]), {"error": "stub failure"}
+            else:
+                status, payload = 200, respond(self.path, json.loads(body or b"{}"))
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def openrouter_response(path, body):
+    text = ""
+    for message in body.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, list):
+            text += " ".join(block.get("text", "") for block in content if block.get("type") == "text")
+        elif isinstance(content, str):
+            text += content
+    reply = DETECTION_REPLY if "Identify the food ingredients" in text else CHAT_REPLY
+    return {"id": "stub", "model": body.get("model"), "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}}]}
+
+
+def ollama_response(path, body):
+    prompt = " ".join(m.get("content", "") for m in body.get("messages", []))
+    content = RECIPE_REPLY if "Create a unique and delicious recipe" in prompt else PERISHABILITY_REPLY
+    return {"model": body.get("model", "llama3"), "created_at": "2024-01-01T00:00:00Z",
+            "message": {"role": "assistant", "content": content}, "done": True}
+
+
+class HttpStub:
+    def __init__(self, name, respond, config):
+        self.name = name
+        self.config = config
+        self.stats = StubStats()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(config, self.stats, respond))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name=f"stub-{name}", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# --- SMTP stub ---
+
+class SmtpStub:
+    """Accepts mail over plain SMTP (EHLO, AUTH, MAIL, RCPT, DATA) and counts messages."""
+
+    def __init__(self, config):
+        self.config = config
+        self.stats = StubStats()
+        self.messages = []
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write((line + "\r\n").encode())
+
+            def handle(self):
+                self.reply("220 stub-smtp ready")
+                in_data, data_lines = False, []
+                for raw in self.rfile:
+                    line = raw.decode("utf-8", "replace").rstrip("\r\n")
+                    if in_data:
+                        if line == ".":
+                            in_data = False
+                            stub.config.delay()
+                            failed = stub.config.should_fail()
+                            stub.stats.record(failed)
+                            if failed:
+                                self.reply("451 stub failure")
+                            else:
+                                stub.messages.append("\n".join(data_lines))
+                                self.reply("250 OK queued")
+                            data_lines = []
+                        else:
+                            data_lines.append(line)
+                        continue
+                    verb = line.split(" ", 1)[0].upper()
+                    if verb in ("EHLO", "HELO"):
+                        self.reply("250-stub-smtp")
+                        self.reply("250 AUTH PLAIN LOGIN")
+                    elif verb == "AUTH":
+                        self.reply("235 Authentication successful")
+                    elif verb in ("MAIL", "RCPT", "RSET", "NOOP"):
+                        self.reply("250 OK")
+                    elif verb == "DATA":
+                        in_data = True
+                        self.reply("354 End data with <CR><LF>.<CR><LF>")
+                    elif verb == "QUIT":
+                        self.reply("221 Bye")
+                        return
+                    else:
+                        self.reply("502 Command not implemented")
+
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="stub-smtp", daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+# --- In-process fakes ---
+
+class FakeYoutubeSearch:
+    """Drop-in for youtube_search.YoutubeSearch."""
+    config = StubConfig()
+    stats = StubStats()
+
+    def __init__(self, query, max_results=1):
+        self.query = query
+
+    def to_dict(self):
+        FakeYoutubeSearch.config.delay()
+        failed = FakeYoutubeSearch.config.should_fail()
+        FakeYoutubeSearch.stats.record(failed)
+        if failed:
+            raise ConnectionError("stub youtube failure")
+        return [{"id": f"stub{abs(hash(self.query)) % 10 ** 8}"}]
+
+
+class FlakyTranslatorBackend:
+    name = "stub"
+
+    def __init__(self, config):
+        self.config = config
+        self.stats = StubStats()
+
+    def translate(self, text, target_lang):
+        self.config.delay()
+        failed = self.config.should_fail()
+        self.stats.record(failed)
+        if failed:
+            raise ConnectionError("stub translate failure")
+        return f"[{target_lang}] {text}"
+
+
+class _UpdateResult:
+    def __init__(self, matched, upserted=0):
+        self.matched_count = matched
+        self.modified_count = matched
+        self.upserted_count = upserted
+
+
+class FakeCollection:
+    """The subset of pymongo.Collection the app uses, held in memory."""
+
+    def __init__(self, config):
+        self.config = config
+        self.stats = StubStats()
+        self.docs = []
+        self._lock = threading.Lock()
+
+    def _op(self):
+        self.config.delay()
+        failed = self.config.should_fail()
+        self.stats.record(failed)
+        if failed:
+            raise ConnectionError("stub mongo failure")
+
+    @staticmethod
+    def _matches(doc, query):
+        for key, cond in (query or {}).items():
+            value = doc.get(key)
+            if isinstance(cond, dict) and "$in" in cond:
+                if value not in cond["$in"]:
+                    return False
+            elif value != cond:
+                return False
+        return True
+
+    def find_one(self, query=None, projection=None):
+        self._op()
+        with self._lock:
+            for doc in self.docs:
+                if self._matches(doc, query):
+                    return dict(doc)
+        return None
+
+    def find(self, query=None, projection=None):
+        self._op()
+        with self._lock:
+            return [dict(d) for d in self.docs if self._matches(d, query)]
+
+    def insert_one(self, doc):
+        self._op()
+        with self._lock:
+            doc.setdefault("_id", f"stub{len(self.docs)}")
+            self.docs.append(doc)
+
+    def update_one(self, query, update, upsert=False):
+        self._op()
+        with self._lock:
+            for doc in self.docs:
+                if self._matches(doc, query):
+                    for key, value in update.get("$set", {}).items():
+                        target = doc
+                        *parents, leaf = key.split(".")
+                        for part in parents:
+                            target = target.setdefault(part, {})
+                        target[leaf] = value
+                    for key, value in update.get("$push", {}).items():
+                        doc.setdefault(key, []).append(value)
+                    for key, value in update.get("$inc", {}).items():
+                        target = doc
+                        *parents, leaf = key.split(".")
+                        for part in parents:
+                            target = target.setdefault(part, {})
+                        target[leaf] = target.get(leaf, 0) + value
+                    return _UpdateResult(1)
+            if upsert:
+                new_doc = dict(query)
+                new_doc.update(update.get("$set", {}))
+                self.docs.append(new_doc)
+                return _UpdateResult(0, 1)
+        return _UpdateResult(0)
+
+    def count_documents(self, query):
+        return len(self.find(query))
+
+    def create_index(self, *args, **kwargs):
+        return None
+
+
+def find_free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
@@ -0,0 +1,339 @@
+"""
+Outbound mail: a persistent SQLite outbox and one background sender thread.
+
+Requests only enqueue. The sender drains due messages in batches over a single
+authenticated SMTP connection, reconnects when the server drops it, and retries
+transient failures with exponential backoff. When the server can't be reached or
+rejects the login, the whole batch is deferred and the sender backs off.
+The outbox file is opened on first use (app startup or the first send), not at import.
+
+To try it against a local debugging server:
+
+    python -m aiosmtpd -n -l 127.0.0.1:1025        # or MailHog, or loadtest.stubs.SmtpStub
+    SMTP_SERVER=127.0.0.1 SMTP_PORT=1025 SMTP_STARTTLS=0 SMTP_AUTH=0 python mailer.py send-test you@example.com
+"""
+import argparse
+import os
+import smtplib
+import sqlite3
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from logging_setup import get_logger
+from metrics import REGISTRY, Counter
+
+logger = get_logger("mailer")
+
+MAIL_QUEUE_PATH = os.getenv("MAIL_QUEUE_PATH", str(os.path.join(os.path.dirname(os.path.abspath(__file__)), "mail_queue.sqlite3")))
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "50"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "6"))
+MAIL_RETRY_BASE = float(os.getenv("MAIL_RETRY_BASE", "30"))  # seconds; doubles per attempt
+MAIL_RETRY_MAX = float(os.getenv("MAIL_RETRY_MAX", "3600"))
+MAIL_POLL_INTERVAL = float(os.getenv("MAIL_POLL_INTERVAL", "5"))
+# Close the connection after this long without traffic; most servers drop idle clients anyway
+MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", "30"))
+# A claimed message that isn't resolved within this window (sender crashed) becomes due again
+MAIL_CLAIM_LEASE = float(os.getenv("MAIL_CLAIM_LEASE", "300"))
+
+MAIL_EVENTS = REGISTRY.register(Counter(
+    "mail_messages_total", "Outbound mail by outcome", ("outcome",)))
+
+class SmtpSettings:
+    """SMTP_* environment, read when the sender (re)connects so tests and stubs can repoint it."""
+
+    def __init__(self):
+        self.server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+        self.port = int(os.getenv("SMTP_PORT", "587"))
+        self.user = os.getenv("SMTP_USER")
+        self.password = os.getenv("SMTP_PASSWORD")
+        self.starttls = os.getenv("SMTP_STARTTLS", "1") != "0"
+        self.auth = os.getenv("SMTP_AUTH", "1") != "0"
+        self.sender = os.getenv("EMAIL_FROM", "noreply@ai-chef.com")
+        self.timeout = float(os.getenv("SMTP_TIMEOUT", "20"))
+
+    @property
+    def configured(self):
+        """Credentials, or SMTP_AUTH=0 with an explicit SMTP_SERVER (local relays and debugging servers)."""
+        if self.auth:
+            return bool(self.user and self.password)
+        return "SMTP_SERVER" in os.environ
+
+def build_message(sender, to_email, subject, html_content):
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(html_content, 'html'))
+    return msg
+
+class MailQueue:
+    """
+    Outbox table in SQLite. Safe to share between threads and between worker processes:
+    claiming pushes next_attempt_at past a lease inside an IMMEDIATE transaction.
+    """
+
+    def __init__(self, path=MAIL_QUEUE_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    to_email TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    html TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_error TEXT
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+
+    def enqueue(self, to_email, subject, html_content):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbox (to_email, subject, html, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+                (to_email, subject, html_content, now, now))
+            return cursor.lastrowid
+
+    def claim_due(self, limit=MAIL_BATCH_SIZE, lease=MAIL_CLAIM_LEASE):
+        """Returns up to `limit` due messages as (id, to_email, subject, html, attempts) and leases them."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, to_email, subject, html, attempts FROM outbox WHERE status = 'pending' AND next_attempt_at <= ? "
+                    "ORDER BY next_attempt_at LIMIT ?", (now, limit)).fetchall()
+                if rows:
+                    self._conn.executemany("UPDATE outbox SET next_attempt_at = ? WHERE id = ?", [(now + lease, row[0]) for row in rows])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rows
+
+    def next_due_in(self):
+        """Seconds until the earliest pending message is due (0 if overdue), or None when the queue is empty."""
+        with self._lock:
+            row = self._conn.execute("SELECT MIN(next_attempt_at) FROM outbox WHERE status = 'pending'").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def mark_sent(self, message_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM outbox WHERE id = ?", (message_id,))
+
+    def mark_retry(self, message_id, attempts, error, delay):
+        with self._lock:
+            self._conn.execute("UPDATE outbox SET attempts = ?, last_error = ?, next_attempt_at = ? WHERE id = ?",
+                               (attempts, error, time.time() + delay, message_id))
+
+    def mark_failed(self, message_id, attempts, error):
+        """Failed messages stay in the table for inspection."""
+        with self._lock:
+            self._conn.execute("UPDATE outbox SET status = 'failed', attempts = ?, last_error = ? WHERE id = ?",
+                               (attempts, error, message_id))
+
+    def counts(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+
+class SmtpConnectError(Exception):
+    """Connecting, STARTTLS or login failed: a server-level problem, not one with a particular message."""
+
+def is_permanent(error):
+    """5xx replies for the message or its recipient won't succeed on retry."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, (smtplib.SMTPDataError, smtplib.SMTPSenderRefused)):
+        return error.smtp_code >= 500
+    return False
+
+class MailSender:
+    """Background thread that drains MailQueue over one reused SMTP connection."""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self._smtp = None
+        self._last_used = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._connect_failures = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="mail-sender", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._disconnect()
+
+    def wake(self):
+        self._wake.set()
+
+    def _connect(self, settings):
+        try:
+            smtp = smtplib.SMTP(settings.server, settings.port, timeout=settings.timeout)
+        except (OSError, smtplib.SMTPException) as e:
+            raise SmtpConnectError(f"{type(e).__name__}: {e}") from e
+        try:
+            if settings.starttls:
+                smtp.starttls()
+            if settings.auth and settings.user and settings.password:
+                smtp.login(settings.user, settings.password)  # SMTPAuthenticationError lands here
+        except (OSError, smtplib.SMTPException) as e:
+            smtp.close()
+            raise SmtpConnectError(f"{type(e).__name__}: {e}") from e
+        self._connect_failures = 0
+        return smtp
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _deliver(self, settings, msg):
+        """Sends on the pooled connection, reconnecting once if the server dropped it."""
+        for attempt in range(2):
+            if self._smtp is None:
+                self._smtp = self._connect(settings)
+            try:
+                self._smtp.send_message(msg)
+                self._last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                self._smtp.close()
+                self._smtp = None
+                if attempt:
+                    raise
+
+    def send_batch(self):
+        """Sends every due message once. Returns how many were claimed."""
+        rows = self.queue.claim_due()
+        if not rows:
+            return 0
+        settings = SmtpSettings()
+        for position, (message_id, to_email, subject, html, attempts) in enumerate(rows):
+            attempts += 1
+            try:
+                self._deliver(settings, build_message(settings.sender, to_email, subject, html))
+            except SmtpConnectError as e:
+                self._defer(rows[position:], str(e))
+                return len(rows)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if not isinstance(e, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                    self._disconnect()  # dead socket or protocol trouble: start fresh next time
+                if is_permanent(e) or attempts >= MAIL_MAX_ATTEMPTS:
+                    self.queue.mark_failed(message_id, attempts, error)
+                    MAIL_EVENTS.inc("failed")
+                    logger.warning(f"Giving up on email {message_id} to {to_email} after {attempts} attempt(s): {error}")
+                else:
+                    delay = min(MAIL_RETRY_MAX, MAIL_RETRY_BASE * 2 ** (attempts - 1))
+                    self.queue.mark_retry(message_id, attempts, error, delay)
+                    MAIL_EVENTS.inc("retried")
+                    logger.warning(f"Email {message_id} to {to_email} failed ({error}); retrying in {delay:.0f}s")
+                continue
+            self.queue.mark_sent(message_id)
+            MAIL_EVENTS.inc("sent")
+            logger.info(f"Email sent successfully to {to_email}")
+        return len(rows)
+
+    def _defer(self, rows, error):
+        """Puts the rest of a batch back after a connection-level failure, without using up their attempts."""
+        self._connect_failures += 1
+        delay = min(MAIL_RETRY_MAX, MAIL_RETRY_BASE * 2 ** (self._connect_failures - 1))
+        for message_id, _, _, _, attempts in rows:
+            self.queue.mark_retry(message_id, attempts, error, delay)
+        MAIL_EVENTS.inc("deferred", amount=len(rows))
+        logger.warning(f"SMTP server unavailable ({error}); deferring {len(rows)} email(s) for {delay:.0f}s")
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.send_batch() and not self._stop.is_set():
+                    pass
+            except Exception as e:
+                logger.error(f"Mail sender error: {e}")
+            if self._smtp is not None and time.monotonic() - self._last_used > MAIL_IDLE_TIMEOUT:
+                self._disconnect()
+            due_in = self.queue.next_due_in()
+            timeout = MAIL_POLL_INTERVAL if due_in is None else min(MAIL_POLL_INTERVAL, due_in)
+            if self._smtp is not None:
+                timeout = min(timeout, MAIL_IDLE_TIMEOUT)
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+class Mailer:
+    """Outbox plus sender, opened on first use so importing this module touches no files."""
+
+    def __init__(self, path=MAIL_QUEUE_PATH):
+        self.path = path
+        self.queue = None
+        self.sender = None
+        self._open_lock = threading.Lock()
+
+    def open(self):
+        with self._open_lock:
+            if self.queue is None:
+                self.queue = MailQueue(self.path)
+                self.sender = MailSender(self.queue)
+        return self
+
+    def send(self, to_email, subject, html_content):
+        """Queues a message for background delivery. Returns False when SMTP isn't configured."""
+        if not SmtpSettings().configured:
+            logger.warning("SMTP credentials not set. Skipping email.")
+            return False
+        self.open()
+        self.queue.enqueue(to_email, subject, html_content)
+        self.sender.start()
+        self.sender.wake()
+        return True
+
+    def start(self):
+        self.open().sender.start()
+
+    def stop(self):
+        if self.sender is not None:
+            self.sender.stop()
+
+mailer = Mailer()
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect the mail outbox or send a test message.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Message counts by status")
+    send_test = sub.add_parser("send-test", help="Queue a test message and deliver it now")
+    send_test.add_argument("to")
+    args = parser.parse_args(argv)
+    mailer.open()
+
+    if args.command == "status":
+        print(mailer.queue.counts() or "empty")
+        return
+    mailer.queue.enqueue(args.to, "AI Chef test message", "<p>It works.</p>")
+    while mailer.sender.send_batch():
+        pass
+    mailer.sender.stop()
+    print(mailer.queue.counts() or "delivered")
+
+if __name__ == "__main__":
+    main_cli()
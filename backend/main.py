@@ -1,8 +1,7 @@
 import requests
 import time
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Depends, status
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Depends, Request, status
 from pydantic import BaseModel
-from deep_translator import GoogleTranslator
 import pickle
 import pandas as pd
 from typing import List, Optional, Dict, Any
@@ -12,18 +11,23 @@ import nltk
 from nltk.corpus import stopwords
 import string
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+import scipy.sparse as sp
 from sklearn.feature_extraction.text import TfidfVectorizer
 import numpy as np
 from youtube_search import YoutubeSearch
 import concurrent.futures
+import asyncio
 import json
 import base64
 import socket
 import random
+import hmac
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import timedelta, datetime
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from PIL import Image, ExifTags
 import io
 
@@ -35,12 +39,45 @@ env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
 # Database & Auth
-from database import get_users_collection, get_recipe_collection
-from auth import get_current_user, create_access_token, get_password_hash, verify_password, ACCESS_TOKEN_EXPIRE_MINUTES, UserInDB
+from database import get_users_collection, get_recipe_collection, get_result_cache_collection
+from auth import get_current_user, user_from_token, create_access_token, get_password_hash, verify_password, ACCESS_TOKEN_EXPIRE_MINUTES, UserInDB
+from text_processing import COOKING_STOPWORDS, clean_ingredient_text, preprocess_text
+from recipe_store import RecipeStore, DISPLAY_FIELDS
+from ann_index import ANN_INDEX_PATH, DEFAULT_NPROBE, load_ann_index
+from similar_recipes import SIMILAR_TABLE_PATH, load_neighbour_table
+from compact_model import matrix_nbytes, serving_matrix
+from sharded_scorer import SCORING_SHARDS, ShardedScorer
+from pantry import build_pantry_index, split_ingredients
+from ingredient_matcher import build_ingredient_matcher
+from meal_plan import expiry_days, greedy_cover, schedule, urgency_weight
+from personalization import ACTION_WEIGHTS, PreferenceVector, popularity_rerank, preference_update, rerank
+from trending import TRENDING_ACTION_WEIGHTS, trending
+from translation import translation_service
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, SLOW_REQUESTS, STAGE_DEGRADED, MetricsMiddleware, span, timed, bind_context, observe_upstream
+from profiling import FORMATS as PROFILE_FORMATS, ProfilingMiddleware, continuous_profiler, profile_store
+from logging_setup import get_logger
+from compression import CompressionMiddleware
+from ratelimit import ADMISSION, admission, client_key
+from serialization import FastJSONResponse, json_dumps, parse_fields, select_fields
+from mailer import mailer
+from result_cache import RESULT_CACHE_SHARED, MongoResultTier, ResultCache, model_fingerprint, query_key
+
+logger = get_logger("ai_chef")
 
 # Initialize FastAPI
 app = FastAPI()
 
+async def authorize_profiling(scope):
+    """Only admins may profile a request (see profiling.py). The user lookup runs off the event loop."""
+    authorization = dict(scope.get("headers") or []).get(b"authorization", b"").decode("latin-1")
+    if not authorization.lower().startswith("bearer "):
+        return False
+    try:
+        user = await run_in_threadpool(user_from_token, authorization[7:])
+    except HTTPException:
+        return False
+    return user.is_admin
+
 # Enable CORS
 app.add_middleware(
     CORSMiddleware,
@@ -48,13 +85,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Retry-After", "X-Profile"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(ProfilingMiddleware, authorize=authorize_profiling)
+app.add_middleware(MetricsMiddleware)
 
 # --- Models ---
+class PantryItem(BaseModel):
+    name: str
+    days_to_expiry: Optional[float] = None
+    priority: Optional[str] = None # "High" / "Medium" / "Low", as /detect-ingredients returns
+    weight: Optional[float] = None # explicit query weight; overrides the expiry-based boost
+
 class RecipeRequest(BaseModel):
-    ingredients: str
+    ingredients: str = ""
     prep_time: int
     cook_time: int
+    pantry: Optional[List[PantryItem]] = None # ingredients with expiry data; soon-to-expire ones are boosted
+    retrieval: Optional[str] = None # "exact" or "ann"; defaults to RETRIEVAL_MODE
+    ann_probes: Optional[int] = None # ANN recall/latency knob
+    sort: Optional[str] = None # "score" (default) or "fewest_missing"
+    target_lang: Optional[str] = None # translate names and instructions, e.g. "hi"
+
+class PlanRequest(BaseModel):
+    pantry: List[PantryItem]
+    meals: int = 3
+    ingredients: str = "" # anything else on hand, unweighted
+    prep_time: int = 30
+    cook_time: int = 30
 
 class UserCreate(BaseModel):
     email: str
@@ -93,6 +152,29 @@ class Recipe(BaseModel):
     diet: Optional[str] = None
     servings: Optional[int] = None
 
+class PlannedMeal(BaseModel):
+    meal: int
+    recipe: Recipe
+    uses: List[str] = []   # pantry items the recipe calls for
+    covers: List[str] = [] # of those, the ones no earlier meal used
+
+class MealPlan(BaseModel):
+    meals: List[PlannedMeal]
+    uncovered: List[PantryItem] = [] # pantry items no planned meal uses, soonest-expiring first
+
+class SimilarRecipe(BaseModel):
+    id: int
+    name: str
+    translated_name: str
+    similarity: int # 0-100 percentage
+    prep_time: int
+    cook_time: int
+    cuisine: Optional[str] = None
+    course: Optional[str] = None
+    diet: Optional[str] = None
+
+RECIPE_FIELDS = set(Recipe.model_fields)
+
 class ForgotPasswordRequest(BaseModel):
     email: str
 
@@ -104,14 +186,79 @@ class TranslationRequest(BaseModel):
     text: str
     target_lang: str
 
+class BatchTranslationRequest(BaseModel):
+    texts: List[str]
+    target_lang: str
+
 # --- Globals & Setup ---
 model_data = None
 tfidf_vectorizer = None
 tfidf_matrix = None
+tfidf_terms = None
 df_english = None
 
+# Scoring arrays, row-aligned with tfidf_matrix. These are all we keep resident
+# when display fields are served from MongoDB.
+recipe_srnos = None
+prep_times = None
+cook_times = None
+max_prep_time = 1
+max_cook_time = 1
+srno_lookup = None # pd.Index over recipe_srnos for Srno -> row position
+
+# "pickle" keeps the full DataFrame in memory; "mongo" fetches display fields on demand
+RECIPE_SOURCE = os.getenv("RECIPE_SOURCE", "pickle").lower()
+RECIPE_CACHE_SIZE = int(os.getenv("RECIPE_CACHE_SIZE", "5000"))
+recipe_store = None
+
+# "exact" scores every row; "ann" searches the dense LSA index built by ann_index.py
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "exact").lower()
+ANN_DENSE_WEIGHT = float(os.getenv("ANN_DENSE_WEIGHT", "0.3"))
+ann_index = None
+
+# Recipe x ingredient incidence matrix for missing-ingredient scoring
+pantry_index = None
+
+# Free text -> canonical ingredient names. Synonym table only until the model's vocabulary is loaded.
+ingredient_matcher = build_ingredient_matcher()
+
+# Precomputed "more like this" table built by similar_recipes.py
+neighbour_table = None
+
+# Exact scoring split into SCORING_SHARDS row shards scored in parallel; None uses calculate_similarity
+sharded_scorer = None
+
+# Identifies the loaded model and ANN index; part of every result cache key
+model_version = None
+
+# /plan limits, and how many top candidates each of its query rows contributes to the pool
+MAX_PLAN_MEALS = int(os.getenv("MAX_PLAN_MEALS", "21"))
+MAX_PLAN_ITEMS = int(os.getenv("MAX_PLAN_ITEMS", "40"))
+PLAN_POOL_PER_QUERY = int(os.getenv("PLAN_POOL_PER_QUERY", "100"))
+# Catalog rows scored per block when /plan pools candidates without the sharded scorer
+PLAN_BLOCK_ROWS = int(os.getenv("PLAN_BLOCK_ROWS", "20000"))
+
+# /translate and /translate/batch limits: texts per batch and characters per text
+MAX_TRANSLATE_TEXTS = int(os.getenv("MAX_TRANSLATE_TEXTS", "200"))
+MAX_TRANSLATE_CHARS = int(os.getenv("MAX_TRANSLATE_CHARS", "5000"))
+
+# /recommend pipeline: scoring gets its own pool so slow enrichment calls can't starve it, and
+# translation gets one so a YouTube outage can't either.
+# Enrichment stages that miss their deadline (seconds) are dropped from the response.
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", "4"))
+ENRICHMENT_WORKERS = int(os.getenv("ENRICHMENT_WORKERS", "32"))
+TRANSLATE_STAGE_WORKERS = int(os.getenv("TRANSLATE_STAGE_WORKERS", "8"))
+STAGE_TIMEOUTS = {
+    "youtube": float(os.getenv("YOUTUBE_TIMEOUT", "4")),
+    "translate": float(os.getenv("TRANSLATE_TIMEOUT", "3")),
+    "ollama": float(os.getenv("OLLAMA_TIMEOUT", "90")),
+}
+scoring_executor = concurrent.futures.ThreadPoolExecutor(max_workers=SCORING_WORKERS, thread_name_prefix="scoring")
+enrichment_executor = concurrent.futures.ThreadPoolExecutor(max_workers=ENRICHMENT_WORKERS, thread_name_prefix="enrich")
+translation_executor = concurrent.futures.ThreadPoolExecutor(max_workers=TRANSLATE_STAGE_WORKERS, thread_name_prefix="translate")
+
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
 
 # Ordered by preference
 VISION_MODELS = [
@@ -121,8 +268,22 @@ VISION_MODELS = [
     "nvidia/llama-3.2-90b-vision-instruct:free",
     "meta-llama/llama-3.2-11b-vision-instruct:free",
 ]
+# These reject more than one image per request
+SINGLE_IMAGE_MODELS = {
+    "nvidia/llama-3.2-90b-vision-instruct:free",
+    "meta-llama/llama-3.2-11b-vision-instruct:free",
+}
+
+# /detect-ingredients: photos per request, longest side sent upstream, and how many
+# single-image requests may run at once when the photos can't go in one request
+MAX_DETECT_IMAGES = int(os.getenv("MAX_DETECT_IMAGES", "6"))
+MAX_IMAGE_DIMENSION = int(os.getenv("MAX_IMAGE_DIMENSION", "1600"))
+DETECT_IMAGE_CONCURRENCY = int(os.getenv("DETECT_IMAGE_CONCURRENCY", "3"))
 
-MODEL_PATH = r"recipe_recommender_model.pkl"
+MODEL_PATH = os.getenv("MODEL_PATH", r"recipe_recommender_model.pkl")
+# "float32" downcasts the TF-IDF matrix at load (half the memory of float64). Empty keeps the stored
+# dtype; float16 models written by compact_model.py are always served as float32.
+MODEL_DTYPE = os.getenv("MODEL_DTYPE", "").lower() or None
 
 try:
     nltk.data.find('tokenizers/punkt')
@@ -135,7 +296,8 @@ except LookupError:
     nltk.download('stopwords')
 
 def load_model():
-    global model_data, tfidf_vectorizer, tfidf_matrix, df_english
+    global model_data, tfidf_vectorizer, tfidf_matrix, tfidf_terms, df_english, recipe_store, ann_index, neighbour_table, pantry_index, model_version
+    global ingredient_matcher, sharded_scorer
     try:
         if os.path.exists(MODEL_PATH):
             with open(MODEL_PATH, 'rb') as f:
@@ -143,56 +305,136 @@ def load_model():
             
             # Unpack the model data
             tfidf_vectorizer = model_data['tfidf_vectorizer']
-            tfidf_matrix = model_data['tfidf_matrix']
-            
-            # Load from MongoDB
-            # Load from MongoDB - DISABLED per user request to use Pickle file
-            # mongo_recipes = get_recipe_collection()
-            # if mongo_recipes is not None:
-            #     print("Loading recipes from MongoDB...")
-            #     # Sort by Srno to match TF-IDF matrix alignment!
-            #     cursor = mongo_recipes.find().sort("Srno", 1)
-            #     recipes_list = list(cursor)
-            #     if recipes_list:
-            #         df_english = pd.DataFrame(recipes_list)
-            #         print(f"Loaded {len(df_english)} recipes from MongoDB.")
-            #     else:
-            #          print("MongoDB collection text empty. Fallback to pickle dataframe.")
-            #          df_english = model_data['dataframe']
-            # else:
-            #      print("MongoDB not connected. Fallback to pickle dataframe.")
-            df_english = model_data['dataframe']
+            tfidf_matrix = serving_matrix(model_data['tfidf_matrix'], MODEL_DTYPE)
+            model_data['tfidf_matrix'] = tfidf_matrix
+            # Query vectors in the matrix dtype, otherwise cosine_similarity upcasts the whole matrix per query
+            tfidf_vectorizer.dtype = tfidf_matrix.dtype.type
+            logger.info(f"TF-IDF matrix: {tfidf_matrix.shape[0]} x {tfidf_matrix.shape[1]} {tfidf_matrix.dtype}, "
+                        f"{matrix_nbytes(tfidf_matrix) / 1e6:.1f} MB.")
+            tfidf_terms = tfidf_vectorizer.get_feature_names_out()
+            install_scoring_arrays(model_data['dataframe'])
+
+            if sharded_scorer is not None:
+                sharded_scorer.shutdown()
+            sharded_scorer = None
+            if SCORING_SHARDS > 0:
+                sharded_scorer = ShardedScorer(tfidf_matrix, prep_times, cook_times, max_prep_time, max_cook_time, SCORING_SHARDS)
+                logger.info(f"Sharded scorer ready ({len(sharded_scorer)} shards).")
+
+            t0 = time.perf_counter()
+            pantry_index = build_pantry_index(model_data['dataframe']['Ingredients'])
+            logger.info(f"Pantry index built ({len(pantry_index.names)} ingredients) in {time.perf_counter() - t0:.1f}s.")
+            ingredient_matcher = build_ingredient_matcher(tfidf_vectorizer, tfidf_matrix.shape[0])
+            logger.info(f"Ingredient matcher built ({len(ingredient_matcher)} phrases).")
+
+            ann_index = None
+            if os.path.exists(ANN_INDEX_PATH):
+                try:
+                    index = load_ann_index(ANN_INDEX_PATH)
+                    if index.svd.components_.shape[1] != tfidf_matrix.shape[1]:
+                        logger.warning(f"ANN index was built for {index.svd.components_.shape[1]} terms but the model has {tfidf_matrix.shape[1]}. Rebuild it; ANN retrieval disabled.")
+                    elif index.n_rows == tfidf_matrix.shape[0]:
+                        ann_index = index
+                        logger.info(f"ANN index loaded ({index.backend}, {index.n_rows} rows).")
+                    else:
+                        logger.warning(f"ANN index has {index.n_rows} rows but the model has {tfidf_matrix.shape[0]}. Rebuild it; ANN retrieval disabled.")
+                except Exception as e:
+                    logger.warning(f"Could not load ANN index: {e}")
+
+            neighbour_table = None
+            if os.path.exists(SIMILAR_TABLE_PATH):
+                try:
+                    table = load_neighbour_table(SIMILAR_TABLE_PATH)
+                    if np.array_equal(table.srnos, recipe_srnos):
+                        neighbour_table = table
+                        logger.info(f"Similar-recipes table loaded ({table.neighbours.shape[1]} neighbours per recipe).")
+                    else:
+                        logger.warning("Similar-recipes table doesn't match the model's recipes. Rebuild it; falling back to live scoring.")
+                except Exception as e:
+                    logger.warning(f"Could not load similar-recipes table: {e}")
+
+            mongo_recipes = get_recipe_collection() if RECIPE_SOURCE == "mongo" else None
+            if mongo_recipes is not None:
+                # Display fields come from MongoDB by Srno; drop the DataFrame so only scoring arrays stay resident
+                recipe_store = RecipeStore(mongo_recipes, max_size=RECIPE_CACHE_SIZE)
+                model_data.pop('dataframe', None)
+                df_english = None
+                logger.info(f"Serving recipe details from MongoDB (LRU size {RECIPE_CACHE_SIZE}).")
+            else:
+                if RECIPE_SOURCE == "mongo":
+                    logger.warning("MongoDB not connected. Fallback to pickle dataframe.")
+                df_english = model_data['dataframe']
+
+            model_version = model_fingerprint(MODEL_PATH, ANN_INDEX_PATH if ann_index is not None else None,
+                                              settings=(tfidf_matrix.dtype, SCORING_SHARDS))
+            result_cache.set_version(model_version)
             
-            print("Model loaded successfully.")
+            logger.info(f"Model loaded successfully (version {model_version}).")
         else:
-            print(f"Model file not found at {MODEL_PATH}")
+            logger.warning(f"Model file not found at {MODEL_PATH}")
     except Exception as e:
-        print(f"Error loading model: {e}")
+        logger.error(f"Error loading model: {e}")
+
+def install_scoring_arrays(df):
+    global recipe_srnos, prep_times, cook_times, max_prep_time, max_cook_time, srno_lookup
+    recipe_srnos = df['Srno'].to_numpy(dtype=np.int64)
+    srno_lookup = pd.Index(recipe_srnos)
+    prep_times = df['PrepTimeInMins'].to_numpy(dtype=np.float32)
+    cook_times = df['CookTimeInMins'].to_numpy(dtype=np.float32)
+    max_prep_time = float(prep_times.max()) if len(prep_times) else 0
+    max_cook_time = float(cook_times.max()) if len(cook_times) else 0
+    if max_prep_time == 0: max_prep_time = 1
+    if max_cook_time == 0: max_cook_time = 1
+
+def model_ready():
+    return tfidf_vectorizer is not None and tfidf_matrix is not None and recipe_srnos is not None
+
+def rows_for_srnos(srnos):
+    return srno_lookup.get_indexer(np.asarray(srnos, dtype=np.int64))
+
+@timed("fetch_recipe_rows")
+def fetch_recipe_rows(indices):
+    """Returns the catalog rows at the given matrix positions, in order, as a DataFrame."""
+    if df_english is not None:
+        return df_english.iloc[indices].copy()
+    docs = recipe_store.get_many(recipe_srnos[indices])
+    return pd.DataFrame(docs, columns=DISPLAY_FIELDS)
+
+# Columns the shared result cache tier stores; display fields are re-fetched by Srno
+CACHED_CANDIDATE_COLUMNS = ['Srno', 'similarity_score', 'missing_count', 'pantry_coverage', 'missing_names']
+
+def encode_candidates(recommendations):
+    return {c: recommendations[c].tolist() for c in CACHED_CANDIDATE_COLUMNS if c in recommendations.columns}
+
+def decode_candidates(value):
+    cached = pd.DataFrame(value)
+    rows = rows_for_srnos(cached['Srno'])
+    recommendations = fetch_recipe_rows(rows[rows >= 0])
+    return recommendations.merge(cached, on='Srno', how='inner')
+
+# Normalised-query cache of scored, profile-filtered candidates (before personalisation)
+result_cache = ResultCache()
+if RESULT_CACHE_SHARED == "mongo":
+    result_cache_collection = get_result_cache_collection()
+    if result_cache_collection is not None:
+        result_cache.shared = MongoResultTier(result_cache_collection, encode_candidates, decode_candidates)
+    else:
+        logger.warning("MongoDB not connected. Result cache is in-process only.")
 
 load_model()
 
 try:
     import ollama
-    print("Ollama module loaded. Using 'llama3' for text analysis.")
+    logger.info("Ollama module loaded. Using 'llama3' for text analysis.")
 except ImportError:
-    print("Error: Ollama module not found. Please install with `pip install ollama`.")
-
-    print("Error: Ollama module not found. Please install with `pip install ollama`.")
+    logger.error("Error: Ollama module not found. Please install with `pip install ollama`.")
 
 # --- Helper Functions ---
-COOKING_STOPWORDS = {
-    "teaspoon", "tsp", "tablespoon", "tbsp", "cup", "gram", "gms", "g", "kg", "ml", "liter", "litre", "l", "lb", "oz", "pinch", "bunch", "sprig", "cloves",
-    "chopped", "sliced", "diced", "minced", "grated", "crushed", "beaten", "whisked", "sifted", "melted", "slit", "halved", "quartered", "cubed",
-    "peeled", "cored", "seeded", "washed", "cleaned", "dried", "roasted", "toasted", "fried", "boiled", "warm", "cold", "hot", "lukewarm",
-    "taste", "size", "small", "medium", "large", "fresh", "whole", "powder", "seeds", "oil", "leaves", "wedges", "fillet", "fillets", "boneless", "skinless",
-    "water", "salt", "ice" 
-}
-
 def encode_image(file_bytes: bytes) -> str:
     return base64.b64encode(file_bytes).decode("utf-8")
 
 
-def call_openrouter_with_fallback(payload: dict):
+def call_openrouter_with_fallback(payload: dict, models=None):
     headers = {
         "Authorization": f"Bearer {OPENROUTER_API_KEY}",
         "Content-Type": "application/json",
@@ -202,48 +444,58 @@ def call_openrouter_with_fallback(payload: dict):
 
     last_exception = None
 
-    for model in VISION_MODELS:
+    for model in models or VISION_MODELS:
         payload["model"] = model
-        print(f"Trying model: {model}")
+        logger.info(f"Trying model: {model}")
 
         for attempt in range(3):  # retry 3 times per model
+            started = time.perf_counter()
             try:
-                response = requests.post(
-                    OPENROUTER_URL,
-                    json=payload,
-                    headers=headers,
-                    timeout=60
-                )
+                with span("openrouter"):
+                    response = requests.post(
+                        OPENROUTER_URL,
+                        json=payload,
+                        headers=headers,
+                        timeout=60
+                    )
+                outcome = {200: "ok", 429: "rate_limited", 404: "not_found"}.get(response.status_code, "error")
 
                 if response.status_code == 200:
                     data = response.json()
                     if "choices" in data and len(data["choices"]) > 0:
+                        observe_upstream("openrouter", model, "ok", time.perf_counter() - started)
                         return data, model
                     else:
-                        print(f"Model {model} returned 200 but missing 'choices' or empty: {data}")
+                        outcome = "invalid_response"
+                        observe_upstream("openrouter", model, outcome, time.perf_counter() - started)
+                        logger.warning(f"Model {model} returned 200 but missing 'choices' or empty: {data}")
                         # Treat as error to try next model
                         last_exception = f"Model {model} returned invalid response format"
                         break # Try next model
 
+                observe_upstream("openrouter", model, outcome, time.perf_counter() - started)
+
                 # Rate limit → retry with backoff
                 if response.status_code == 429:
                     wait_time = (attempt + 1) * 2  # 2s, 4s, 6s
-                    print(f"Rate limited on {model}, retrying in {wait_time}s...")
+                    ADMISSION.throttle(wait_time)
+                    logger.warning(f"Rate limited on {model}, retrying in {wait_time}s...")
                     time.sleep(wait_time)
                     continue
                 
                 # 404 Not Found → Skip immediately
                 if response.status_code == 404:
-                    print(f"Model {model} not found (404). Skipping.")
+                    logger.warning(f"Model {model} not found (404). Skipping.")
                     break # Break inner loop to try next model
 
                 # Other errors → log and break to next model
-                print(f"Error {response.status_code} with {model}: {response.text}")
+                logger.error(f"Error {response.status_code} with {model}: {response.text}")
                 last_exception = f"Error {response.status_code}: {response.text}"
                 break # Break inner loop to try next model
 
             except Exception as e:
-                print(f"Exception with {model}: {e}")
+                observe_upstream("openrouter", model, "exception", time.perf_counter() - started)
+                logger.warning(f"Exception with {model}: {e}")
                 last_exception = str(e)
                 # Don't break immediately on connection errors, maybe retry?
                 # For now let's retry on exception too
@@ -306,57 +558,63 @@ def parse_ingredients_with_bboxes(text):
     return ingredients, bbox_map
 
 
-def execute_with_retry(func, retries=3, delay=1, default=None):
+def execute_with_retry(func, retries=3, delay=1, default=None, deadline=None):
     """
     Executes a function with retry logic for network-related errors.
+    With a `deadline` (time.monotonic()), gives up instead of backing off past it.
     """
     for attempt in range(retries):
         try:
             return func()
         except (requests.exceptions.RequestException, socket.gaierror, Exception) as e:
-            print(f"Attempt {attempt + 1}/{retries} failed for {func.__name__ if hasattr(func, '__name__') else 'unknown'}: {e}")
-            if attempt < retries - 1:
-                time.sleep(delay * (attempt + 1))  # Simple backoff
-            else:
-                print(f"All retries failed. Returning default.")
+            logger.warning(f"Attempt {attempt + 1}/{retries} failed for {func.__name__ if hasattr(func, '__name__') else 'unknown'}: {e}")
+            if attempt == retries - 1:
+                logger.warning(f"All retries failed. Returning default.")
+                return default
+            if deadline is not None and time.monotonic() + delay * (attempt + 1) >= deadline:
+                logger.warning(f"No time left to retry before the deadline. Returning default.")
                 return default
+            time.sleep(delay * (attempt + 1))  # Simple backoff
 
-def clean_ingredient_text(text):
-    text = text.lower()
-    text = ''.join([i for i in text if not i.isdigit()])
-    text = text.replace("/", " ").replace(".", " ")
-    try:
-        tokens = nltk.word_tokenize(text)
-    except:
-        tokens = text.split()
-    clean_tokens = []
-    for word in tokens:
-        word = word.strip(string.punctuation)
-        if not word: continue
-        if word in COOKING_STOPWORDS: continue
-        if word in stopwords.words('english'): continue
-        if len(word) < 2: continue 
-        clean_tokens.append(word)
-    return ' '.join(clean_tokens)
-
-def preprocess_text(text):
-    return clean_ingredient_text(text)
-
-def calculate_similarity(user_ingredients, user_prep_time, user_cook_time):
-    if tfidf_vectorizer is None or tfidf_matrix is None or df_english is None:
+def build_query_vector(user_ingredients, weights=None):
+    """TF-IDF query row. `weights` maps ingredient names to term multipliers (see meal_plan.urgency_weight)."""
+    user_ingredients_text = preprocess_text(', '.join(user_ingredients))
+    query = tfidf_vectorizer.transform([user_ingredients_text])
+    if weights:
+        query = boost_query_terms(query, user_ingredients, weights)
+    return query
+
+def boost_query_terms(query, user_ingredients, weights):
+    """Scales each ingredient's terms by its weight (the largest when ingredients share a term) and re-normalises."""
+    analyzer = tfidf_vectorizer.build_analyzer()
+    scale = {}
+    for ingredient in user_ingredients:
+        weight = weights.get(ingredient, 1.0)
+        for term in analyzer(preprocess_text(ingredient)):
+            column = tfidf_vectorizer.vocabulary_.get(term)
+            if column is not None:
+                scale[column] = max(scale.get(column, 0.0), weight)
+    query = query.copy()
+    query.data *= np.array([scale.get(column, 1.0) for column in query.indices], dtype=query.dtype)
+    query.eliminate_zeros()
+    return normalize(query, norm="l2", copy=False)
+
+def time_similarity(user_prep_time, user_cook_time, indices=None):
+    prep = prep_times if indices is None else prep_times[indices]
+    cook = cook_times if indices is None else cook_times[indices]
+    prep_time_similarity = 1 - np.abs(prep - user_prep_time) / max_prep_time
+    cook_time_similarity = 1 - np.abs(cook - user_cook_time) / max_cook_time
+    return prep_time_similarity, cook_time_similarity
+
+@timed("calculate_similarity")
+def calculate_similarity(user_ingredients, user_prep_time, user_cook_time, weights=None):
+    if not model_ready():
         raise HTTPException(status_code=503, detail="Model not loaded")
 
-    user_ingredients_text = preprocess_text(', '.join(user_ingredients))
-    user_tfidf = tfidf_vectorizer.transform([user_ingredients_text])
+    user_tfidf = build_query_vector(user_ingredients, weights)
     cosine_similarities = cosine_similarity(user_tfidf, tfidf_matrix)[0]
 
-    max_prep = df_english['PrepTimeInMins'].max()
-    max_cook = df_english['CookTimeInMins'].max()
-    if max_prep == 0: max_prep = 1
-    if max_cook == 0: max_cook = 1
-
-    prep_time_similarity = 1 - abs(df_english['PrepTimeInMins'] - user_prep_time) / max_prep
-    cook_time_similarity = 1 - abs(df_english['CookTimeInMins'] - user_cook_time) / max_cook
+    prep_time_similarity, cook_time_similarity = time_similarity(user_prep_time, user_cook_time)
 
     min_length = min(len(cosine_similarities), len(prep_time_similarity), len(cook_time_similarity))
     cosine_similarities = cosine_similarities[:min_length]
@@ -367,54 +625,155 @@ def calculate_similarity(user_ingredients, user_prep_time, user_cook_time):
     combined_similarity = (cosine_similarities * 0.8) + (prep_time_similarity * 0.1) + (cook_time_similarity * 0.1)
     return combined_similarity
 
-def get_recommendations_logic(user_ingredients_list, user_prep_time, user_cook_time, top_n=9):
-    combined_similarity = calculate_similarity(user_ingredients_list, user_prep_time, user_cook_time)
-    sorted_indices = combined_similarity.argsort()[::-1]
-    top_indices = sorted_indices[:top_n]
-    recommendations = df_english.iloc[top_indices].copy()
-    
-    if hasattr(combined_similarity, 'iloc'):
-        scores = combined_similarity.iloc[top_indices] * 100
+@timed("calculate_similarity_ann")
+def calculate_similarity_ann(user_ingredients, user_prep_time, user_cook_time, top_n=50, nprobe=None, weights=None):
+    """
+    Scores only the ANN candidates. The ingredient term blends exact TF-IDF cosine with the
+    dense LSA cosine (ANN_DENSE_WEIGHT), so synonyms that co-occur in the catalog still match.
+    Returns (indices, scores).
+    """
+    if not model_ready() or ann_index is None:
+        raise HTTPException(status_code=503, detail="ANN index not loaded")
+
+    user_tfidf = build_query_vector(user_ingredients, weights)
+    candidates, dense_similarities = ann_index.search(user_tfidf, k=top_n * 4, nprobe=nprobe or DEFAULT_NPROBE)
+    sparse_similarities = cosine_similarity(user_tfidf, tfidf_matrix[candidates])[0]
+    ingredient_similarity = (1 - ANN_DENSE_WEIGHT) * sparse_similarities + ANN_DENSE_WEIGHT * np.clip(dense_similarities, 0, 1)
+    prep_time_similarity, cook_time_similarity = time_similarity(user_prep_time, user_cook_time, candidates)
+    combined_similarity = (ingredient_similarity * 0.8) + (prep_time_similarity * 0.1) + (cook_time_similarity * 0.1)
+    return candidates, combined_similarity
+
+@timed("calculate_similarity_sharded")
+def calculate_similarity_sharded(user_ingredients, user_prep_time, user_cook_time, top_n=50, weights=None):
+    """Same ranking as calculate_similarity, scored shard by shard in parallel. Returns (indices, scores) of the top_n."""
+    if not model_ready() or sharded_scorer is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    return sharded_scorer.top_k(build_query_vector(user_ingredients, weights), user_prep_time, user_cook_time, top_n)
+
+def get_recommendations_logic(user_ingredients_list, user_prep_time, user_cook_time, top_n=9, retrieval=None, nprobe=None, weights=None):
+    mode = (retrieval or RETRIEVAL_MODE).lower()
+    if mode == "ann" and ann_index is not None:
+        candidates, combined_similarity = calculate_similarity_ann(user_ingredients_list, user_prep_time, user_cook_time, top_n, nprobe, weights)
+        order = np.argsort(-combined_similarity, kind="stable")[:top_n]
+        top_indices = candidates[order]
+        scores = combined_similarity[order] * 100
+    elif sharded_scorer is not None:
+        top_indices, scores = calculate_similarity_sharded(user_ingredients_list, user_prep_time, user_cook_time, top_n, weights)
+        scores = scores * 100
     else:
+        combined_similarity = calculate_similarity(user_ingredients_list, user_prep_time, user_cook_time, weights)
+        sorted_indices = combined_similarity.argsort()[::-1]
+        top_indices = sorted_indices[:top_n]
         scores = combined_similarity[top_indices] * 100
+    recommendations = fetch_recipe_rows(top_indices)
+    
+    if df_english is None:
+        # Recipes missing from Mongo are skipped by the store; keep scores aligned by Srno
+        score_by_srno = dict(zip(recipe_srnos[top_indices], scores))
+        scores = np.array([score_by_srno[s] for s in recommendations['Srno']])
         
-    recommendations['similarity_score'] = scores.astype(int).values
+    recommendations['similarity_score'] = scores.astype(int)
+    return annotate_pantry_coverage(recommendations, user_ingredients_list)
+
+@timed("pantry_coverage")
+def annotate_pantry_coverage(recommendations, user_ingredients_list):
+    """Adds missing_count, pantry_coverage and missing_names for every candidate in one sparse pass."""
+    if pantry_index is None or recommendations.empty:
+        return recommendations
+    rows = rows_for_srnos(recommendations['Srno'])
+    missing_counts, coverage, missing_names = pantry_index.coverage(rows, pantry_index.pantry_mask(user_ingredients_list))
+    recommendations['missing_count'] = missing_counts
+    recommendations['pantry_coverage'] = coverage
+    recommendations['missing_names'] = missing_names
     return recommendations
 
-def remove_metadata(image_bytes: bytes) -> bytes:
+def find_interaction_recipe(interaction):
+    """Catalog row for an interaction: by details.recipe_id when the client sends it, else by name."""
+    srno = (interaction.details or {}).get("recipe_id")
+    if srno is None:
+        if df_english is not None:
+            matches = df_english.loc[df_english['RecipeName'] == interaction.recipe_name, 'Srno']
+            srno = matches.iloc[0] if len(matches) else None
+        else:
+            recipes_collection = get_recipe_collection()
+            doc = recipes_collection.find_one({"RecipeName": interaction.recipe_name}, {"Srno": 1}) if recipes_collection is not None else None
+            srno = doc["Srno"] if doc else None
+    if srno is None:
+        return None
+    row = rows_for_srnos([srno])[0]
+    if row < 0:
+        return None
+    if df_english is not None:
+        recipe = df_english.iloc[row]
+    else:
+        recipe = recipe_store.get(srno) or {}
+    return row, recipe.get('Cuisine'), recipe.get('Course')
+
+@timed("personalize")
+def personalize(recommendations, user):
+    preference = PreferenceVector(user.preference, tfidf_vectorizer.vocabulary_) if user else None
+    if preference is None or preference.empty:
+        # Nothing known about this user yet; lean on what is trending instead
+        return popularity_rerank(recommendations, trending.popularity(recommendations['Srno']))
+    return rerank(recommendations, rows_for_srnos(recommendations['Srno']), preference, tfidf_matrix)
+
+@timed("strip_metadata")
+def remove_metadata(image_bytes: bytes, max_dimension: Optional[int] = None) -> bytes:
     """
-    Strips EXIF metadata from an image byte stream.
-    Returns the cleaned image as bytes.
+    Strips EXIF metadata from an image byte stream, shrinking it so neither side
+    exceeds max_dimension when given. Returns the cleaned image as bytes.
     """
     try:
         image = Image.open(io.BytesIO(image_bytes))
+        fmt = image.format
+        if max_dimension and max(image.size) > max_dimension:
+            image.thumbnail((max_dimension, max_dimension))  # keeps aspect ratio, so normalised bboxes still apply
         
         # Create a new image with the same mode and size.
         # This implementation simply saves the image again without the exif data.
         # Note: We need to respect the format if possible, default to JPEG.
         
         output_buffer = io.BytesIO()
-        fmt = image.format if image.format else 'JPEG'
+        fmt = fmt if fmt else 'JPEG'
         
         # Save without passing 'exif' parameter strips it by default in PIL
         image.save(output_buffer, format=fmt)
         
         return output_buffer.getvalue()
     except Exception as e:
-        print(f"Error stripping metadata: {e}")
+        logger.error(f"Error stripping metadata: {e}")
         # If anything fails (e.g. not an image), return original bytes
         return image_bytes
 
 
+@timed("youtube_search")
 def get_youtube_link(query):
+    """Retries only while they fit in the youtube stage deadline, so pool threads are freed when it expires."""
+    deadline = time.monotonic() + STAGE_TIMEOUTS["youtube"]
+
     def _search():
         results = YoutubeSearch(query + " recipe", max_results=1).to_dict()
         if results:
             return f"https://www.youtube.com/watch?v={results[0]['id']}"
         return ""
 
-    return execute_with_retry(_search, retries=3, delay=2, default="")
+    return execute_with_retry(_search, retries=3, delay=2, default="", deadline=deadline)
+
+OLLAMA_MODEL = 'llama3'
+
+def call_ollama(prompt: str):
+    started = time.perf_counter()
+    try:
+        response = ollama.chat(model=OLLAMA_MODEL, format='json', messages=[
+            {'role': 'user', 'content': prompt},
+        ])
+    except Exception:
+        observe_upstream("ollama", OLLAMA_MODEL, "exception", time.perf_counter() - started)
+        raise
+    observe_upstream("ollama", OLLAMA_MODEL, "ok", time.perf_counter() - started)
+    return response
 
+@timed("analyze_perishability")
 def analyze_perishability(ingredients_list, extra_text=""):
     if not ingredients_list and not extra_text:
         return []
@@ -447,9 +806,7 @@ def analyze_perishability(ingredients_list, extra_text=""):
     """
     
     try:
-        response = ollama.chat(model='llama3', format='json', messages=[
-            {'role': 'user', 'content': prompt},
-        ])
+        response = call_ollama(prompt)
         content = response['message']['content']
         clean_content = content.replace("```json", "").replace("```", "").strip()
         
@@ -475,12 +832,28 @@ def analyze_perishability(ingredients_list, extra_text=""):
         return [] 
         
     except Exception as e:
-        print(f"Error analyzing perishability: {e}")
+        logger.error(f"Error analyzing perishability: {e}")
         fallback_list = ingredients_list + (extra_text.split(',') if extra_text else [])
         return [{"name": ing.strip(), "days_to_expiry": 7, "priority": "Medium"} for ing in fallback_list if ing.strip()]
 
+@timed("perishability")
+def estimate_perishability(ingredients_list):
+    """Shelf life from the ingredient dictionary where it knows the ingredient; one Ollama pass for the rest."""
+    known, unknown = [], []
+    for name in ingredients_list:
+        shelf_life = ingredient_matcher.shelf_life_of(name)
+        if shelf_life is None:
+            unknown.append(name)
+        else:
+            known.append({"name": name, "days_to_expiry": shelf_life[0], "priority": shelf_life[1]})
+    if unknown:
+        logger.info(f"Asking Ollama about {len(unknown)} of {len(ingredients_list)} ingredients: {unknown}")
+        known += analyze_perishability(unknown, extra_text="")
+    return known
+
+@timed("ollama_fallback")
 def generate_recipe_with_ollama(ingredients: List[str]) -> Recipe:
-    print(f"Generating AI recipe for: {ingredients}")
+    logger.info(f"Generating AI recipe for: {ingredients}")
     prompt = f"""
     Create a unique and delicious recipe using these ingredients: {', '.join(ingredients)}.
     You can assume standard pantry staples (salt, pepper, oil, water, spices).
@@ -502,9 +875,7 @@ def generate_recipe_with_ollama(ingredients: List[str]) -> Recipe:
     """
     
     try:
-        response = ollama.chat(model='llama3', format='json', messages=[
-            {'role': 'user', 'content': prompt},
-        ])
+        response = call_ollama(prompt)
         content = response['message']['content']
         data = json.loads(content)
         
@@ -531,7 +902,7 @@ def generate_recipe_with_ollama(ingredients: List[str]) -> Recipe:
             servings=int(data.get("servings", 2))
         )
     except Exception as e:
-        print(f"Error generating recipe with Ollama: {e}")
+        logger.error(f"Error generating recipe with Ollama: {e}")
         # Return a dummy error recipe
         return Recipe(
             id=-1,
@@ -551,41 +922,41 @@ def generate_recipe_with_ollama(ingredients: List[str]) -> Recipe:
             servings=0
         )
 
+def find_missing_ingredients(ingreds, user_ingredients_list):
+    """Per-row fallback for rows the pantry index doesn't cover: cleaned recipe ingredients no pantry item matches."""
+    user_ings_lower = [u.lower() for u in user_ingredients_list]
+    missing = []
+    for r_ing in split_ingredients(ingreds):
+        cleaned_r_ing = clean_ingredient_text(r_ing)
+        if not cleaned_r_ing: continue
+        if not any(u_ing in cleaned_r_ing or cleaned_r_ing in u_ing for u_ing in user_ings_lower):
+            missing.append(cleaned_r_ing)
+    return missing
+
+@timed("process_recipe_row")
 def process_recipe_row(row, user_ingredients_list=[]):
+    recipe = recipe_skeleton(row, user_ingredients_list)
+    recipe.youtube_link = get_youtube_link(recipe.name)
+    return recipe
+
+def recipe_skeleton(row, user_ingredients_list=[]):
+    """A Recipe built from catalog fields only; the YouTube link is filled in by enrichment."""
     ingreds = str(row['Ingredients']) if 'Ingredients' in row and pd.notna(row['Ingredients']) else "Not listed"
     recipe_name = str(row['RecipeName'])
-    youtube_url = get_youtube_link(recipe_name)
     
-    r_ing_list = []
-    if ingreds.strip().startswith("[") and ingreds.strip().endswith("]"):
-        import ast
-        try:
-            r_ing_list = ast.literal_eval(ingreds)
-        except:
-            r_ing_list = [x.strip() for x in ingreds.replace('[','').replace(']','').replace("'", "").split(',')]
+    if isinstance(row.get('missing_names'), list):
+        missing_names = row['missing_names']
     else:
-        r_ing_list = [x.strip() for x in ingreds.split(',')]
-    
+        missing_names = find_missing_ingredients(ingreds, user_ingredients_list)
+
     missing = []
-    user_ings_lower = [u.lower() for u in user_ingredients_list]
     added_missing = set()
-
-    for r_ing in r_ing_list:
-        cleaned_r_ing = clean_ingredient_text(r_ing)
-        if not cleaned_r_ing: continue
-
-        match = False
-        for u_ing in user_ings_lower:
-            if u_ing in cleaned_r_ing or cleaned_r_ing in u_ing: 
-                match = True
-                break
-        
-        if not match: 
-            display_name = cleaned_r_ing.title()
-            if display_name not in added_missing:
-                link = f"https://blinkit.com/s/?q={display_name.replace(' ', '+')}"
-                missing.append({"name": display_name, "link": link})
-                added_missing.add(display_name)
+    for name in missing_names:
+        display_name = name.title()
+        if display_name not in added_missing:
+            link = f"https://blinkit.com/s/?q={display_name.replace(' ', '+')}"
+            missing.append({"name": display_name, "link": link})
+            added_missing.add(display_name)
 
     return Recipe(
         id=int(row['Srno']) if 'Srno' in row else 0,
@@ -595,7 +966,7 @@ def process_recipe_row(row, user_ingredients_list=[]):
         prep_time=int(row['PrepTimeInMins']),
         cook_time=int(row['CookTimeInMins']),
         url=str(row['URL']),
-        youtube_link=youtube_url,
+        youtube_link="",
         missing_ingredients=missing,
         match_score=int(row['similarity_score']) if 'similarity_score' in row else 0,
         instructions=nltk.sent_tokenize(str(row['Instructions'])) if 'Instructions' in row and pd.notna(row['Instructions']) else [],
@@ -605,6 +976,7 @@ def process_recipe_row(row, user_ingredients_list=[]):
         servings=int(row['Servings']) if 'Servings' in row else 0
     )
 
+@timed("apply_profile_filters")
 def apply_profile_filters(recipes_df, constraints):
     filtered_df = recipes_df.copy()
     filtered_df['Ingredients'] = filtered_df['Ingredients'].fillna('')
@@ -728,125 +1100,455 @@ def log_interaction(interaction: InteractionRequest, current_user: UserInDB = De
         "details": interaction.details or {}
     }
     
-    users_collection.update_one(
-        {"email": current_user.email},
-        {"$push": {"interactions": new_interaction}}
-    )
+    update = {"$push": {"interactions": new_interaction}}
+    if model_ready() and (interaction.action in ACTION_WEIGHTS or interaction.action in TRENDING_ACTION_WEIGHTS):
+        try:
+            found = find_interaction_recipe(interaction)
+            if found:
+                row, cuisine, course = found
+                trending.record(recipe_srnos[row], interaction.action)
+                preference = preference_update(interaction.action, tfidf_matrix[row], tfidf_terms, cuisine, course)
+                update.update(preference or {})
+        except Exception as e:
+            logger.warning(f"Could not update preference vector: {e}")
+
+    users_collection.update_one({"email": current_user.email}, update)
     return {"status": "success"}
 
+def parse_ingredient_query(text):
+    """Canonical names from ingredient_matcher; parts it can't resolve go through clean_ingredient_text as before."""
+    found, unresolved = ingredient_matcher.resolve(text)
+    ingredients_list = list(found)
+    for part in unresolved:
+        cleaned = clean_ingredient_text(part)
+        if cleaned and cleaned not in ingredients_list:
+            ingredients_list.append(cleaned)
+
+    raw_list = [i.strip() for i in text.split(',')]
+    if not ingredients_list and raw_list:
+         ingredients_list = [r for r in raw_list if r]
+    return ingredients_list
+
+def resolve_pantry(items):
+    """(canonical name, query weight, days to expiry) per pantry ingredient, merged by name."""
+    resolved = {}
+    for item in items:
+        weight = urgency_weight(item.days_to_expiry, item.priority, item.weight)
+        days = expiry_days(item.days_to_expiry, item.priority)
+        for name in parse_ingredient_query(item.name):
+            if name in resolved:
+                _, old_weight, old_days = resolved[name]
+                weight = max(weight, old_weight)
+                days = days if old_days is None else old_days if days is None else min(days, old_days)
+            resolved[name] = (name, weight, days)
+    return list(resolved.values())
+
+def parse_weighted_query(request: RecipeRequest):
+    """
+    Ingredients from the text field plus the pantry items, and the non-1 weights of the pantry
+    ones (or None). 400 when neither yields an ingredient.
+    """
+    ingredients_list = parse_ingredient_query(request.ingredients) if request.ingredients.strip() else []
+    weights = {}
+    for name, weight, _ in resolve_pantry(request.pantry or []):
+        if name not in ingredients_list:
+            ingredients_list.append(name)
+        if weight != 1.0:
+            weights[name] = weight
+    if not ingredients_list:
+        raise HTTPException(status_code=400, detail="Provide at least one ingredient or pantry item")
+    return ingredients_list, weights or None
+
+def candidate_recommendations(ingredients_list, prep_time, cook_time, constraints, retrieval=None, nprobe=None, weights=None):
+    """Top 50 candidates with the profile filters applied; `constraints` is None for anonymous requests."""
+    base_recs = get_recommendations_logic(ingredients_list, prep_time, cook_time, top_n=50, retrieval=retrieval, nprobe=nprobe, weights=weights)
+    if constraints is None:
+        return base_recs
+    return apply_profile_filters(base_recs, constraints)
+
+def cached_candidates(request: RecipeRequest, ingredients_list, constraints, weights=None):
+    """
+    candidate_recommendations through result_cache. Ingredients are sorted and de-duplicated
+    so equivalent pantries share one entry; that query is scored whether or not the cache is on,
+    and everything else is keyed exactly, so the cache never changes an answer.
+    """
+    query = sorted(set(ingredients_list))
+    prep_time, cook_time = request.prep_time, request.cook_time
+    if not result_cache.enabled:
+        return candidate_recommendations(query, prep_time, cook_time, constraints, request.retrieval, request.ann_probes, weights)
+    mode = (request.retrieval or RETRIEVAL_MODE).lower()
+    weights_key = ",".join(f"{name}={weight:.2f}" for name, weight in sorted((weights or {}).items()))
+    key = query_key(model_version, query, prep_time, cook_time, constraints, mode, request.ann_probes if mode == "ann" else "", weights_key)
+    with span("result_cache"):
+        return result_cache.get_or_compute(key, lambda: candidate_recommendations(
+            query, prep_time, cook_time, constraints, request.retrieval, request.ann_probes, weights))
+
+def profile_constraints(current_user):
+    return {
+        "allergies": current_user.profile.get("allergies", []),
+        "dietary_preferences": current_user.profile.get("dietary_preferences", []),
+    }
+
+def rank_recommendations(request: RecipeRequest, ingredients_list, current_user, weights=None):
+    """Scoring, profile filters, personalisation and sort. CPU-bound; runs on scoring_executor."""
+    if current_user:
+         constraints = profile_constraints(current_user)
+         filtered_recs = personalize(cached_candidates(request, ingredients_list, constraints, weights), current_user)
+    else:
+         filtered_recs = personalize(cached_candidates(request, ingredients_list, None, weights), None)
+
+    if request.sort == "fewest_missing" and 'missing_count' in filtered_recs.columns:
+        filtered_recs = filtered_recs.sort_values(['missing_count', 'similarity_score'], ascending=[True, False], kind="stable")
+
+    # Check if we have good matches
+    top_recs = filtered_recs.head(9)
+    best_score = 0
+    if not top_recs.empty:
+        if 'similarity_score' in top_recs.columns:
+            best_score = top_recs['similarity_score'].max()
+    return [recipe_skeleton(row, ingredients_list) for _, row in top_recs.iterrows()], best_score
+
+async def run_stage(stage, executor, func, *args, default=None):
+    """Runs a blocking enrichment stage with its deadline. Timeouts and errors degrade to `default`."""
+    loop = asyncio.get_running_loop()
+    with span(stage):
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(executor, bind_context(func), *args), STAGE_TIMEOUTS[stage])
+        except asyncio.TimeoutError:
+            STAGE_DEGRADED.inc(stage, "timeout")
+            logger.warning(f"Stage '{stage}' missed its {STAGE_TIMEOUTS[stage]}s deadline. Continuing without it.")
+        except Exception as e:
+            STAGE_DEGRADED.inc(stage, "error")
+            logger.warning(f"Stage '{stage}' failed: {e}. Continuing without it.")
+        return default
+
+async def add_youtube_link(recipe: Recipe):
+    recipe.youtube_link = await run_stage("youtube", enrichment_executor, get_youtube_link, recipe.name, default="")
+    return recipe
+
+async def translate_recipes(recipes: List[Recipe], target_lang: str):
+    """Translates names and instructions of all recipes in one batch call. Returns False if the stage degraded."""
+    texts = [r.name for r in recipes] + [step for r in recipes for step in r.instructions]
+    translated = await run_stage("translate", translation_executor, translation_service.translate_batch, texts, target_lang)
+    if not translated:
+        return False
+    names, steps = translated[:len(recipes)], iter(translated[len(recipes):])
+    for recipe, name in zip(recipes, names):
+        recipe.translated_name = name
+        recipe.instructions = [next(steps) for _ in recipe.instructions]
+    return True
+
+async def generate_ai_recipe(ingredients_list, client):
+    """The Ollama fallback is bulk work: skipped (not a 429) when admission turns it away."""
+    try:
+        async with ADMISSION.admit("bulk", client):
+            return await run_stage("ollama", enrichment_executor, generate_recipe_with_ollama, ingredients_list)
+    except HTTPException as e:
+        STAGE_DEGRADED.inc("ollama", "rate_limited")
+        logger.warning(f"AI fallback recipe not admitted: {e.detail}")
+        return None
+
 @app.post("/recommend", response_model=List[Recipe])
-def recommend_recipes_endpoint(request: RecipeRequest, current_user: Optional[UserInDB] = Depends(get_current_user)):
-    if df_english is None:
+async def recommend_recipes_endpoint(request: RecipeRequest, http_request: Request, fields: Optional[str] = None,
+                                     current_user: Optional[UserInDB] = Depends(get_current_user)):
+    """`fields=name,match_score,...` returns only those Recipe fields (plus id), e.g. for list views."""
+    if not model_ready():
         raise HTTPException(status_code=503, detail="Model failed to load.")
 
+    ingredients_list, weights = parse_weighted_query(request)
     try:
-        raw_list = [i.strip() for i in request.ingredients.split(',')]
-        ingredients_list = []
-        for i in raw_list:
-            cleaned = clean_ingredient_text(i)
-            if cleaned:
-                ingredients_list.append(cleaned)
-        
-        if not ingredients_list and raw_list:
-             ingredients_list = [r for r in raw_list if r]
-
-        base_recs = get_recommendations_logic(ingredients_list, request.prep_time, request.cook_time, top_n=50)
-        
-        if current_user:
-             constraints = {
-                 "allergies": current_user.profile.get("allergies", []),
-                 "dietary_preferences": current_user.profile.get("dietary_preferences", []),
-             }
-             filtered_recs = apply_profile_filters(base_recs, constraints)
-        else:
-             filtered_recs = base_recs
-        
-        # Check if we have good matches
-        top_recs = filtered_recs.head(9)
-        best_score = 0
-        if not top_recs.empty:
-            if 'similarity_score' in top_recs.columns:
-                best_score = top_recs.iloc[0]['similarity_score']
-        
-        # Threshold for fallback (e.g. < 30% match)
-        results = []
-        if top_recs.empty or best_score < 30:
-            print(f"Match score {best_score}% is below threshold (30%). Triggering Ollama fallback...")
-            ai_recipe = generate_recipe_with_ollama(ingredients_list)
-            results.append(ai_recipe)
-            
-            # Still append the best partial matches if any
-            if not top_recs.empty:
-                 with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                     func = lambda r: process_recipe_row(r, ingredients_list)
-                     partials = list(executor.map(func, [row for _, row in top_recs.iterrows()]))
-                     results.extend(partials)
-        else:
-             with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                  func = lambda r: process_recipe_row(r, ingredients_list)
-                  results = list(executor.map(func, [row for _, row in top_recs.iterrows()]))
-            
+        loop = asyncio.get_running_loop()
+        recipes, best_score = await loop.run_in_executor(
+            scoring_executor, bind_context(rank_recommendations), request, ingredients_list, current_user, weights)
+
+        # Threshold for fallback (e.g. < 30% match). The AI recipe is generated alongside enrichment.
+        ai_task = None
+        if not recipes or best_score < 30:
+            logger.warning(f"Match score {best_score}% is below threshold (30%). Triggering Ollama fallback...")
+            ai_task = asyncio.create_task(generate_ai_recipe(ingredients_list, client_key(http_request)))
+
+        enrichment = [add_youtube_link(r) for r in recipes]
+        if request.target_lang and request.target_lang != "en" and recipes:
+            enrichment.append(translate_recipes(recipes, request.target_lang))
+        await asyncio.gather(*enrichment)
+
+        results = list(recipes)
+        if ai_task is not None:
+            ai_recipe = await ai_task
+            if ai_recipe is not None:
+                results.insert(0, ai_recipe)
+        selected = parse_fields(fields, RECIPE_FIELDS)
+        if selected is not None:
+            return FastJSONResponse(select_fields(results, selected))
         return results
 
     except Exception as e:
-        print(f"Error generating recommendations: {e}")
+        logger.error(f"Error generating recommendations: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+def plan_pool(queries, prep_time, cook_time, k):
+    """
+    Union of each query row's k best catalog rows (same combined score as /recommend). Uses the
+    sharded scorer when it is on; otherwise scores PLAN_BLOCK_ROWS rows at a time and keeps a
+    running top-k per query, so no query x catalog dense array is ever built.
+    """
+    k = min(k, tfidf_matrix.shape[0])
+    if sharded_scorer is not None:
+        return np.unique(np.concatenate([sharded_scorer.top_k(queries[i], prep_time, cook_time, k)[0]
+                                         for i in range(queries.shape[0])]))
+    queries = normalize(queries, norm="l2")
+    best_scores = np.empty((queries.shape[0], 0))
+    best_rows = np.empty((queries.shape[0], 0), dtype=np.int64)
+    for start in range(0, tfidf_matrix.shape[0], PLAN_BLOCK_ROWS):
+        block = normalize(tfidf_matrix[start:start + PLAN_BLOCK_ROWS], norm="l2")
+        block_rows = np.arange(start, start + block.shape[0])
+        prep_time_similarity, cook_time_similarity = time_similarity(prep_time, cook_time, block_rows)
+        scores = (queries @ block.T).toarray() * 0.8 + (prep_time_similarity * 0.1 + cook_time_similarity * 0.1)
+        best_scores = np.hstack([best_scores, scores])
+        best_rows = np.hstack([best_rows, np.broadcast_to(block_rows, scores.shape)])
+        if best_scores.shape[1] > k:
+            keep = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(best_scores, keep, axis=1)
+            best_rows = np.take_along_axis(best_rows, keep, axis=1)
+    return np.unique(best_rows)
+
+@timed("plan_meals")
+def plan_meals(request: PlanRequest, current_user):
+    """
+    Scores the whole pantry (urgency-weighted) and each pantry item alone against the catalog in
+    one sparse product, pools the best candidates of every row, then greedily picks the meals
+    that cover the most urgent items. CPU-bound; runs on scoring_executor.
+    """
+    if not model_ready():
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    items = resolve_pantry(request.pantry)[:MAX_PLAN_ITEMS]
+    if not items:
+        raise HTTPException(status_code=400, detail="pantry must list at least one ingredient")
+    names = [name for name, _, _ in items]
+    weights = np.array([weight for _, weight, _ in items])
+    days = [d for _, _, d in items]
+    everything = names + [i for i in (parse_ingredient_query(request.ingredients) if request.ingredients.strip() else []) if i not in names]
+
+    queries = sp.vstack([build_query_vector(everything, dict(zip(names, weights)))] + [build_query_vector([name]) for name in names], format="csr")
+    pool = plan_pool(queries, request.prep_time, request.cook_time, PLAN_POOL_PER_QUERY)
+
+    candidates = fetch_recipe_rows(pool)
+    if current_user:
+        candidates = apply_profile_filters(candidates, profile_constraints(current_user))
+    rows = rows_for_srnos(candidates['Srno'])
+    prep_time_similarity, cook_time_similarity = time_similarity(request.prep_time, request.cook_time, rows)
+    relevance = cosine_similarity(queries[0], tfidf_matrix[rows])[0] * 0.8 + prep_time_similarity * 0.1 + cook_time_similarity * 0.1
+    candidates['similarity_score'] = (relevance * 100).astype(int)
+    if pantry_index is not None:
+        uses = pantry_index.uses(rows, names)
+    else:
+        uses = np.zeros((len(rows), len(names)), dtype=bool)
+
+    picks, covered = schedule(*greedy_cover(relevance, uses, weights, request.meals), days)
+    chosen = annotate_pantry_coverage(candidates.iloc[picks].copy(), everything)
+    meals = []
+    for meal, ((_, row), pick, newly) in enumerate(zip(chosen.iterrows(), picks, covered), start=1):
+        meals.append(PlannedMeal(meal=meal, recipe=recipe_skeleton(row, everything),
+                                 uses=[names[j] for j in np.flatnonzero(uses[pick])], covers=[names[j] for j in newly]))
+    used = set(np.concatenate(covered).tolist()) if covered else set()
+    uncovered = sorted((j for j in range(len(names)) if j not in used), key=lambda j: (days[j] is None, days[j] or 0, -weights[j]))
+    return MealPlan(meals=meals, uncovered=[PantryItem(name=names[j], days_to_expiry=days[j], weight=round(float(weights[j]), 3))
+                                            for j in uncovered])
+
+@app.post("/plan", response_model=MealPlan)
+async def plan_endpoint(request: PlanRequest, current_user: Optional[UserInDB] = Depends(get_current_user)):
+    """Multi-meal plan that uses up the pantry's soonest-expiring items first."""
+    if not request.pantry:
+        raise HTTPException(status_code=400, detail="pantry must list at least one ingredient")
+    if not 1 <= request.meals <= MAX_PLAN_MEALS:
+        raise HTTPException(status_code=400, detail=f"meals must be between 1 and {MAX_PLAN_MEALS}")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(scoring_executor, bind_context(plan_meals), request, current_user)
+
+def ndjson(event):
+    return json_dumps(event) + b"\n"
+
+async def youtube_event(recipe: Recipe):
+    await add_youtube_link(recipe)
+    return {"type": "enrichment", "id": recipe.id, "youtube_link": recipe.youtube_link}
+
+async def translation_event(recipes: List[Recipe], target_lang: str, selected):
+    if not await translate_recipes(recipes, target_lang):
+        return None
+    return {"type": "translation", "recipes": select_fields(recipes, set(selected or RECIPE_FIELDS) & {"id", "translated_name", "instructions"})}
+
+async def ai_recipe_event(ingredients_list, selected, client):
+    ai_recipe = await generate_ai_recipe(ingredients_list, client)
+    return {"type": "ai_recipe", "recipe": select_fields([ai_recipe], selected)[0]} if ai_recipe is not None else None
+
+@app.post("/recommend/stream")
+async def recommend_stream_endpoint(request: RecipeRequest, http_request: Request, fields: Optional[str] = None,
+                                    current_user: Optional[UserInDB] = Depends(get_current_user)):
+    """
+    NDJSON variant of /recommend. Emits the ranked recipe skeletons as soon as scoring is done
+    ({"type": "recipes"}), then one line per enrichment as it completes ("enrichment",
+    "translation", "ai_recipe"), then {"type": "done"}.
+    """
+    if not model_ready():
+        raise HTTPException(status_code=503, detail="Model failed to load.")
+    ingredients_list, weights = parse_weighted_query(request)
+    selected = parse_fields(fields, RECIPE_FIELDS)
+
+    async def events():
+        loop = asyncio.get_running_loop()
+        try:
+            recipes, best_score = await loop.run_in_executor(
+                scoring_executor, bind_context(rank_recommendations), request, ingredients_list, current_user, weights)
+        except Exception as e:
+            logger.error(f"Error generating recommendations: {e}")
+            yield ndjson({"type": "error", "detail": str(e)})
+            return
+        yield ndjson({"type": "recipes", "recipes": select_fields(recipes, selected)})
+
+        tasks = [asyncio.create_task(youtube_event(r)) for r in recipes]
+        if request.target_lang and request.target_lang != "en" and recipes:
+            tasks.append(asyncio.create_task(translation_event(recipes, request.target_lang, selected)))
+        if not recipes or best_score < 30:
+            logger.warning(f"Match score {best_score}% is below threshold (30%). Triggering Ollama fallback...")
+            tasks.append(asyncio.create_task(ai_recipe_event(ingredients_list, selected, client_key(http_request))))
+        try:
+            for next_event in asyncio.as_completed(tasks):
+                event = await next_event
+                if event is not None:
+                    yield ndjson(event)
+            yield ndjson({"type": "done"})
+        finally:
+            # Client went away: stop waiting on enrichment nobody will see
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+DETECTION_PROMPT = "Identify the food ingredients in this image. For EACH ingredient, provide its name (use Indian English, e.g. 'Brinjal', 'Bhindi') AND its Bounding Box. Format: 'Name [ymin, xmin, ymax, xmax]'. Coordinates must be normalized to 0-1000 scale. Examples: 'Brinjal [150, 200, 350, 400]', 'Onion [500, 600, 600, 700]'. Return a list."
+
+MULTI_DETECTION_PROMPT = "You are given {n} photos of the same kitchen. For EACH photo, start a new line with 'Image <number>:' (1 to {n}, in the order given) and list the food ingredients visible in that photo. For EACH ingredient, provide its name (use Indian English, e.g. 'Brinjal', 'Bhindi') AND its Bounding Box within that photo. Format: 'Name [ymin, xmin, ymax, xmax]'. Coordinates must be normalized to 0-1000 scale. Example: 'Image 1: Brinjal [150, 200, 350, 400], Onion [500, 600, 600, 700]'."
+
+# "Image 2" and its trailing punctuation. It marks a section when it starts a line or, mid-line, ends with a colon.
+IMAGE_SECTION = re.compile(r"(?i)\bimage\s*#?\s*(\d+)([^\w\n\[]*)")
+
+def image_content(image):
+    image_bytes, content_type = image
+    return {"type": "image_url", "image_url": {"url": f"data:{content_type};base64,{encode_image(image_bytes)}"}}
+
+def split_image_sections(text, n_images):
+    """
+    Splits an 'Image 1: ... Image 2: ...' reply (markers on their own lines or inline) into one
+    text per image. Images the reply has no section for get "".
+    """
+    markers = [m for m in IMAGE_SECTION.finditer(text)
+               if ":" in m.group(2) or not re.search(r"\w", text[text.rfind("\n", 0, m.start()) + 1:m.start()])]
+    sections = [""] * n_images
+    for marker, following in zip(markers, markers[1:] + [None]):
+        number = int(marker.group(1))
+        if 1 <= number <= n_images:
+            sections[number - 1] += "\n" + text[marker.end():following.start() if following else len(text)]
+    return sections
+
+async def detect_single_image(image, limiter):
+    async with limiter:
+        payload = {"messages": [{"role": "user", "content": [{"type": "text", "text": DETECTION_PROMPT}, image_content(image)]}]}
+        result, used_model = await run_in_threadpool(call_openrouter_with_fallback, payload)
+    detected_text = result["choices"][0]["message"]["content"]
+    logger.info(f"OpenRouter Detection ({used_model}): {detected_text}")
+    return detected_text
+
+async def detect_images(images):
+    """
+    Detected text per image. Several photos go out as one multi-image request to a model that
+    accepts them; photos that request fails for or whose section of the reply is missing or
+    empty get a request of their own, DETECT_IMAGE_CONCURRENCY at a time.
+    """
+    texts = [""] * len(images)
+    if len(images) > 1:
+        payload = {"messages": [{"role": "user", "content": [{"type": "text", "text": MULTI_DETECTION_PROMPT.format(n=len(images))}]
+                                 + [image_content(image) for image in images]}]}
+        try:
+            result, used_model = await run_in_threadpool(
+                call_openrouter_with_fallback, payload, [m for m in VISION_MODELS if m not in SINGLE_IMAGE_MODELS])
+            detected_text = result["choices"][0]["message"]["content"]
+            logger.info(f"OpenRouter Detection ({used_model}, {len(images)} images): {detected_text}")
+            texts = split_image_sections(detected_text, len(images))
+        except HTTPException as e:
+            logger.warning(f"Multi-image detection failed ({e.detail}). Falling back to one request per image.")
+
+    missing = [i for i, text in enumerate(texts) if not text.strip()]
+    if not missing:
+        return texts
+    if len(images) > 1 and len(missing) < len(images):
+        logger.warning(f"Multi-image reply had no section for image(s) {[i + 1 for i in missing]}. Detecting those separately.")
+    limiter = asyncio.Semaphore(DETECT_IMAGE_CONCURRENCY)
+    results = await asyncio.gather(*(detect_single_image(images[i], limiter) for i in missing), return_exceptions=True)
+    failures = [r for r in results if isinstance(r, BaseException)]
+    if len(failures) == len(images):
+        raise failures[0]
+    for failure in failures:
+        logger.warning(f"Detection failed for one image: {failure}")
+    for i, result in zip(missing, results):
+        texts[i] = result if isinstance(result, str) else ""
+    return texts
+
+def merge_image_detections(texts):
+    """
+    Ingredients across images, de-duplicated by name (first spelling wins), each with the
+    bbox of every photo it was seen in: {name_lower: {"name", "detections": [{"image", "bbox"}]}}.
+    """
+    merged = {}
+    for image_index, text in enumerate(texts):
+        names, bbox_map = parse_ingredients_with_bboxes(text)
+        for name in names:
+            entry = merged.setdefault(name.lower(), {"name": name, "detections": []})
+            bbox = bbox_map.get(name.lower())
+            if bbox and not any(d["image"] == image_index for d in entry["detections"]):
+                entry["detections"].append({"image": image_index, "bbox": bbox})
+    return merged
+
 @app.post("/detect-ingredients")
-async def detect_ingredients(file: UploadFile = File(None), text_input: str = Form(None)):
-    if not file and not text_input:
+async def detect_ingredients(request: Request, file: UploadFile = File(None), files: List[UploadFile] = File(None), text_input: str = Form(None)):
+    """
+    Accepts one `file`, several `files` (fridge, pantry, counter...), or both. Each returned
+    ingredient has `detections` ({"image": index, "bbox"}) for every photo it appeared in;
+    `bbox`/`image` repeat the first of them. Only the vision call takes bulk admission;
+    text-only requests are resolved locally.
+    """
+    uploads = ([file] if file else []) + list(files or [])
+    if not uploads and not text_input:
         raise HTTPException(status_code=400, detail="Either an image file or text input is required.")
+    if len(uploads) > MAX_DETECT_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_DETECT_IMAGES} images per request.")
 
     try:
-        detected_text = ""
-        used_model = "None"
-        
-        if file:
-            if not file.content_type.startswith("image/"):
+        merged = {}
+
+        if uploads:
+            if any(not (upload.content_type or "").startswith("image/") for upload in uploads):
                  raise HTTPException(status_code=400, detail="Only image files are allowed")
-            
-            image_bytes = await file.read()
-            
-            # Privacy: Remove metadata before sending to AI
-            image_bytes = remove_metadata(image_bytes)
-            
-            image_base64 = encode_image(image_bytes)
 
-            payload = {
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": "Identify the food ingredients in this image. For EACH ingredient, provide its name (use Indian English, e.g. 'Brinjal', 'Bhindi') AND its Bounding Box. Format: 'Name [ymin, xmin, ymax, xmax]'. Coordinates must be normalized to 0-1000 scale. Examples: 'Brinjal [150, 200, 350, 400]', 'Onion [500, 600, 600, 700]'. Return a list."
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:{file.content_type};base64,{image_base64}"
-                                }
-                            }
-                        ]
-                    }
-                ]
-            }
-            
-            # Run blocking code in threadpool
-            result, used_model = await run_in_threadpool(call_openrouter_with_fallback, payload)
-            detected_text = result["choices"][0]["message"]["content"]
-            print(f"OpenRouter Detection ({used_model}): {detected_text}")
+            raw_images = await asyncio.gather(*(upload.read() for upload in uploads))
 
-        # Parse detected text for bboxes
-        detected_ingredients_list, bbox_map = parse_ingredients_with_bboxes(detected_text)
-        
-        # Combine text input and detected text for perishability analysis
-        # If text input exists, add it to the list
+            # Privacy: Remove metadata before sending to AI (and shrink oversized photos), in parallel
+            cleaned = await asyncio.gather(*(run_in_threadpool(remove_metadata, image_bytes, MAX_IMAGE_DIMENSION)
+                                             for image_bytes in raw_images))
+            images = [(image_bytes, upload.content_type) for image_bytes, upload in zip(cleaned, uploads)]
+
+            async with ADMISSION.admit("bulk", client_key(request)):
+                detected = await detect_images(images)
+            merged = merge_image_detections(detected)
+
+        detected_ingredients_list = [entry["name"] for entry in merged.values()]
+
+        # Combine text input and detected text for perishability analysis.
+        # Typed text is resolved locally; only parts the dictionary doesn't know are passed on as typed.
         if text_input:
-             detected_ingredients_list.extend([t.strip() for t in text_input.split(',') if t.strip()])
+             typed, unresolved = ingredient_matcher.resolve(text_input)
+             detected_ingredients_list.extend(typed + unresolved)
 
-        # Pass specific list to analyze_perishability
-        prioritized_ingredients = analyze_perishability(detected_ingredients_list, extra_text="")
+        # One perishability pass for every photo and the typed ingredients together
+        prioritized_ingredients = await run_in_threadpool(estimate_perishability, detected_ingredients_list)
         
         # Merge bboxes back into the result
         filtered_results = []
@@ -858,19 +1560,22 @@ async def detect_ingredients(file: UploadFile = File(None), text_input: str = Fo
             
             # Normalize name for lookup
             # The LLM might have slightly changed the name (e.g. capitalized)
-            # We try to find a matching bbox in our map
+            # We try to find a matching detection in our map
             
             # Check exact match lower
-            bbox = bbox_map.get(name.lower())
+            entry = merged.get(name.lower())
             
             # If not found, try simple partial match
-            if not bbox:
-                 for mapped_name, mapped_bbox in bbox_map.items():
+            if not entry:
+                 for mapped_name, mapped_entry in merged.items():
                      if mapped_name in name.lower() or name.lower() in mapped_name:
-                         bbox = mapped_bbox
+                         entry = mapped_entry
                          break
             
-            item["bbox"] = bbox # Can be None
+            detections = entry["detections"] if entry else []
+            item["detections"] = detections
+            item["bbox"] = detections[0]["bbox"] if detections else None # Can be None
+            item["image"] = detections[0]["image"] if detections else None
             
             if name.lower() not in seen_names:
                 filtered_results.append(item)
@@ -880,11 +1585,13 @@ async def detect_ingredients(file: UploadFile = File(None), text_input: str = Fo
         
         return {"detected_ingredients": filtered_results}
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error during detection: {e}")
+        logger.error(f"Error during detection: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/verify-step")
+@app.post("/verify-step", dependencies=[Depends(admission("interactive"))])
 async def verify_cooking_step(file: UploadFile = File(...), instruction: str = Form(...)):
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="Only image files are allowed")
@@ -932,15 +1639,15 @@ async def verify_cooking_step(file: UploadFile = File(...), instruction: str = F
         # Run blocking code in threadpool
         result, used_model = await run_in_threadpool(call_openrouter_with_fallback, payload)
         feedback = result["choices"][0]["message"]["content"]
-        print(f"Step Verification ({used_model}): {feedback}")
+        logger.info(f"Step Verification ({used_model}): {feedback}")
         
         return {"feedback": feedback}
 
     except Exception as e:
-        print(f"Error during step verification: {e}")
+        logger.error(f"Error during step verification: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/chat")
+@app.post("/chat", dependencies=[Depends(admission("interactive"))])
 async def chat_with_chef(
     text_input: str = Form(...),
     file: UploadFile = File(None),
@@ -1004,7 +1711,7 @@ async def chat_with_chef(
                     "url": f"data:{file.content_type};base64,{image_base64}"
                 }
             })
-            print("Image attached to chat.")
+            logger.info("Image attached to chat.")
 
         payload = {
             "messages": [
@@ -1018,24 +1725,23 @@ async def chat_with_chef(
         # Run blocking code in threadpool
         result, used_model = await run_in_threadpool(call_openrouter_with_fallback, payload)
         message_content = result["choices"][0]["message"]["content"]
-        print(f"Chat Response ({used_model}): {message_content[:50]}...")
+        logger.info(f"Chat Response ({used_model}): {message_content[:50]}...")
         
         return {"response": message_content}
 
     except Exception as e:
-        print(f"Error during chat: {e}")
+        logger.error(f"Error during chat: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/recipe/{recipe_id}", response_model=Recipe)
 def get_recipe_details(recipe_id: int):
-    # mongo_recipes = get_recipe_collection()
-    # if mongo_recipes is not None:
-    #     doc = mongo_recipes.find_one({"Srno": recipe_id})
-    #     if doc:
-    #         return process_recipe_row(doc, user_ingredients_list=[])
-    
     if df_english is None:
-         raise HTTPException(status_code=503, detail="Model not loaded")
+        if recipe_store is None:
+            raise HTTPException(status_code=503, detail="Model not loaded")
+        doc = recipe_store.get(recipe_id)
+        if doc is None:
+            raise HTTPException(status_code=404, detail="Recipe not found")
+        return process_recipe_row(doc, user_ingredients_list=[])
          
     row = df_english[df_english['Srno'] == recipe_id]
     if row.empty:
@@ -1043,59 +1749,112 @@ def get_recipe_details(recipe_id: int):
         
     return process_recipe_row(row.iloc[0], user_ingredients_list=[])
 
+@timed("similar_lookup")
+def similar_recipe_rows(row, limit):
+    """Neighbour rows and scores for a matrix row, from the precomputed table or a live cosine pass."""
+    if neighbour_table is not None and limit <= neighbour_table.neighbours.shape[1]:
+        return neighbour_table.lookup(row, limit)
+    scores = cosine_similarity(tfidf_matrix[row], tfidf_matrix)[0]
+    scores[row] = -1
+    top = np.argpartition(-scores, limit - 1)[:limit]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return top, scores[top]
+
+@app.get("/recipe/{recipe_id}/similar", response_model=List[SimilarRecipe])
+def get_similar_recipes(recipe_id: int, limit: int = 9):
+    if not model_ready():
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    row = rows_for_srnos([recipe_id])[0]
+    if row < 0:
+        raise HTTPException(status_code=404, detail="Recipe not found")
+
+    limit = max(1, min(limit, 50, tfidf_matrix.shape[0] - 1))
+    rows, scores = similar_recipe_rows(row, limit)
+    score_by_srno = dict(zip(recipe_srnos[rows].tolist(), scores.tolist()))
+    similar = fetch_recipe_rows(rows)
+    return [
+        SimilarRecipe(
+            id=int(r['Srno']),
+            name=str(r['RecipeName']),
+            translated_name=str(r.get('TranslatedRecipeName', '')),
+            similarity=int(round(score_by_srno[int(r['Srno'])] * 100)),
+            prep_time=int(r['PrepTimeInMins']),
+            cook_time=int(r['CookTimeInMins']),
+            cuisine=str(r['Cuisine']) if pd.notna(r.get('Cuisine')) else None,
+            course=str(r['Course']) if pd.notna(r.get('Course')) else None,
+            diet=str(r['Diet']) if pd.notna(r.get('Diet')) else None,
+        )
+        for r in similar.to_dict('records')
+    ]
+
+def check_translate_texts(texts):
+    if len(texts) > MAX_TRANSLATE_TEXTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TRANSLATE_TEXTS} texts per request")
+    if any(len(text) > MAX_TRANSLATE_CHARS for text in texts):
+        raise HTTPException(status_code=400, detail=f"Texts must be at most {MAX_TRANSLATE_CHARS} characters")
+
 @app.post("/translate")
 def translate_text(request: TranslationRequest):
-    def _translate():
-        return GoogleTranslator(source='auto', target=request.target_lang).translate(request.text)
-
+    check_translate_texts([request.text])
     try:
-        translated = execute_with_retry(_translate, retries=3, delay=1)
-        if not translated:
-            return {"translated_text": request.text}
-        return {"translated_text": translated}
+        return {"translated_text": translation_service.translate(request.text, request.target_lang)}
     except Exception as e:
-        print(f"Translation error after retries: {e}")
+        logger.warning(f"Translation error after retries: {e}")
         return {"translated_text": request.text}
 
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+@app.post("/translate/batch")
+def translate_batch(request: BatchTranslationRequest):
+    check_translate_texts(request.texts)
+    try:
+        translated = translation_service.translate_batch(request.texts, request.target_lang)
+    except Exception as e:
+        logger.warning(f"Batch translation error: {e}")
+        translated = request.texts
+    return {"translated_texts": translated}
 
 def send_email(to_email: str, subject: str, html_content: str):
-    smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-    smtp_port = int(os.getenv("SMTP_PORT", "587"))
-    smtp_user = os.getenv("SMTP_USER")
-    smtp_password = os.getenv("SMTP_PASSWORD")
-    email_from = os.getenv("EMAIL_FROM", "noreply@ai-chef.com")
-
-    if not smtp_user or not smtp_password:
-        print("SMTP credentials not set. Skipping email.")
+    """Queues the message for the background sender (mailer.py); returns before any SMTP traffic."""
+    try:
+        return mailer.send(to_email, subject, html_content)
+    except Exception as e:
+        logger.warning(f"Failed to queue email: {e}")
         return False
 
+@app.on_event("startup")
+def start_mailer():
+    # Picks up anything left in the outbox by a previous run
+    mailer.start()
+
+@app.on_event("shutdown")
+def stop_mailer():
+    mailer.stop()
+
+@app.on_event("shutdown")
+def stop_translation():
+    translation_service.shutdown()
+
+@app.on_event("startup")
+def load_trending():
     try:
-        msg = MIMEMultipart()
-        msg['From'] = email_from
-        msg['To'] = to_email
-        msg['Subject'] = subject
-        msg.attach(MIMEText(html_content, 'html'))
-
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_user, smtp_password)
-            server.send_message(msg)
-        print(f"Email sent successfully to {to_email}")
-        return True
+        if trending.load():
+            logger.info(f"Trending counters restored: {trending.stats()}")
     except Exception as e:
-        print(f"Failed to send email: {e}")
-        return False
+        logger.warning(f"Could not load trending state: {e}")
+
+@app.on_event("shutdown")
+def save_trending():
+    try:
+        trending.save()
+    except Exception as e:
+        logger.warning(f"Could not save trending state: {e}")
 
 @app.post("/forgot-password")
 def forgot_password(request: ForgotPasswordRequest):
     token = base64.urlsafe_b64encode(request.email.encode()).decode()
     reset_link = f"http://localhost:5173/reset-password?token={token}"
     
-    print(f"Password recovery requested for: {request.email}")
-    print(f"Recover your password here: {reset_link}") # Keep log as backup
+    logger.info(f"Password recovery requested for: {request.email}")
+    logger.info(f"Recover your password here: {reset_link}") # Keep log as backup
 
     # Send Email
     email_body = f"""
@@ -1135,7 +1894,8 @@ def get_all_users(current_user: UserInDB = Depends(get_current_user)):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have admin privileges")
     
     users_collection = get_users_collection()
-    users = list(users_collection.find())
+    # Only what the stats need; full interaction histories can be large
+    users = list(users_collection.find({}, {"email": 1, "is_admin": 1, "interactions.action": 1}))
     
     stats = []
     for u in users:
@@ -1150,7 +1910,7 @@ def get_all_users(current_user: UserInDB = Depends(get_current_user)):
             "total_likes": likes
         })
         
-    return stats
+    return FastJSONResponse(stats)
 
 @app.post("/admin/promote")
 def promote_user(email: str):
@@ -1161,6 +1921,93 @@ def promote_user(email: str):
     users_collection.update_one({"email": email}, {"$set": {"is_admin": True}})
     return {"message": f"User {email} is now an admin"}
 
+def require_admin(current_user: UserInDB = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have admin privileges")
+    return current_user
+
+@app.get("/admin/slow-requests")
+def slow_requests(limit: int = 20, current_user: UserInDB = Depends(require_admin)):
+    """Slowest recent requests, slowest first, with time per pipeline stage."""
+    return FastJSONResponse(SLOW_REQUESTS.slowest(max(1, min(limit, SLOW_REQUESTS.capacity))))
+
+@app.get("/admin/trending")
+def trending_recipes(window_hours: float = 24, limit: int = 20, action: Optional[str] = None,
+                     current_user: UserInDB = Depends(require_admin)):
+    """Hottest recipes over the last `window_hours`, from the in-memory sketches (this process only)."""
+    if action is not None and action not in TRENDING_ACTION_WEIGHTS:
+        raise HTTPException(status_code=400, detail=f"action must be one of {sorted(TRENDING_ACTION_WEIGHTS)}")
+    top = trending.top(max(window_hours, 0) * 3600, max(1, min(limit, trending.heavy_hitters)), action)
+    if top and model_ready():
+        rows = rows_for_srnos([t["recipe_id"] for t in top])
+        names = {}
+        if (rows >= 0).any():
+            # Keyed on Srno: in Mongo mode recipes the collection doesn't have are left out of the rows
+            fetched = fetch_recipe_rows(rows[rows >= 0])
+            names = dict(zip(fetched['Srno'].astype(int), fetched['RecipeName']))
+        for t in top:
+            t["recipe_name"] = names.get(int(t["recipe_id"]))
+    return FastJSONResponse({"window_hours": window_hours, "action": action, "recipes": top, "stats": trending.stats()})
+
+@app.get("/admin/profiles")
+def list_profiles(current_user: UserInDB = Depends(require_admin)):
+    return FastJSONResponse(profile_store.list())
+
+@app.get("/admin/profiles/{name}")
+def get_profile_file(name: str, current_user: UserInDB = Depends(require_admin)):
+    path = profile_store.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "text/plain; charset=utf-8" if name.endswith(PROFILE_FORMATS["collapsed"]) else "application/json"
+    with open(path, 'rb') as f:
+        return Response(content=f.read(), media_type=media_type,
+                        headers={"Content-Disposition": f'attachment; filename="{name}"'})
+
+@app.get("/admin/profiler")
+def profiler_status(current_user: UserInDB = Depends(require_admin)):
+    return continuous_profiler.status()
+
+@app.post("/admin/profiler/start")
+def start_profiler(interval_ms: Optional[float] = None, current_user: UserInDB = Depends(require_admin)):
+    """Starts the continuous sampler (a fresh profile each time). No-op if it is already running."""
+    interval = max(interval_ms, 1.0) / 1000 if interval_ms else None
+    return continuous_profiler.start(interval)
+
+@app.post("/admin/profiler/stop")
+def stop_profiler(current_user: UserInDB = Depends(require_admin)):
+    return continuous_profiler.stop()
+
+@app.get("/admin/profiler/profile")
+def download_continuous_profile(format: str = "speedscope", current_user: UserInDB = Depends(require_admin)):
+    """What the continuous sampler has collected since it was last started, running or not."""
+    if format not in PROFILE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(PROFILE_FORMATS)}")
+    rendered = continuous_profiler.render(format)
+    if rendered is None:
+        raise HTTPException(status_code=404, detail="The continuous profiler has not been started")
+    content, media_type = rendered
+    filename = f"continuous-{time.strftime('%Y%m%d-%H%M%S')}{PROFILE_FORMATS[format]}"
+    return Response(content=content, media_type=media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+REGISTRY.register_cache("recipe_store", lambda: recipe_store.stats() if recipe_store is not None else None)
+REGISTRY.register_cache("translation", translation_service.cache.stats)
+REGISTRY.register_cache("recommend_results", result_cache.stats)
+
+# Shared secret for the Prometheus scraper (sent as a bearer token); admins can always read /metrics
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+@app.get("/metrics")
+def metrics_endpoint(request: Request):
+    authorization = request.headers.get("authorization", "")
+    if not authorization.lower().startswith("bearer "):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated",
+                            headers={"WWW-Authenticate": "Bearer"})
+    token = authorization[7:]
+    if not (METRICS_TOKEN and hmac.compare_digest(token.encode(), METRICS_TOKEN.encode())):
+        if not user_from_token(token).is_admin:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="You do not have admin privileges")
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8010)
\ No newline at end of file
@@ -0,0 +1,61 @@
+import math
+import os
+
+import numpy as np
+
+# Query weight of an ingredient that expires today; decays as 1 / (1 + days), so tomorrow is
+# worth 1 + EXPIRY_BOOST / 2 and anything a month out is close to 1 (unboosted).
+EXPIRY_BOOST = float(os.getenv("EXPIRY_BOOST", "2"))
+MAX_INGREDIENT_WEIGHT = 5.0
+# Days assumed for /detect-ingredients priorities when no days_to_expiry is given
+PRIORITY_DAYS = {"high": 2, "medium": 7, "low": 30}
+# How much the pantry match counts against covering another urgent item when picking meals
+PLAN_RELEVANCE_WEIGHT = float(os.getenv("PLAN_RELEVANCE_WEIGHT", "1.0"))
+
+def expiry_days(days_to_expiry=None, priority=None):
+    """Days until expiry from the explicit value or the priority class; None when neither is known."""
+    if days_to_expiry is not None and math.isfinite(days_to_expiry):
+        return max(0.0, float(days_to_expiry))
+    if priority:
+        days = PRIORITY_DAYS.get(str(priority).strip().lower())
+        return float(days) if days is not None else None
+    return None
+
+def urgency_weight(days_to_expiry=None, priority=None, weight=None, boost=EXPIRY_BOOST):
+    """Query-term multiplier for one ingredient. An explicit weight wins; 1.0 means no boost."""
+    if weight is not None:
+        return min(max(float(weight), 0.0), MAX_INGREDIENT_WEIGHT)
+    days = expiry_days(days_to_expiry, priority)
+    if days is None:
+        return 1.0
+    return min(1.0 + boost / (1.0 + days), MAX_INGREDIENT_WEIGHT)
+
+def greedy_cover(relevance, uses, weights, meals, relevance_weight=PLAN_RELEVANCE_WEIGHT):
+    """
+    Picks up to `meals` distinct candidates. Each pick maximises the urgency-weighted sum of
+    pantry items it uses that no earlier pick covered, plus relevance_weight x its pantry match.
+    `relevance` is [n_candidates], `uses` a bool [n_candidates, n_items], `weights` [n_items].
+    Returns (picks, newly covered item indices per pick).
+    """
+    remaining = np.asarray(weights, dtype=np.float64).copy()
+    uses_f = uses.astype(np.float64)
+    available = np.ones(len(relevance), dtype=bool)
+    picks, covered = [], []
+    for _ in range(min(meals, len(relevance))):
+        gain = uses_f @ remaining + relevance_weight * relevance
+        gain[~available] = -np.inf
+        pick = int(np.argmax(gain))
+        newly = np.flatnonzero(uses[pick] & (remaining > 0))
+        picks.append(pick)
+        covered.append(newly)
+        available[pick] = False
+        remaining[newly] = 0
+    return picks, covered
+
+def schedule(picks, covered, days):
+    """Orders picks so meals using the soonest-expiring items come first; greedy order breaks ties."""
+    def soonest(i):
+        item_days = [days[j] for j in covered[i] if days[j] is not None]
+        return min(item_days) if item_days else math.inf
+    order = sorted(range(len(picks)), key=lambda i: (soonest(i), i))
+    return [picks[i] for i in order], [covered[i] for i in order]
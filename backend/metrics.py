@@ -0,0 +1,293 @@
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+
+# Per-request context. `request_stages` holds the span timings recorded while serving
+# the current request; context copies share the same list, so worker threads add to it.
+request_id_var = contextvars.ContextVar("request_id", default="-")
+request_stages_var = contextvars.ContextVar("request_stages", default=None)
+# profiling.RequestProfile when this request is being profiled; spans register their thread with it
+request_profile_var = contextvars.ContextVar("request_profile", default=None)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labelvalues, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["counts"]):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, labelvalues, [("le", _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, labelvalues)
+                lines.append(f"{self.name}_sum{labels} {series['sum']!r}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._caches = {}
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_cache(self, name, stats_fn):
+        """stats_fn() must return a dict with 'hits' and 'misses'."""
+        self._caches[name] = stats_fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        if self._caches:
+            cache_lines = {"hits": [], "misses": [], "ratio": []}
+            for name, stats_fn in sorted(self._caches.items()):
+                try:
+                    stats = stats_fn()
+                except Exception:
+                    continue
+                if not stats:
+                    continue
+                hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+                label = _format_labels(("cache",), (name,))
+                cache_lines["hits"].append(f"cache_hits_total{label} {hits}")
+                cache_lines["misses"].append(f"cache_misses_total{label} {misses}")
+                ratio = hits / (hits + misses) if hits + misses else 0.0
+                cache_lines["ratio"].append(f"cache_hit_ratio{label} {ratio!r}")
+            lines += ["# HELP cache_hits_total Cache lookups served from cache", "# TYPE cache_hits_total counter"] + cache_lines["hits"]
+            lines += ["# HELP cache_misses_total Cache lookups that missed", "# TYPE cache_misses_total counter"] + cache_lines["misses"]
+            lines += ["# HELP cache_hit_ratio Hits over lookups since start", "# TYPE cache_hit_ratio gauge"] + cache_lines["ratio"]
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Request latency by endpoint", ("method", "endpoint", "status")))
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "pipeline_stage_duration_seconds", "Time spent in each pipeline stage", ("stage",)))
+UPSTREAM_LATENCY = REGISTRY.register(Histogram(
+    "upstream_request_duration_seconds", "Upstream model call latency", ("provider", "model", "outcome")))
+UPSTREAM_REQUESTS = REGISTRY.register(Counter(
+    "upstream_requests_total", "Upstream model calls by outcome", ("provider", "model", "outcome")))
+STAGE_DEGRADED = REGISTRY.register(Counter(
+    "pipeline_stage_degraded_total", "Enrichment stages dropped from a response", ("stage", "reason")))
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# --- Request context & spans ---
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+def start_request(request_id=None):
+    """Binds a request id and an empty stage list to the current context. Returns the id."""
+    request_id = request_id or new_request_id()
+    request_id_var.set(request_id)
+    request_stages_var.set([])
+    return request_id
+
+@contextmanager
+def span(stage):
+    profile = request_profile_var.get()
+    if profile is not None:
+        profile.enter_thread()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if profile is not None:
+            profile.exit_thread()
+        STAGE_LATENCY.observe(elapsed, stage)
+        stages = request_stages_var.get()
+        if stages is not None:
+            stages.append((stage, elapsed))
+
+def timed(stage):
+    """Decorator form of span()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def stage_breakdown():
+    """Total seconds per stage for the current request."""
+    totals = {}
+    for stage, elapsed in request_stages_var.get() or []:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    return totals
+
+def bind_context(func):
+    """Wraps func so calls made from executor threads keep the caller's request id and stage list."""
+    parent = contextvars.copy_context()
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        return parent.copy().run(_run_tracked, func, args, kwargs)
+    return wrapper
+
+def _run_tracked(func, args, kwargs):
+    profile = request_profile_var.get()
+    if profile is None:
+        return func(*args, **kwargs)
+    profile.enter_thread()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profile.exit_thread()
+
+def observe_upstream(provider, model, outcome, elapsed):
+    UPSTREAM_LATENCY.observe(elapsed, provider, model, outcome)
+    UPSTREAM_REQUESTS.inc(provider, model, outcome)
+
+# --- Slow requests ---
+
+class SlowRequestLog:
+    """The `capacity` slowest requests that finished within the last `window` seconds."""
+
+    def __init__(self, capacity, window):
+        self.capacity = capacity
+        self.window = window
+        self._heap = []  # (duration_ms, seq, entry), fastest first
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        cutoff = now - self.window
+        if any(item[2]["finished_at"] < cutoff for item in self._heap):
+            self._heap = [item for item in self._heap if item[2]["finished_at"] >= cutoff]
+            heapq.heapify(self._heap)
+
+    def record(self, entry):
+        item = (entry["duration_ms"], next(self._seq), entry)
+        with self._lock:
+            if len(self._heap) >= self.capacity and item[0] > self._heap[0][0]:
+                heapq.heapreplace(self._heap, item)
+                return
+            if len(self._heap) >= self.capacity:
+                self._expire(entry["finished_at"])  # expired entries may be holding every slot
+            if len(self._heap) < self.capacity:
+                heapq.heappush(self._heap, item)
+
+    def slowest(self, limit=None):
+        with self._lock:
+            self._expire(time.time())
+            items = sorted(self._heap, key=lambda item: (-item[0], item[1]))
+        return [item[2] for item in items[:limit]]
+
+SLOW_REQUESTS = SlowRequestLog(int(os.getenv("SLOW_REQUEST_CAPACITY", "50")),
+                               float(os.getenv("SLOW_REQUEST_WINDOW", "3600")))
+
+# --- ASGI middleware ---
+
+class MetricsMiddleware:
+    """
+    Assigns each HTTP request an id (taken from X-Request-ID when the client sends one),
+    records its latency under the matched route template and writes one access log line.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(b"x-request-id")
+        request_id = start_request(incoming.decode("latin-1")[:64] if incoming else None)
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                headers = list(message.get("headers") or [])
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.observe(elapsed, scope["method"], endpoint, str(status["code"]))
+            stages_ms = {k: round(v * 1000, 2) for k, v in stage_breakdown().items()}
+            SLOW_REQUESTS.record({
+                "request_id": request_id, "method": scope["method"], "endpoint": endpoint, "path": scope.get("path"),
+                "status": status["code"], "duration_ms": round(elapsed * 1000, 2), "stages_ms": stages_ms,
+                "finished_at": time.time(), "profile": scope.get("profile"),
+            })
+            logging.getLogger("access").info(
+                "%s %s %s", scope["method"], endpoint, status["code"],
+                extra={"duration_ms": round(elapsed * 1000, 2), "stages_ms": stages_ms},
+            )
@@ -1,68 +1,144 @@
-
 import pickle
 import pandas as pd
 from pymongo import MongoClient
+import argparse
+import concurrent.futures
+import json
 import os
 import sys
+import threading
+import time
+
+from database import bulk_upsert_recipes
 
 # Constants
 MODEL_PATH = "recipe_recommender_model.pkl"
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
 DB_NAME = "ai_cooking_db"
 COLLECTION_NAME = "recipes"
+CHECKPOINT_PATH = "migrate_checkpoint.json"
+DEFAULT_CHUNK_SIZE = 2000
+
+def model_signature(path):
+    """Identifies the model file a checkpoint belongs to, so we never resume against a different pickle."""
+    stat = os.stat(path)
+    return f"{stat.st_size}-{int(stat.st_mtime)}"
+
+def load_checkpoint(path, signature, chunk_size):
+    if not os.path.exists(path):
+        return set()
+    try:
+        with open(path, 'r') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        print("Checkpoint unreadable. Starting from scratch.")
+        return set()
+    if data.get("signature") != signature or data.get("chunk_size") != chunk_size:
+        print("Checkpoint belongs to a different model file or chunk size. Starting from scratch.")
+        return set()
+    return set(data.get("completed_chunks", []))
+
+def save_checkpoint(path, signature, chunk_size, completed):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"signature": signature, "chunk_size": chunk_size, "completed_chunks": sorted(completed)}, f)
+    os.replace(tmp_path, path)
 
-def migrate():
+def chunk_records(df, start, chunk_size):
+    """Converts one slice of the DataFrame to Mongo documents, with NaNs cleaned to None."""
+    chunk = df.iloc[start:start + chunk_size]
+    chunk = chunk.astype(object).where(pd.notnull(chunk), None)
+    return chunk.to_dict(orient='records')
+
+def migrate(model_path=MODEL_PATH, chunk_size=DEFAULT_CHUNK_SIZE, workers=1,
+            checkpoint_path=CHECKPOINT_PATH, restart=False, drop=False):
     # 1. Load Data
-    print(f"Loading model from {MODEL_PATH}...")
-    if not os.path.exists(MODEL_PATH):
+    print(f"Loading model from {model_path}...")
+    if not os.path.exists(model_path):
         print("Model file not found!")
         sys.exit(1)
-        
-    with open(MODEL_PATH, 'rb') as f:
+
+    with open(model_path, 'rb') as f:
         model_data = pickle.load(f)
-        
+
     df = model_data['dataframe']
-    print(f"Loaded {len(df)} recipes from pickle.")
-    
+    del model_data
+    total = len(df)
+    n_chunks = (total + chunk_size - 1) // chunk_size
+    print(f"Loaded {total} recipes from pickle ({n_chunks} chunks of {chunk_size}).")
+
     # 2. Connect to Mongo
     print(f"Connecting to MongoDB at {MONGO_URI}...")
     client = MongoClient(MONGO_URI)
     db = client[DB_NAME]
     collection = db[COLLECTION_NAME]
-    
-    # 3. Check existing
-    count = collection.count_documents({})
-    if count > 0:
-        print(f"Collection '{COLLECTION_NAME}' already has {count} documents.")
-        choice = input("Do you want to clear the collection and re-import? (y/n): ")
-        if choice.lower() == 'y':
-            collection.delete_many({})
-            print("Collection cleared.")
-        else:
-            print("Aborting migration.")
-            return
-
-    # 4. Convert DataFrame to Records
-    print("Converting DataFrame to dictionary records...")
-    # Convert NaNs to None/null for valid JSON
-    df_clean = df.where(pd.notnull(df), None)
-    records = df_clean.to_dict(orient='records')
-    
-    # Ensure ID match (Srno -> _id if we want, or just verify Srno exists)
-    # Let's keep _id as Mongo's ObjectId for internal use, and index Srno
-    
-    # 5. Insert
-    print(f"Inserting {len(records)} records...")
-    if records:
-        collection.insert_many(records)
-        
-    # 6. Indexing
-    print("Creating index on 'Srno'...")
+
+    # 3. Resume state
+    signature = model_signature(model_path)
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    if drop:
+        collection.delete_many({})
+        print(f"Collection '{COLLECTION_NAME}' cleared.")
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+    completed = load_checkpoint(checkpoint_path, signature, chunk_size)
+    pending = [i for i in range(n_chunks) if i not in completed]
+    if completed:
+        print(f"Resuming: {len(completed)} chunks already written, {len(pending)} to go.")
+
+    # Upserts need the Srno index to be fast; creating it first also enforces uniqueness
     collection.create_index("Srno", unique=True)
-    
-    # 7. Verify
+
+    # 4. Stream chunks
+    lock = threading.Lock()
+    written = 0
+    started = time.perf_counter()
+
+    def write_chunk(chunk_idx):
+        records = chunk_records(df, chunk_idx * chunk_size, chunk_size)
+        return chunk_idx, bulk_upsert_recipes(collection, records, batch_size=chunk_size)
+
+    def on_done(chunk_idx, count):
+        nonlocal written
+        with lock:
+            written += count
+            completed.add(chunk_idx)
+            save_checkpoint(checkpoint_path, signature, chunk_size, completed)
+            elapsed = time.perf_counter() - started
+            rate = written / elapsed if elapsed > 0 else 0.0
+            print(f"Chunk {chunk_idx + 1}/{n_chunks} done. {len(completed)}/{n_chunks} chunks, "
+                  f"{written} docs this run ({rate:.0f} docs/sec)")
+
+    if workers <= 1:
+        for chunk_idx in pending:
+            on_done(*write_chunk(chunk_idx))
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(write_chunk, i) for i in pending]
+            for future in concurrent.futures.as_completed(futures):
+                on_done(*future.result())
+
+    # 5. Report
+    elapsed = time.perf_counter() - started
     new_count = collection.count_documents({})
-    print(f"Migration Complete. Total documents in DB: {new_count}")
+    rate = written / elapsed if elapsed > 0 else 0.0
+    print(f"Migration Complete. Wrote {written} docs in {elapsed:.2f}s ({rate:.0f} docs/sec, {workers} writer(s)). "
+          f"Total documents in DB: {new_count}")
+    if len(completed) == n_chunks and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream the recipe catalog from the model pickle into MongoDB.")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="Parallel writer threads")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and rewrite every chunk")
+    parser.add_argument("--drop", action="store_true", help="Clear the collection before importing")
+    args = parser.parse_args(argv)
+    migrate(model_path=args.model, chunk_size=args.chunk_size, workers=args.workers,
+            checkpoint_path=args.checkpoint, restart=args.restart, drop=args.drop)
 
 if __name__ == "__main__":
-    migrate()
+    main()
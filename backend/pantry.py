@@ -0,0 +1,108 @@
+import ast
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from text_processing import clean_ingredient_text
+
+def split_ingredients(ingredients):
+    """A recipe's raw ingredient string as a list of entries (handles the "['a', 'b']" form too)."""
+    if ingredients is None or (not isinstance(ingredients, str) and pd.isna(ingredients)):
+        return []
+    text = str(ingredients).strip()
+    if text.startswith("[") and text.endswith("]"):
+        try:
+            return [str(x) for x in ast.literal_eval(text)]
+        except Exception:
+            return [x.strip() for x in text.replace('[', '').replace(']', '').replace("'", "").split(',')]
+    return [x.strip() for x in text.split(',')]
+
+class PantryIndex:
+    """
+    Recipe x ingredient incidence matrix over normalised ingredient names, row-aligned with
+    tfidf_matrix. Each row keeps its ingredients in recipe order so missing lists read naturally.
+    """
+
+    def __init__(self, names, incidence, match_cache_size=4096):
+        self.names = names
+        self.incidence = incidence
+        self._match_cache = OrderedDict()
+        self._match_cache_size = match_cache_size
+        self._lock = threading.Lock()
+
+    @property
+    def n_rows(self):
+        return self.incidence.shape[0]
+
+    def _match(self, item):
+        """Ids of ingredient names that contain, or are contained in, a pantry item (the old substring rule)."""
+        with self._lock:
+            ids = self._match_cache.get(item)
+            if ids is not None:
+                self._match_cache.move_to_end(item)
+                return ids
+        ids = np.array([i for i, name in enumerate(self.names) if item in name or name in item], dtype=np.int64)
+        with self._lock:
+            self._match_cache[item] = ids
+            while len(self._match_cache) > self._match_cache_size:
+                self._match_cache.popitem(last=False)
+        return ids
+
+    def pantry_mask(self, user_ingredients):
+        """0/1 vector over ingredient ids marking everything the user's pantry covers."""
+        mask = np.zeros(len(self.names), dtype=np.int8)
+        for item in user_ingredients:
+            item = item.lower().strip()
+            if item:
+                mask[self._match(item)] = 1
+        return mask
+
+    def coverage(self, rows, mask):
+        """
+        Missing counts, coverage (0-1) and missing ingredient names for the given rows,
+        from one pass over their incidence entries.
+        """
+        sub = self.incidence[rows]
+        totals = np.diff(sub.indptr)
+        missing_flags = mask[sub.indices] == 0
+        row_ids = np.repeat(np.arange(len(totals)), totals)
+        missing_counts = np.bincount(row_ids[missing_flags], minlength=len(totals))
+        coverage = np.where(totals > 0, 1 - missing_counts / np.maximum(totals, 1), 0.0)
+        missing_ids = np.split(sub.indices[missing_flags], np.cumsum(missing_counts)[:-1])
+        return missing_counts, coverage, [self.names[ids].tolist() for ids in missing_ids]
+
+    def uses(self, rows, items):
+        """Bool [len(rows), len(items)]: which of the given pantry items each recipe calls for."""
+        columns = [self._match(item.lower().strip()) if item.strip() else np.array([], dtype=np.int64) for item in items]
+        item_matrix = csr_matrix((np.ones(sum(len(c) for c in columns), dtype=np.int32),
+                                  (np.concatenate(columns + [np.array([], dtype=np.int64)]),
+                                   np.repeat(np.arange(len(items)), [len(c) for c in columns]))),
+                                 shape=(len(self.names), len(items)))
+        return (self.incidence[rows].astype(np.int32) @ item_matrix).toarray() > 0
+
+def build_pantry_index(ingredient_series):
+    """Builds the incidence matrix, cleaning each distinct raw ingredient entry only once."""
+    cleaned = {}
+    name_ids = {}
+    indptr, indices = [0], []
+    for ingredients in ingredient_series:
+        seen = set()
+        for entry in split_ingredients(ingredients):
+            name = cleaned.get(entry)
+            if name is None:
+                name = cleaned[entry] = clean_ingredient_text(entry)
+            if not name:
+                continue
+            name_id = name_ids.setdefault(name, len(name_ids))
+            if name_id not in seen:
+                seen.add(name_id)
+                indices.append(name_id)
+        indptr.append(len(indices))
+
+    names = np.array(list(name_ids), dtype=object)
+    incidence = csr_matrix((np.ones(len(indices), dtype=np.int8), np.array(indices, dtype=np.int32), np.array(indptr, dtype=np.int64)),
+                           shape=(len(indptr) - 1, len(names)))
+    return PantryIndex(names, incidence)
@@ -0,0 +1,95 @@
+import os
+
+import numpy as np
+
+# How much each interaction moves the user's preference vector. Negative weights undo a like.
+ACTION_WEIGHTS = {"like": 1.0, "unlike": -1.0, "cook": 1.5, "view": 0.2}
+
+# Share of the final ranking key taken by the preference match (the rest is the retrieval score)
+PERSONALIZATION_WEIGHT = float(os.getenv("PERSONALIZATION_WEIGHT", "0.15"))
+INGREDIENT_SHARE, CUISINE_SHARE, COURSE_SHARE = 0.6, 0.2, 0.2
+# Share taken by the trending prior for users with no preference signal yet (and anonymous requests)
+POPULARITY_WEIGHT = float(os.getenv("POPULARITY_WEIGHT", "0.1"))
+
+def _mongo_key(value):
+    # Mongo field names can't contain '.' or start with '$'
+    return str(value).strip().lower().replace(".", "_").replace("$", "_")
+
+def preference_update(action, row_vector, terms, cuisine=None, course=None):
+    """
+    Mongo update that folds one interaction into the stored preference vector with $inc,
+    so the vector is never recomputed from the full interaction history.
+    `row_vector` is the recipe's TF-IDF row (1 x V sparse) and `terms` the vectorizer vocabulary.
+    Returns None for actions that don't carry a preference signal.
+    """
+    weight = ACTION_WEIGHTS.get(action)
+    if not weight:
+        return None
+
+    inc = {"preference.events": 1, "preference.total": weight}
+    for index, value in zip(row_vector.indices, row_vector.data):
+        inc[f"preference.ingredients.{_mongo_key(terms[index])}"] = round(float(value) * weight, 4)
+    if cuisine:
+        inc[f"preference.cuisine.{_mongo_key(cuisine)}"] = weight
+    if course:
+        inc[f"preference.course.{_mongo_key(course)}"] = weight
+    return {"$inc": inc}
+
+def _affinities(counts):
+    """Positive counts normalised to sum to 1."""
+    positive = {k: v for k, v in (counts or {}).items() if v > 0}
+    total = sum(positive.values())
+    return {k: v / total for k, v in positive.items()} if total else {}
+
+class PreferenceVector:
+    """A user's stored preference document, laid out for scoring against catalog rows."""
+
+    def __init__(self, preference, vocabulary):
+        self.ingredients = None
+        weights = {t: w for t, w in (preference or {}).get("ingredients", {}).items() if w > 0}
+        if weights:
+            columns = [vocabulary[t] for t in weights if t in vocabulary]
+            values = np.array([w for t, w in weights.items() if t in vocabulary], dtype=np.float32)
+            norm = np.linalg.norm(values)
+            if norm > 0:
+                self.ingredients = np.zeros(len(vocabulary), dtype=np.float32)
+                self.ingredients[columns] = values / norm
+        self.cuisine = _affinities((preference or {}).get("cuisine"))
+        self.course = _affinities((preference or {}).get("course"))
+
+    @property
+    def empty(self):
+        return self.ingredients is None and not self.cuisine and not self.course
+
+    def score(self, rows_tfidf, cuisines, courses):
+        """Preference match in [0, 1] for each candidate row."""
+        score = np.zeros(rows_tfidf.shape[0], dtype=np.float32)
+        if self.ingredients is not None:
+            score += INGREDIENT_SHARE * (rows_tfidf @ self.ingredients)
+        if self.cuisine:
+            score += CUISINE_SHARE * np.array([self.cuisine.get(_mongo_key(c), 0.0) for c in cuisines], dtype=np.float32)
+        if self.course:
+            score += COURSE_SHARE * np.array([self.course.get(_mongo_key(c), 0.0) for c in courses], dtype=np.float32)
+        return score
+
+def rerank(recommendations, rows, preference, tfidf_matrix, weight=PERSONALIZATION_WEIGHT):
+    """
+    Re-orders the retrieved candidates by blending their similarity score with the user's
+    preference match. `rows` are the candidates' tfidf_matrix positions. The displayed
+    similarity_score is left untouched.
+    """
+    if preference.empty or recommendations.empty:
+        return recommendations
+    match = preference.score(tfidf_matrix[rows], recommendations['Cuisine'].fillna(''), recommendations['Course'].fillna(''))
+    key = (1 - weight) * recommendations['similarity_score'].to_numpy(dtype=np.float32) + weight * 100 * match
+    return recommendations.iloc[np.argsort(-key, kind="stable")]
+
+def popularity_rerank(recommendations, popularity, weight=POPULARITY_WEIGHT):
+    """
+    Cold-start counterpart of rerank: blends the similarity score with each candidate's
+    trending popularity in [0, 1]. Leaves the order alone when nothing is trending.
+    """
+    if recommendations.empty or weight <= 0 or not np.any(popularity):
+        return recommendations
+    key = (1 - weight) * recommendations['similarity_score'].to_numpy(dtype=np.float32) + weight * 100 * popularity
+    return recommendations.iloc[np.argsort(-key, kind="stable")]
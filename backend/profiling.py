@@ -0,0 +1,397 @@
+"""
+Sampling profiler for production debugging. Pure Python: a thread reads sys._current_frames()
+at a fixed interval and counts the stacks it sees, so nothing is instrumented and a request
+that isn't being profiled pays only a context-variable lookup per span.
+
+Two modes:
+- One request: send `X-Profile: speedscope` (or `collapsed`), or `?profile=...`, with an admin
+  bearer token. Threads that work on that request are sampled and the profile is stored under
+  PROFILE_DIR; the response's X-Profile header gives its /admin/profiles URL. Open speedscope
+  files at https://www.speedscope.app, feed collapsed stacks to flamegraph.pl.
+- Continuous: a low-rate sampler over every thread, switched on and off from /admin/profiler.
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+import weakref
+from collections import Counter
+from urllib.parse import parse_qs
+
+from logging_setup import get_logger
+from metrics import request_id_var, request_profile_var
+
+logger = get_logger("profiling")
+
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles")))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))                     # stored request profiles
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.002"))        # seconds between samples, one request
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))    # stop sampling a request after this
+SAMPLER_INTERVAL = float(os.getenv("SAMPLER_INTERVAL", "0.02"))         # continuous sampler
+SAMPLER_MAX_STACKS = int(os.getenv("SAMPLER_MAX_STACKS", "20000"))      # distinct stacks kept before new ones are dropped
+
+FORMATS = {"speedscope": ".speedscope.json", "collapsed": ".collapsed.txt"}
+
+# Characters allowed in a stored profile's name; the request id comes from the client
+UNSAFE_NAME_CHARS = re.compile(r"[^A-Za-z0-9_-]")
+
+# Leaf frames of threads that are parked rather than working; the continuous sampler skips them
+IDLE_FRAMES = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("selectors.py", "select"),
+    ("thread.py", "_worker"), ("queue.py", "get"), ("socket.py", "accept"), ("socketserver.py", "serve_forever"),
+}
+
+def frame_stack(frame):
+    """Root-first tuple of (function, file, first line) for a frame and its callers."""
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+def is_idle(stack):
+    return not stack or (os.path.basename(stack[-1][1]), stack[-1][0]) in IDLE_FRAMES
+
+class StackSampler:
+    """
+    Counts (thread name, stack) pairs seen every `interval` seconds in the threads returned by
+    `thread_ids()` (all but the sampler's own when None).
+    """
+
+    def __init__(self, interval, thread_ids=None, skip_idle=False, max_stacks=SAMPLER_MAX_STACKS, max_seconds=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.skip_idle = skip_idle
+        self.max_stacks = max_stacks
+        self.max_seconds = max_seconds
+        self.counts = Counter()
+        self.samples = 0
+        self.dropped = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._names = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._stop.clear()
+        self.started_at, self.stopped_at = time.time(), None
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(max(1.0, self.interval * 5))
+        self.stopped_at = self.stopped_at or time.time()
+
+    def _thread_name(self, ident):
+        name = self._names.get(ident)
+        if name is None:
+            self._names = {t.ident: t.name for t in threading.enumerate()}
+            name = self._names.get(ident, f"thread-{ident}")
+        return name
+
+    def sample(self):
+        own = threading.get_ident()
+        wanted = self.thread_ids() if self.thread_ids is not None else None
+        frames = sys._current_frames()
+        with self._lock:
+            for ident, frame in frames.items():
+                if ident == own or (wanted is not None and ident not in wanted):
+                    continue
+                stack = frame_stack(frame)
+                if self.skip_idle and is_idle(stack):
+                    continue
+                key = (self._thread_name(ident), stack)
+                if key in self.counts or len(self.counts) < self.max_stacks:
+                    self.counts[key] += 1
+                else:
+                    self.dropped += 1
+            self.samples += 1
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds if self.max_seconds else None
+        while not self._stop.wait(self.interval):
+            self.sample()
+            if deadline is not None and time.monotonic() > deadline:
+                break
+        self.stopped_at = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            return Counter(self.counts)
+
+    def status(self):
+        end = self.stopped_at or time.time()
+        return {
+            "running": self.running,
+            "interval_ms": round(self.interval * 1000, 3),
+            "started_at": self.started_at,
+            "seconds": round(end - self.started_at, 3) if self.started_at else 0.0,
+            "samples": self.samples,
+            "distinct_stacks": len(self.counts),
+            "dropped": self.dropped,
+        }
+
+# --- Output formats ---
+
+def _frame_label(frame):
+    name, filename, line = frame
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+def to_collapsed(counts):
+    """Brendan Gregg's folded stacks: `thread;root;...;leaf count` per line."""
+    lines = [";".join([thread] + [_frame_label(f) for f in stack]) + f" {count}"
+             for (thread, stack), count in counts.most_common()]
+    return "\n".join(lines) + "\n"
+
+def to_speedscope(counts, interval, name="profile"):
+    """speedscope file with one sampled profile per thread; sample weights are milliseconds."""
+    frames, frame_index, profiles = [], {}, {}
+    for (thread, stack), count in counts.items():
+        indices = []
+        for frame in stack:
+            index = frame_index.get(frame)
+            if index is None:
+                index = frame_index[frame] = len(frames)
+                frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+            indices.append(index)
+        profile = profiles.setdefault(thread, {"samples": [], "weights": []})
+        profile["samples"].append(indices)
+        profile["weights"].append(round(count * interval * 1000, 3))
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "ai-chef profiling",
+        "shared": {"frames": frames},
+        "profiles": [{"type": "sampled", "name": thread, "unit": "milliseconds", "startValue": 0,
+                      "endValue": round(sum(p["weights"]), 3), "samples": p["samples"], "weights": p["weights"]}
+                     for thread, p in sorted(profiles.items())],
+    }
+
+def render(counts, fmt, interval, name="profile"):
+    """(bytes, media type) of a profile in `fmt`."""
+    if fmt == "collapsed":
+        return to_collapsed(counts).encode("utf-8"), "text/plain; charset=utf-8"
+    return json.dumps(to_speedscope(counts, interval, name)).encode("utf-8"), "application/json"
+
+# --- Stored request profiles ---
+
+class ProfileStore:
+    """Profile files in one directory, newest `keep` retained."""
+
+    def __init__(self, directory=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+
+    def save(self, name, content):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, name), 'wb') as f:
+            f.write(content)
+        for old in self.list()[self.keep:]:
+            try:
+                os.remove(os.path.join(self.directory, old["name"]))
+            except OSError:
+                pass
+
+    def list(self):
+        """Newest first, as name/bytes/created_at."""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(tuple(FORMATS.values())):
+                st = entry.stat()
+                entries.append({"name": entry.name, "bytes": st.st_size, "created_at": st.st_mtime})
+        return sorted(entries, key=lambda e: e["created_at"], reverse=True)
+
+    def path(self, name):
+        """Full path of a stored profile, or None for unknown or unsafe names."""
+        if os.path.basename(name) != name or not name.endswith(tuple(FORMATS.values())):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+profile_store = ProfileStore()
+
+_factory_loops = weakref.WeakSet()
+
+def install_task_factory(loop):
+    """
+    Wraps the loop's task factory so tasks created while a request is being profiled are
+    registered with its RequestProfile (they inherit request_profile_var from their creator).
+    """
+    if loop in _factory_loops:
+        return
+    previous = loop.get_task_factory()
+
+    def factory(loop, coro, **kwargs):
+        task = previous(loop, coro, **kwargs) if previous is not None else asyncio.Task(coro, loop=loop, **kwargs)
+        context = kwargs.get("context")
+        profile = context.get(request_profile_var) if context is not None else request_profile_var.get()
+        if profile is not None:
+            profile.add_task(task)
+        return task
+    loop.set_task_factory(factory)
+    _factory_loops.add(loop)
+
+class RequestProfile:
+    """
+    Sampler over the threads currently doing work for one request (see metrics.span and
+    bind_context). The event loop thread interleaves every request's coroutines, so it is only
+    sampled while one of this request's tasks is the one running on it.
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL, max_seconds=PROFILE_MAX_SECONDS):
+        self._threads = {}
+        self._lock = threading.Lock()
+        self._tasks = weakref.WeakSet()
+        self.loop = None
+        self.loop_thread = None
+        self.sampler = StackSampler(interval, thread_ids=self.thread_ids, max_seconds=max_seconds)
+
+    def attach_loop(self):
+        """Called from the request's own task on the event loop."""
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        install_task_factory(self.loop)
+        self.add_task(asyncio.current_task())
+
+    def add_task(self, task):
+        with self._lock:
+            self._tasks.add(task)
+
+    def thread_ids(self):
+        with self._lock:
+            ids = set(self._threads)
+            if self.loop_thread in ids and asyncio.current_task(self.loop) not in self._tasks:
+                ids.discard(self.loop_thread)  # the loop is idle or running another request
+            return ids
+
+    def enter_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+
+    def exit_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            remaining = self._threads.get(ident, 0) - 1
+            if remaining > 0:
+                self._threads[ident] = remaining
+            else:
+                self._threads.pop(ident, None)
+
+# --- Continuous sampler ---
+
+class ContinuousProfiler:
+    """The always-available low-rate sampler behind /admin/profiler."""
+
+    def __init__(self):
+        self.sampler = None
+        self._lock = threading.Lock()
+
+    def start(self, interval=None):
+        with self._lock:
+            if self.sampler is not None and self.sampler.running:
+                return self.status()
+            self.sampler = StackSampler(interval or SAMPLER_INTERVAL, skip_idle=True).start()
+            logger.info(f"Continuous profiler started ({self.sampler.interval * 1000:.0f} ms interval).")
+            return self.status()
+
+    def stop(self):
+        with self._lock:
+            if self.sampler is not None and self.sampler.running:
+                self.sampler.stop()
+                logger.info("Continuous profiler stopped.")
+            return self.status()
+
+    def status(self):
+        if self.sampler is None:
+            return {"running": False, "samples": 0}
+        return self.sampler.status()
+
+    def render(self, fmt="speedscope"):
+        """The profile collected since the last start, or None if it was never started."""
+        if self.sampler is None:
+            return None
+        return render(self.sampler.snapshot(), fmt, self.sampler.interval, "continuous")
+
+continuous_profiler = ContinuousProfiler()
+
+# --- ASGI middleware ---
+
+def requested_format(scope):
+    """Profile format asked for by the X-Profile header or ?profile= query flag, else None."""
+    value = dict(scope.get("headers") or []).get(b"x-profile")
+    value = value.decode("latin-1") if value is not None else None
+    if value is None and scope.get("query_string"):
+        values = parse_qs(scope["query_string"].decode("latin-1")).get("profile")
+        value = values[0] if values else None
+    if value is None or value.strip().lower() in ("", "0", "false", "no"):
+        return None
+    value = value.strip().lower()
+    return value if value in FORMATS else "speedscope"
+
+class ProfilingMiddleware:
+    """
+    Profiles single requests that carry the profile flag. `authorize(scope)` is awaited only
+    for flagged requests; requests that fail it are served normally, without a profile.
+    Must sit inside MetricsMiddleware so the request id is bound.
+    """
+
+    def __init__(self, app, authorize):
+        self.app = app
+        self.authorize = authorize
+
+    async def __call__(self, scope, receive, send):
+        fmt = requested_format(scope) if scope["type"] == "http" else None
+        if fmt is None:
+            await self.app(scope, receive, send)
+            return
+        if not await self.authorize(scope):
+            logger.warning("Profile requested without admin credentials; ignored.")
+            await self.app(scope, receive, send)
+            return
+
+        # The X-Profile header goes out before the profile is stored, so the name must be a valid
+        # file name up front: the client-supplied request id is sanitised and a server suffix added
+        request_id = UNSAFE_NAME_CHARS.sub("_", str(request_id_var.get()))[:64]
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request_id}-{uuid.uuid4().hex[:8]}{FORMATS[fmt]}"
+        scope["profile"] = name
+        profile = RequestProfile()
+        token = request_profile_var.set(profile)
+        profile.attach_loop()
+        profile.enter_thread()  # the event loop thread; sampled only while one of this request's tasks runs
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers") or []) + [(b"x-profile", f"/admin/profiles/{name}".encode("latin-1"))]
+            await send(message)
+
+        profile.sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.sampler.stop()
+            profile.exit_thread()
+            request_profile_var.reset(token)
+            try:
+                content, _ = render(profile.sampler.snapshot(), fmt, profile.sampler.interval, name)
+                profile_store.save(name, content)
+                logger.info(f"Stored request profile {name} ({profile.sampler.samples} samples).")
+            except OSError as e:
+                logger.warning(f"Could not store request profile {name}: {e}")
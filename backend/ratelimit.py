@@ -0,0 +1,247 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request
+from jose import JWTError, jwt
+
+from auth import ALGORITHM, SECRET_KEY
+from metrics import REGISTRY, Counter
+
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "admission_rejected_total", "LLM-backed requests turned away with 429", ("priority_class", "reason")))
+
+# Priority class of the admission the current request holds; lets throttle() tell whose call got the 429
+admission_class_var = contextvars.ContextVar("admission_class", default=None)
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, cost=1.0, reserve=0.0):
+        """
+        Takes `cost` tokens if that leaves at least `reserve` behind.
+        Returns (admitted, seconds until it would be admitted).
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens - cost >= reserve:
+                self.tokens -= cost
+                return True, 0.0
+            needed = cost + reserve - self.tokens
+            return False, needed / self.rate if self.rate > 0 else 60.0
+
+    def refund(self, cost=1.0):
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + cost)
+
+    def drain(self, keep=0.0):
+        """Empties the bucket down to at most `keep` tokens."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, keep)
+
+class PriorityGate:
+    """
+    At most `max_concurrent` holders. Waiters queue by priority (lower first), the queue is
+    bounded, and a waiter gives up after `timeout` seconds.
+    """
+
+    def __init__(self, max_concurrent, max_queue, timeout):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = []
+        self._order = itertools.count()
+
+    async def acquire(self, priority):
+        """Returns None once a slot is held, or a reason string if the request should be rejected."""
+        if self._waiters and any(w[2].done() for w in self._waiters):
+            self._waiters = [w for w in self._waiters if not w[2].done()]  # timed-out waiters
+            heapq.heapify(self._waiters)
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            return None
+        if len(self._waiters) >= self.max_queue:
+            return "queue_full"
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), future))
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return None  # a slot was handed over just as we timed out
+            future.cancel()
+            return "queue_timeout"
+        except BaseException:
+            # The waiting task was cancelled (e.g. a streaming client went away): pass on a
+            # slot that was already handed to us, or drop out of the queue so release() skips us
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+            raise
+        task = asyncio.current_task()
+        if task is not None and task.cancelling():
+            # Cancelled just as the slot was handed over; wait_for (before 3.12) reports the
+            # handover instead of the cancellation, so pass the slot on and cancel as asked
+            self.release()
+            raise asyncio.CancelledError()
+        return None
+
+    def release(self):
+        # Hand the slot straight to the highest-priority live waiter
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(True)
+                return
+        self.active -= 1
+
+@dataclass
+class PriorityClass:
+    priority: int           # lower is served first when requests queue
+    user_rate: float        # per-user requests per second
+    user_burst: float
+    global_reserve: float   # global tokens this class must leave for higher classes
+
+class AdmissionController:
+    """
+    Admission for endpoints that call paid or quota-limited upstream models. A request needs a
+    token from its user's bucket for its class and from the shared global bucket, then a
+    concurrency slot. Anything that can't be admitted soon gets a fast 429 with Retry-After.
+    """
+
+    def __init__(self, classes, global_rate, global_burst, max_concurrent, max_queue, queue_timeout, max_users=10000):
+        self.classes = classes
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.gate = PriorityGate(max_concurrent, max_queue, queue_timeout)
+        self.max_users = max_users
+        self._user_buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.throttled_until = {name: 0.0 for name in classes}
+
+    def _user_bucket(self, class_name, key):
+        spec = self.classes[class_name]
+        with self._lock:
+            bucket = self._user_buckets.get((class_name, key))
+            if bucket is None:
+                bucket = self._user_buckets[(class_name, key)] = TokenBucket(spec.user_rate, spec.user_burst)
+                while len(self._user_buckets) > self.max_users:
+                    self._user_buckets.popitem(last=False)
+            else:
+                self._user_buckets.move_to_end((class_name, key))
+            return bucket
+
+    def throttle(self, seconds, class_name=None):
+        """
+        Upstream said 429 to a call made under `class_name` (default: the admission the current
+        request holds): pause that class and any lower-priority ones for a while instead of piling
+        onto the backoff. Higher-priority classes keep their global reserve. Without a class, pauses all.
+        """
+        class_name = class_name or admission_class_var.get()
+        priority = self.classes[class_name].priority if class_name in self.classes else -math.inf
+        until = time.monotonic() + seconds
+        for name, spec in self.classes.items():
+            if spec.priority >= priority:
+                self.throttled_until[name] = max(self.throttled_until[name], until)
+        self.global_bucket.drain(keep=self.classes[class_name].global_reserve if class_name in self.classes else 0.0)
+
+    def _reject(self, class_name, reason, retry_after):
+        ADMISSION_REJECTED.inc(class_name, reason)
+        return HTTPException(status_code=429, detail=f"Too many requests ({reason.replace('_', ' ')}). Please retry shortly.",
+                             headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+    def try_admit(self, class_name, key):
+        """Token checks only. Returns None if admitted, else the HTTPException to raise."""
+        spec = self.classes[class_name]
+        throttled = self.throttled_until[class_name] - time.monotonic()
+        if throttled > 0:
+            return self._reject(class_name, "upstream_throttled", throttled)
+        user_bucket = self._user_bucket(class_name, key)
+        admitted, wait = user_bucket.try_acquire()
+        if not admitted:
+            return self._reject(class_name, "user_budget", wait)
+        admitted, wait = self.global_bucket.try_acquire(reserve=spec.global_reserve)
+        if not admitted:
+            user_bucket.refund()
+            return self._reject(class_name, "global_budget", wait)
+        return None
+
+    @asynccontextmanager
+    async def admit(self, class_name, key):
+        rejection = self.try_admit(class_name, key)
+        if rejection is not None:
+            raise rejection
+        reason = await self.gate.acquire(self.classes[class_name].priority)
+        if reason is not None:
+            # Turned away without doing any work: give the tokens back
+            self._user_bucket(class_name, key).refund()
+            self.global_bucket.refund()
+            raise self._reject(class_name, reason, self.gate.timeout)
+        previous = admission_class_var.get()
+        admission_class_var.set(class_name)
+        try:
+            yield
+        finally:
+            admission_class_var.set(previous)  # by value: dependencies may exit in another context
+            self.gate.release()
+
+def _env(name, default):
+    return float(os.getenv(name, default))
+
+ADMISSION = AdmissionController(
+    classes={
+        # Cooking-mode chat and step checks: a user is waiting at the stove
+        "interactive": PriorityClass(priority=0, user_rate=_env("RATE_LIMIT_INTERACTIVE_USER_RPS", "0.5"),
+                                     user_burst=_env("RATE_LIMIT_INTERACTIVE_USER_BURST", "10"), global_reserve=0.0),
+        # Ingredient detection and the Ollama fallback recipe
+        "bulk": PriorityClass(priority=1, user_rate=_env("RATE_LIMIT_BULK_USER_RPS", "0.1"),
+                              user_burst=_env("RATE_LIMIT_BULK_USER_BURST", "5"),
+                              global_reserve=_env("RATE_LIMIT_INTERACTIVE_RESERVE", "5")),
+    },
+    global_rate=_env("RATE_LIMIT_GLOBAL_RPS", "1"),
+    global_burst=_env("RATE_LIMIT_GLOBAL_BURST", "20"),
+    max_concurrent=int(_env("RATE_LIMIT_MAX_CONCURRENT", "8")),
+    max_queue=int(_env("RATE_LIMIT_MAX_QUEUE", "32")),
+    queue_timeout=_env("RATE_LIMIT_QUEUE_TIMEOUT", "10"),
+)
+
+def client_key(request: Request):
+    """The signed-in user's email when a valid bearer token is present (no DB lookup), else the client IP."""
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            email = jwt.decode(authorization[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+            if email:
+                return f"user:{email}"
+        except JWTError:
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+def admission(class_name):
+    """FastAPI dependency that holds an admission slot for the duration of the request."""
+    async def dependency(request: Request):
+        async with ADMISSION.admit(class_name, client_key(request)):
+            yield
+    return dependency
@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+
+# Fields the API needs to build a Recipe; everything else stays in Mongo
+DISPLAY_FIELDS = [
+    "Srno", "RecipeName", "TranslatedRecipeName", "Ingredients", "PrepTimeInMins", "CookTimeInMins",
+    "URL", "Instructions", "Cuisine", "Course", "Diet", "Servings",
+]
+
+class RecipeStore:
+    """
+    Size-bounded LRU of recipe display documents keyed by Srno.
+    Misses are fetched from the recipes collection in a single `$in` query.
+    """
+
+    def __init__(self, collection, max_size=5000, fields=None):
+        self.collection = collection
+        self.max_size = max_size
+        self.projection = {field: 1 for field in (fields or DISPLAY_FIELDS)}
+        self.projection["_id"] = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, srnos):
+        """Returns documents for the given Srnos in the same order, skipping ids Mongo doesn't know."""
+        srnos = [int(s) for s in srnos]
+        found = {}
+        with self._lock:
+            for srno in srnos:
+                doc = self._cache.get(srno)
+                if doc is not None:
+                    self._cache.move_to_end(srno)
+                    found[srno] = doc
+            self.hits += len(found)
+            missing = [s for s in dict.fromkeys(srnos) if s not in found]
+            self.misses += len(missing)
+
+        if missing and self.collection is not None:
+            for doc in self.collection.find({"Srno": {"$in": missing}}, self.projection):
+                found[int(doc["Srno"])] = doc
+            with self._lock:
+                for srno in missing:
+                    if srno in found:
+                        self._cache[srno] = found[srno]
+                        self._cache.move_to_end(srno)
+                while len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+
+        return [found[s] for s in srnos if s in found]
+
+    def get(self, srno):
+        docs = self.get_many([srno])
+        return docs[0] if docs else None
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from logging_setup import get_logger
+
+logger = get_logger("result_cache")
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "2048"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "3600"))
+# "mongo" adds a shared tier in the `result_cache` collection so workers reuse each other's results
+RESULT_CACHE_SHARED = os.getenv("RESULT_CACHE_SHARED", "").lower()
+
+def model_fingerprint(*paths, settings=()):
+    """
+    Short version id from the content of the files a result depends on plus any serving
+    `settings` that change scores, so hosts serving the same model agree on it.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        digest.update(b"\x00")
+    digest.update(json.dumps([str(s) for s in settings]).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+def constraints_hash(constraints):
+    """Order- and case-insensitive digest of a user's allergy/diet constraints. None means no profile filtering."""
+    if constraints is None:
+        return "none"
+    canonical = {name: sorted({str(v).strip().lower() for v in values if v}) for name, values in sorted(constraints.items())}
+    return hashlib.sha1(json.dumps(canonical).encode("utf-8")).hexdigest()[:16]
+
+def query_key(model_version, ingredients, prep_time, cook_time, constraints, *extra):
+    """Ingredients are expected already cleaned; order and duplicates don't matter."""
+    parts = [model_version, ",".join(sorted(set(ingredients))), str(prep_time), str(cook_time),
+             constraints_hash(constraints)] + [str(e) for e in extra]
+    return hashlib.sha1("\x00".join(parts).encode("utf-8")).hexdigest()
+
+class MongoResultTier:
+    """
+    Shared tier in a MongoDB collection. Values pass through `encode`/`decode` so only plain
+    documents are stored; a TTL index on created_at expires entries from old model versions.
+    """
+
+    def __init__(self, collection, encode, decode, ttl=RESULT_CACHE_TTL):
+        self.collection = collection
+        self.encode = encode
+        self.decode = decode
+        self.ttl = ttl
+        try:
+            collection.create_index("created_at", expireAfterSeconds=int(ttl))
+        except Exception as e:
+            logger.warning(f"Could not create result cache TTL index: {e}")
+
+    def get(self, key):
+        doc = self.collection.find_one({"_id": key})
+        if doc is None or doc["created_at"] < datetime.utcnow() - timedelta(seconds=self.ttl):
+            return None  # the TTL monitor only runs once a minute
+        return self.decode(doc["value"])
+
+    def set(self, key, value, model_version):
+        self.collection.replace_one({"_id": key}, {"_id": key, "model_version": model_version, "created_at": datetime.utcnow(),
+                                                   "value": self.encode(value)}, upsert=True)
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+class ResultCache:
+    """
+    In-process LRU with an optional shared tier. Concurrent misses for the same key are
+    single-flighted: one caller computes, the rest wait for its result. Cached values are
+    shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, max_size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL, shared=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.shared = shared
+        self.model_version = None
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.coalesced = 0
+
+    @property
+    def enabled(self):
+        return self.max_size > 0
+
+    def set_version(self, model_version):
+        """Drops every local entry when the model changes. Shared entries are keyed by version already."""
+        with self._lock:
+            if model_version != self.model_version:
+                if self._entries:
+                    logger.info(f"Model version changed ({self.model_version} -> {model_version}); result cache cleared.")
+                self._entries.clear()
+                self.model_version = model_version
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _get_local(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put_local(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _get_shared(self, key):
+        try:
+            return self.shared.get(key)
+        except Exception as e:
+            logger.warning(f"Shared result cache lookup failed: {e}")
+            return None
+
+    def _set_shared(self, key, value):
+        try:
+            self.shared.set(key, value, self.model_version)
+        except Exception as e:
+            logger.warning(f"Shared result cache write failed: {e}")
+
+    def get_or_compute(self, key, compute):
+        if not self.enabled:
+            return compute()
+
+        with self._lock:
+            entry = self._get_local(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.hits += 1
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = self._get_shared(key) if self.shared is not None else None
+            shared_hit = value is not None
+            if not shared_hit:
+                value = compute()
+                if self.shared is not None:
+                    self._set_shared(key, value)
+            with self._lock:
+                if shared_hit:
+                    self.hits += 1
+                    self.shared_hits += 1
+                else:
+                    self.misses += 1
+                self._put_local(key, value)
+            flight.value = value
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def stats(self):
+        total = self.hits + self.misses
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "shared_hits": self.shared_hits,
+                "coalesced": self.coalesced,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "model_version": self.model_version,
+            }
@@ -0,0 +1,34 @@
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def json_dumps(content) -> bytes:
+    """Compact JSON bytes. Uses orjson when installed (numpy values included), else the stdlib."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with json_dumps. Return it directly to skip jsonable_encoder."""
+
+    def render(self, content) -> bytes:
+        return json_dumps(content)
+
+def parse_fields(fields, allowed):
+    """`fields=name,match_score` -> ordered list of known field names, or None for everything. `id` is always kept."""
+    if not fields:
+        return None
+    selected = [f.strip() for f in fields.split(",") if f.strip() in allowed]
+    return ["id"] + [f for f in selected if f != "id"] if "id" in allowed else selected
+
+def select_fields(models, fields):
+    """Dumps pydantic models to dicts, keeping only `fields` when given."""
+    if fields is None:
+        return [m.model_dump() for m in models]
+    keep = set(fields)
+    return [m.model_dump(include=keep) for m in models]
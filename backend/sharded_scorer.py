@@ -0,0 +1,91 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import norm as sparse_norm
+from sklearn.preprocessing import normalize
+
+# Row shards scored in parallel per /recommend query. 1 scores one shard inline (no pool);
+# 0 disables the scorer and keeps calculate_similarity.
+SCORING_SHARDS = int(os.getenv("SCORING_SHARDS", "0"))
+
+INGREDIENT_WEIGHT, PREP_WEIGHT, COOK_WEIGHT = 0.8, 0.1, 0.1
+
+def unit_rows(matrix):
+    """The matrix itself when its rows are already L2-normalised (TF-IDF output is), else a normalised copy."""
+    norms = sparse_norm(matrix, axis=1)
+    if np.allclose(norms[norms > 0], 1, atol=1e-3):
+        return matrix
+    return normalize(matrix, norm="l2", copy=True)
+
+def row_view(matrix, start, stop):
+    """Rows [start, stop) sharing the parent's data and indices arrays, unlike matrix[start:stop]."""
+    lo, hi = matrix.indptr[start], matrix.indptr[stop]
+    view = sp.csr_matrix((stop - start, matrix.shape[1]), dtype=matrix.dtype)
+    # Assigned after construction: the constructor's prune() copies slices under half their base array
+    view.data, view.indices, view.indptr = matrix.data[lo:hi], matrix.indices[lo:hi], matrix.indptr[start:stop + 1] - lo
+    return view
+
+class Shard:
+    """Contiguous rows [start, stop) of the catalog with their own L2-normalised matrix and time arrays."""
+
+    def __init__(self, start, matrix, prep_times, cook_times):
+        self.start = start
+        self.matrix = matrix
+        self.prep_times = prep_times
+        self.cook_times = cook_times
+
+    def top_k(self, query, user_prep_time, user_cook_time, max_prep_time, max_cook_time, k):
+        """(global row indices, scores) of this shard's k best rows, best first. Heavy work releases the GIL."""
+        scores = self.matrix @ query
+        scores *= INGREDIENT_WEIGHT
+        scores += PREP_WEIGHT * (1 - np.abs(self.prep_times - user_prep_time) / max_prep_time)
+        scores += COOK_WEIGHT * (1 - np.abs(self.cook_times - user_cook_time) / max_cook_time)
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.lexsort((top, -scores[top]))]
+        return top + self.start, scores[top]
+
+class ShardedScorer:
+    """
+    Exact /recommend scoring split across row shards. Shards are scored concurrently on a
+    thread pool (scipy's sparse mat-vec and numpy's partition release the GIL) and their
+    per-shard top-k lists are merged. Same ranking as calculate_similarity, ties broken by row.
+    """
+
+    def __init__(self, tfidf_matrix, prep_times, cook_times, max_prep_time, max_cook_time, n_shards, executor=None):
+        matrix = unit_rows(tfidf_matrix.tocsr())  # cosine becomes a dot product
+        n_rows = matrix.shape[0]
+        n_shards = max(1, min(n_shards, n_rows))
+        bounds = np.linspace(0, n_rows, n_shards + 1).astype(int)
+        self.shards = [Shard(start, row_view(matrix, start, stop), prep_times[start:stop], cook_times[start:stop])
+                       for start, stop in zip(bounds[:-1], bounds[1:])]
+        self.dtype = matrix.dtype
+        self.n_rows = n_rows
+        self.max_prep_time = max_prep_time
+        self.max_cook_time = max_cook_time
+        self._own_executor = executor is None and n_shards > 1
+        self.executor = ThreadPoolExecutor(max_workers=n_shards, thread_name_prefix="shard") if self._own_executor else executor
+
+    def __len__(self):
+        return len(self.shards)
+
+    def top_k(self, query_tfidf, user_prep_time, user_cook_time, k=50):
+        """Returns (row indices, combined scores) of the k best rows, best first."""
+        query = np.asarray(normalize(query_tfidf, norm="l2").toarray()[0], dtype=self.dtype)
+        args = (query, user_prep_time, user_cook_time, self.max_prep_time, self.max_cook_time, k)
+        if self.executor is None:
+            results = [shard.top_k(*args) for shard in self.shards]
+        else:
+            results = list(self.executor.map(lambda shard: shard.top_k(*args), self.shards))
+        indices = np.concatenate([r[0] for r in results])
+        scores = np.concatenate([r[1] for r in results])
+        order = np.lexsort((indices, -scores))[:k]
+        return indices[order], scores[order]
+
+    def shutdown(self):
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
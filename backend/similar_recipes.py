@@ -0,0 +1,88 @@
+import argparse
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+SIMILAR_TABLE_PATH = os.getenv("SIMILAR_TABLE_PATH", "recipe_neighbours.npz")
+DEFAULT_NEIGHBOURS = 20
+# Small blocks keep the dense score block in cache; larger ones are slower, not faster
+DEFAULT_BLOCK_SIZE = 32
+
+_matrix = None
+
+def _init_worker(matrix):
+    global _matrix
+    _matrix = matrix
+
+def _top_neighbours(start, stop, top_n):
+    """Top-n cosine neighbours of rows [start, stop) against the whole (L2-normalised) matrix."""
+    # sparse x dense is far cheaper than sparse x sparse here: common ingredients make the product dense anyway
+    scores = np.ascontiguousarray((_matrix @ _matrix[start:stop].T.toarray()).T)
+    scores[np.arange(stop - start), np.arange(start, stop)] = -1  # never your own neighbour
+    np.negative(scores, out=scores)
+    top = np.argpartition(scores, top_n - 1, axis=1)[:, :top_n]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(top_scores, axis=1, kind="stable")
+    return start, np.take_along_axis(top, order, axis=1), -np.take_along_axis(top_scores, order, axis=1)
+
+def build_neighbour_table(tfidf_matrix, top_n=DEFAULT_NEIGHBOURS, block_size=DEFAULT_BLOCK_SIZE, workers=None):
+    """
+    Each row's top_n most similar rows, computed block by block so only block_size x n scores
+    are dense at once. Blocks run in parallel worker processes.
+    Returns (neighbours int32 [n, top_n], scores float16 [n, top_n]).
+    """
+    matrix = tfidf_matrix.tocsr().astype(np.float32)
+    n_rows = matrix.shape[0]
+    top_n = max(1, min(top_n, n_rows - 1))
+    neighbours = np.zeros((n_rows, top_n), dtype=np.int32)
+    scores = np.zeros((n_rows, top_n), dtype=np.float16)
+    blocks = [(start, min(start + block_size, n_rows), top_n) for start in range(0, n_rows, block_size)]
+
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker, initargs=(matrix,)) as executor:
+        for start, block_neighbours, block_scores in executor.map(_top_neighbours, *zip(*blocks)):
+            neighbours[start:start + len(block_neighbours)] = block_neighbours
+            scores[start:start + len(block_scores)] = block_scores
+    return neighbours, scores
+
+class NeighbourTable:
+    """Precomputed neighbours, row-aligned with the model's tfidf_matrix."""
+
+    def __init__(self, neighbours, scores, srnos):
+        self.neighbours = neighbours
+        self.scores = scores
+        self.srnos = srnos
+
+    @property
+    def n_rows(self):
+        return self.neighbours.shape[0]
+
+    def lookup(self, row, limit=None):
+        """Returns (neighbour rows, scores) for a matrix row."""
+        return self.neighbours[row, :limit], self.scores[row, :limit].astype(np.float32)
+
+def save_neighbour_table(path, neighbours, scores, srnos):
+    np.savez(path, neighbours=neighbours, scores=scores, srnos=np.asarray(srnos, dtype=np.int64))
+
+def load_neighbour_table(path=SIMILAR_TABLE_PATH):
+    with np.load(path) as data:
+        return NeighbourTable(data["neighbours"], data["scores"], data["srnos"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute the similar-recipes table for the recipe TF-IDF model.")
+    parser.add_argument("--model", default="recipe_recommender_model.pkl")
+    parser.add_argument("--out", default=SIMILAR_TABLE_PATH)
+    parser.add_argument("--top", type=int, default=DEFAULT_NEIGHBOURS, help="Neighbours kept per recipe")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE, help="Rows scored per block")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        model = pickle.load(f)
+    t0 = time.perf_counter()
+    neighbours, scores = build_neighbour_table(model['tfidf_matrix'], args.top, args.block_size, args.workers)
+    save_neighbour_table(args.out, neighbours, scores, model['dataframe']['Srno'].to_numpy())
+    print(f"Wrote {args.out}: {neighbours.shape[0]} recipes x {neighbours.shape[1]} neighbours "
+          f"({(neighbours.nbytes + scores.nbytes) / 1e6:.1f} MB) in {time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,45 @@
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from ann_index import build_ann_index, load_ann_index, save_ann_index
+
+def clustered_matrix(n_rows=400, n_terms=120, n_topics=8, seed=3):
+    rng = np.random.default_rng(seed)
+    rows, cols = [], []
+    for row in range(n_rows):
+        topic = row % n_topics
+        terms = rng.choice(n_terms // n_topics, size=5, replace=False) + topic * (n_terms // n_topics)
+        rows += [row] * 5
+        cols += terms.tolist()
+    matrix = sparse.csr_matrix((rng.random(len(rows)) + 0.5, (rows, cols)), shape=(n_rows, n_terms))
+    return normalize(matrix)
+
+def test_probing_every_list_scans_every_row():
+    matrix = clustered_matrix()
+    index = build_ann_index(matrix, n_components=16, n_lists=10)
+    rows, scores = index.search(matrix[0], k=10, nprobe=10)
+    assert sorted(rows.tolist()) == list(range(matrix.shape[0]))
+    assert rows[np.argmax(scores)] == 0
+
+def test_ivf_recall_against_brute_force_in_embedding_space():
+    matrix = clustered_matrix()
+    index = build_ann_index(matrix, n_components=16, n_lists=10)
+    recalls = []
+    for query_row in range(0, 400, 37):
+        query = matrix[query_row]
+        exact = np.argsort(-(index.embeddings @ index.embed(query)[0]))[:10]
+        rows, scores = index.search(query, k=10, nprobe=2)
+        approx = rows[np.argsort(-scores)[:10]]
+        recalls.append(len(set(exact) & set(approx)) / 10)
+    assert np.mean(recalls) >= 0.9
+
+def test_save_and_load_round_trip(tmp_path):
+    matrix = clustered_matrix()
+    index = build_ann_index(matrix, n_components=16, n_lists=10)
+    path = str(tmp_path / "ann.pkl")
+    save_ann_index(index, path)
+    loaded = load_ann_index(path)
+    assert loaded.backend == "ivf"
+    for a, b in zip(index.search(matrix[5], nprobe=4), loaded.search(matrix[5], nprobe=4)):
+        np.testing.assert_array_equal(a, b)
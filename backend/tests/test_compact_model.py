@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from compact_model import compact_model, downcast, matrix_nbytes, prune, ranking_agreement, serving_matrix
+from text_processing import preprocess_text
+
+INGREDIENTS = ["onion, tomato, garlic", "onion, tomato, chilli", "rice, lentil, turmeric", "rice, lentil, ghee",
+               "paneer, peas, cream", "paneer, peas, onion", "potato, cumin, saffron"] * 4
+
+def make_model():
+    df = pd.DataFrame({"Srno": np.arange(1, len(INGREDIENTS) + 1), "Ingredients": INGREDIENTS,
+                       "PrepTimeInMins": np.arange(len(INGREDIENTS)) % 5 * 10 + 5,
+                       "CookTimeInMins": np.arange(len(INGREDIENTS)) % 3 * 15 + 10})
+    vectorizer = TfidfVectorizer()
+    matrix = vectorizer.fit_transform([preprocess_text(x) for x in INGREDIENTS]).tocsr()
+    return {"dataframe": df, "tfidf_vectorizer": vectorizer, "tfidf_matrix": matrix}
+
+def test_downcast_shrinks_and_serving_widens_float16():
+    matrix = make_model()["tfidf_matrix"]
+    small = downcast(matrix, np.float16)
+    assert small.indices.dtype == np.int32 and matrix_nbytes(small) < matrix_nbytes(matrix)
+    assert serving_matrix(small).dtype == np.float32
+    served = serving_matrix(downcast(matrix, np.float32))
+    assert serving_matrix(served) is served
+
+def test_prune_keeps_vectorizer_and_matrix_aligned():
+    model = make_model()
+    vectorizer, matrix, df = prune(model["tfidf_vectorizer"], model["tfidf_matrix"], model["dataframe"], min_df=5)
+    assert len(vectorizer.vocabulary_) == matrix.shape[1] < model["tfidf_matrix"].shape[1]
+    assert "saffron" not in vectorizer.vocabulary_
+    assert matrix.shape[0] == len(df)
+    np.testing.assert_allclose(np.sqrt(matrix.multiply(matrix).sum(axis=1)).A1, 1.0, rtol=1e-6)
+    query = vectorizer.transform([preprocess_text("onion, saffron")])
+    assert query.shape[1] == matrix.shape[1]
+    assert "saffron" in model["tfidf_vectorizer"].vocabulary_  # the input is left alone
+
+def test_float32_compaction_keeps_the_ranking():
+    model = make_model()
+    compacted = compact_model(model, np.float32, min_df=1)
+    assert compacted["tfidf_matrix"].dtype == np.float32
+    queries = [(["onion", "tomato"], 10.0, 25.0), (["rice", "lentil"], 5.0, 10.0)]
+    report = ranking_agreement(model, compacted, queries, ks=(3, 9))
+    assert report["overlap@3"] == 1.0 and report["overlap@9"] == 1.0
@@ -0,0 +1,46 @@
+import asyncio
+import gzip
+
+import compression
+from compression import CompressionMiddleware, choose_encoding, parse_accept_encoding
+
+def run(app, accept_encoding="gzip"):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", accept_encoding.encode())]}
+    asyncio.run(CompressionMiddleware(app, minimum_size=100)(scope, None, send))
+    return dict(sent[0]["headers"]), sent[1:]
+
+def respond(*chunks, content_type=b"application/json"):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", content_type), (b"content-length", b"0")]})
+        for i, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": i < len(chunks) - 1})
+    return app
+
+def test_accept_encoding_negotiation(monkeypatch):
+    assert parse_accept_encoding("gzip;q=0.5, br, identity;q=0") == {"gzip": 0.5, "br": 1.0, "identity": 0.0}
+    monkeypatch.setattr(compression, "brotli", None)
+    assert choose_encoding("br, gzip;q=0.5") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("*") == "gzip"
+    assert choose_encoding("") is None
+
+def test_large_json_is_gzipped(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    body = b'{"recipes": [' + b'"dal",' * 100 + b'"poha"]}'
+    headers, messages = run(respond(body))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert int(headers[b"content-length"]) == len(messages[0]["body"])
+    assert gzip.decompress(messages[0]["body"]) == body
+
+def test_small_streamed_and_binary_bodies_pass_through():
+    for app in (respond(b"{}"), respond(b"x" * 200, b"y" * 200), respond(b"x" * 200, content_type=b"image/png")):
+        headers, messages = run(app)
+        assert b"content-encoding" not in headers
+        assert all(not m["body"].startswith(b"\x1f\x8b") for m in messages)
@@ -0,0 +1,81 @@
+import json
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import ingest
+from text_processing import recipe_document
+
+def make_model(ingredients):
+    df = pd.DataFrame({"Srno": np.arange(1, len(ingredients) + 1), "RecipeName": [f"r{i}" for i in range(len(ingredients))],
+                       "Ingredients": ingredients})
+    vectorizer = TfidfVectorizer()
+    matrix = vectorizer.fit_transform([recipe_document(x) for x in ingredients]).tocsr()
+    return {"dataframe": df, "tfidf_vectorizer": vectorizer, "tfidf_matrix": matrix}
+
+CATALOG = ["onion tomato garlic", "rice lentil turmeric", "paneer peas cream", "potato cumin chilli"] * 5
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            doc = op._doc["$set"]
+            self.docs[doc["Srno"]] = dict(self.docs.get(doc["Srno"], {}), **doc)
+
+        class Result:
+            upserted_count = len(ops)
+            matched_count = 0
+        return Result()
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+def test_ingest_appends_and_updates_rows_in_place():
+    model = make_model(CATALOG)
+    new = pd.DataFrame({"Srno": [2, None], "RecipeName": ["dal", "aloo"], "Ingredients": [None, "potato onion"]})
+    model, ingested, report = ingest.ingest_recipes(model, new, drift_threshold=1.0, refit_fraction=None)
+    df = model["dataframe"]
+    assert (report["appended"], report["updated"], report["refit"]) == (1, 1, False)
+    assert len(df) == len(CATALOG) + 1 and model["tfidf_matrix"].shape[0] == len(df)
+    assert df.loc[df["Srno"] == 2, "RecipeName"].item() == "dal"
+    assert df.loc[df["Srno"] == 2, "Ingredients"].item() == CATALOG[1]  # unsupplied columns keep their value
+    assert df["Srno"].iloc[-1] == len(CATALOG) + 1
+
+def test_refit_once_enough_recipes_arrive_without_drift():
+    model = make_model(CATALOG)
+    batch = pd.DataFrame({"RecipeName": ["x", "y"], "Ingredients": ["onion tomato", "rice lentil"]})
+    refits = []
+    for _ in range(5):
+        model, _, report = ingest.ingest_recipes(model, batch, drift_threshold=1.0, refit_fraction=0.25)
+        refits.append(report["refit"])
+        assert report["vocabulary_drift"] == 0.0
+    assert refits == [False, False, False, True, False]  # 8 of 28 recipes are new at the fourth batch
+    assert model["ingest_stats"]["docs_since_refit"] == 2
+
+def test_mongo_is_synced_after_the_model_is_saved_and_replays(tmp_path, monkeypatch):
+    model_path = str(tmp_path / "model.pkl")
+    ingest.save_model_data(make_model(CATALOG), model_path)
+    recipes = tmp_path / "new.csv"
+    pd.DataFrame({"RecipeName": ["aloo"], "Ingredients": ["potato onion"]}).to_csv(recipes, index=False)
+
+    def unreachable(*args, **kwargs):
+        assert json.load(open(ingest.pending_path(model_path))) == [len(CATALOG) + 1]
+        assert len(ingest.load_model_data(model_path)["dataframe"]) == len(CATALOG) + 1  # saved first
+        raise ConnectionError("mongo down")
+    monkeypatch.setattr(ingest, "upsert_to_mongo", unreachable)
+    try:
+        ingest.main([str(recipes), "--model", model_path])
+    except ConnectionError:
+        pass
+    assert ingest.load_pending(model_path) == {len(CATALOG) + 1}
+
+    # The next run replays the journal from the saved model, then clears it
+    monkeypatch.undo()
+    collection = FakeCollection()
+    model = ingest.load_model_data(model_path)
+    assert ingest.sync_pending_to_mongo(model, model_path, collection=collection) == 1
+    assert collection.docs[len(CATALOG) + 1]["RecipeName"] == "aloo"
+    assert ingest.load_pending(model_path) == set()
@@ -0,0 +1,31 @@
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from ingredient_matcher import IngredientMatcher, build_ingredient_matcher
+
+def test_leftmost_longest_matches_win():
+    matcher = IngredientMatcher({"green chilli": "green chilli", "chilli": "red chilli", "chilli powder": "chilli powder",
+                                 "green": "green"})
+    tokens = "green chilli powder".split()
+    assert matcher.find(tokens) == [(0, 2, "green chilli")]
+    assert matcher.find("chilli powder and green".split()) == [(0, 2, "chilli powder"), (3, 4, "green")]
+
+def test_synonyms_and_plurals_resolve_to_the_canonical_name():
+    matcher = build_ingredient_matcher()
+    found, unresolved = matcher.resolve("2 tomatoes, some pyaz and hari mirch")
+    assert found == ["tomato", "onion", "green chilli"]
+    assert unresolved == []
+
+def test_unknown_words_between_matches_are_reported():
+    matcher = build_ingredient_matcher()
+    assert matcher.resolve("tomato kohlrabi") == (["tomato"], ["kohlrabi"])
+    assert matcher.resolve("chopped kohlrabi with onion and fresh dragonfruit") == (["onion"], ["kohlrabi", "dragonfruit"])
+    assert matcher.shelf_life_of("cherry tomatoes") is None
+    assert matcher.shelf_life_of("fresh tomatoes") == (7, "Medium")
+
+def test_vocabulary_words_need_the_lexicon():
+    docs = ["kohlrabi stirring brand onion", "kohlrabi stirring brand garlic", "kohlrabi stirring brand tomato",
+            "kohlrabi stirring brand ginger"]
+    vectorizer = TfidfVectorizer().fit(docs)
+    matcher = build_ingredient_matcher(vectorizer, len(docs), min_df=3)
+    assert matcher.resolve("kohlrabi") == (["kohlrabi"], [])
+    assert matcher.resolve("stirring brand") == ([], ["stirring brand"])
@@ -0,0 +1,101 @@
+import smtplib
+
+import pytest
+
+import mailer as mailer_module
+from mailer import Mailer, MailQueue, MailSender, SmtpSettings
+
+class FakeSmtp:
+    connects = 0
+    fail_connect = None   # exception raised on connect
+    fail_login = None     # exception raised on login
+    send_errors = []      # exceptions raised by successive send_message calls
+    sent = []
+
+    def __init__(self, host, port, timeout=None):
+        FakeSmtp.connects += 1
+        if FakeSmtp.fail_connect:
+            raise FakeSmtp.fail_connect
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        if FakeSmtp.fail_login:
+            raise FakeSmtp.fail_login
+
+    def send_message(self, msg):
+        if FakeSmtp.send_errors:
+            raise FakeSmtp.send_errors.pop(0)
+        FakeSmtp.sent.append(msg["To"])
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def sender(tmp_path, monkeypatch):
+    monkeypatch.setattr(mailer_module.smtplib, "SMTP", FakeSmtp)
+    monkeypatch.setenv("SMTP_USER", "user")
+    monkeypatch.setenv("SMTP_PASSWORD", "secret")
+    FakeSmtp.connects, FakeSmtp.fail_connect, FakeSmtp.fail_login = 0, None, None
+    FakeSmtp.send_errors, FakeSmtp.sent = [], []
+    return MailSender(MailQueue(str(tmp_path / "outbox.sqlite3")))
+
+def make_due(queue):
+    queue._conn.execute("UPDATE outbox SET next_attempt_at = 0 WHERE status = 'pending'")
+
+def attempts(queue):
+    return [row[0] for row in queue._conn.execute("SELECT attempts FROM outbox ORDER BY id")]
+
+def test_unreachable_server_defers_whole_batch_with_one_connect(sender):
+    for i in range(3):
+        sender.queue.enqueue(f"user{i}@example.com", "Hi", "<p>hi</p>")
+    FakeSmtp.fail_connect = ConnectionRefusedError("refused")
+    assert sender.send_batch() == 3
+    assert FakeSmtp.connects == 1
+    assert attempts(sender.queue) == [0, 0, 0]  # not counted against the messages
+    assert sender.queue.counts() == {"pending": 3}
+    assert sender.queue.next_due_in() > 0
+
+def test_authentication_failure_is_connection_level(sender):
+    sender.queue.enqueue("user@example.com", "Hi", "<p>hi</p>")
+    FakeSmtp.fail_login = smtplib.SMTPAuthenticationError(535, b"bad credentials")
+    sender.send_batch()
+    assert sender.queue.counts() == {"pending": 1}
+    assert attempts(sender.queue) == [0]
+
+def test_transient_failure_retries_then_dead_letters(sender, monkeypatch):
+    monkeypatch.setattr(mailer_module, "MAIL_MAX_ATTEMPTS", 2)
+    sender.queue.enqueue("user@example.com", "Hi", "<p>hi</p>")
+    FakeSmtp.send_errors = [smtplib.SMTPDataError(451, b"try later")] * 2
+    sender.send_batch()
+    assert sender.queue.counts() == {"pending": 1}
+    make_due(sender.queue)
+    sender.send_batch()
+    assert sender.queue.counts() == {"failed": 1}
+
+def test_permanent_failure_fails_at_once_and_others_still_send(sender):
+    sender.queue.enqueue("bad@example.com", "Hi", "<p>hi</p>")
+    sender.queue.enqueue("good@example.com", "Hi", "<p>hi</p>")
+    FakeSmtp.send_errors = [smtplib.SMTPRecipientsRefused({"bad@example.com": (550, b"no such user")})]
+    sender.send_batch()
+    assert sender.queue.counts() == {"failed": 1}
+    assert FakeSmtp.sent == ["good@example.com"]
+
+def test_configured_needs_credentials_unless_auth_is_off(monkeypatch):
+    for name in ("SMTP_USER", "SMTP_PASSWORD", "SMTP_AUTH"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("SMTP_SERVER", "127.0.0.1")
+    assert not SmtpSettings().configured
+    monkeypatch.setenv("SMTP_AUTH", "0")
+    assert SmtpSettings().configured
+
+def test_outbox_is_not_created_until_used(tmp_path):
+    path = tmp_path / "outbox.sqlite3"
+    mailer = Mailer(str(path))
+    assert not path.exists()
+    mailer.open()
+    assert path.exists()
@@ -0,0 +1,23 @@
+import numpy as np
+
+from meal_plan import expiry_days, greedy_cover, schedule, urgency_weight
+
+def test_urgency_weight_decays_with_days_and_explicit_weight_wins():
+    assert urgency_weight(0) > urgency_weight(1) > urgency_weight(30) > 1.0
+    assert urgency_weight() == 1.0
+    assert urgency_weight(0, weight=0.5) == 0.5
+    assert expiry_days(priority="High") == 2.0
+
+def test_greedy_cover_prefers_meals_using_uncovered_urgent_items():
+    relevance = np.array([0.9, 0.5, 0.4])
+    uses = np.array([[True, False, False],   # only the low-urgency item
+                     [False, True, True],    # both urgent items
+                     [False, True, False]])
+    picks, covered = greedy_cover(relevance, uses, np.array([1.0, 3.0, 3.0]), meals=2)
+    assert picks[0] == 1
+    assert covered[0].tolist() == [1, 2]
+    assert picks[1] == 0  # recipe 2 adds nothing new, recipe 0 still covers item 0
+
+def test_schedule_puts_soonest_expiring_first():
+    picks, covered = schedule([5, 7], [np.array([0]), np.array([1])], days=[10.0, 1.0])
+    assert picks == [7, 5]
@@ -0,0 +1,37 @@
+import importlib
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import logging_setup
+import main
+from auth import UserInDB
+
+def fake_user_from_token(token):
+    if token not in ("admin", "cook"):
+        raise HTTPException(status_code=401, detail="Could not validate credentials")
+    return UserInDB(email=f"{token}@example.com", hashed_password="x", is_admin=token == "admin")
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "user_from_token", fake_user_from_token)
+    monkeypatch.setattr(main, "METRICS_TOKEN", "scrape-secret")
+    return TestClient(main.app)
+
+def test_metrics_requires_admin_or_scrape_token(client):
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer nobody"}).status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer cook"}).status_code == 403
+    for token in ("admin", "scrape-secret"):
+        response = client.get("/metrics", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200
+        assert "# TYPE" in response.text
+
+def test_log_format_defaults_to_plain_text(monkeypatch):
+    monkeypatch.delenv("LOG_FORMAT", raising=False)
+    assert importlib.reload(logging_setup).LOG_FORMAT == "text"
+    monkeypatch.setenv("LOG_FORMAT", "json")
+    assert importlib.reload(logging_setup).LOG_FORMAT == "json"
+    monkeypatch.delenv("LOG_FORMAT")
+    importlib.reload(logging_setup)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from pantry import build_pantry_index, split_ingredients
+
+RECIPES = [
+    "['2 onions', '3 tomatoes', '1 cup rice']",
+    "paneer, green peas, onion, onion",
+    None,
+    "potato, cumin",
+]
+
+def test_split_ingredients_handles_list_literals_and_plain_text():
+    assert split_ingredients("['a', 'b']") == ["a", "b"]
+    assert split_ingredients("a, b") == ["a", "b"]
+    assert split_ingredients("['a', 'b'") == ["['a'", "'b'"]
+    assert split_ingredients(float("nan")) == []
+
+def test_coverage_matches_the_substring_rule():
+    index = build_pantry_index(RECIPES)
+    assert index.n_rows == len(RECIPES)
+    pantry = ["onion", "rice", "peas"]
+    rows = np.arange(len(RECIPES))
+    missing_counts, coverage, missing_names = index.coverage(rows, index.pantry_mask(pantry))
+    for row in rows:
+        names = index.names[index.incidence[row].indices].tolist()
+        expected = [n for n in names if not any(p in n or n in p for p in pantry)]
+        assert missing_names[row] == expected
+        assert missing_counts[row] == len(expected)
+        assert coverage[row] == (1 - len(expected) / len(names) if names else 0.0)
+    assert missing_counts[1] == 1  # onion is listed twice but counted once
+
+def test_uses_marks_the_pantry_items_each_recipe_needs():
+    index = build_pantry_index(RECIPES)
+    uses = index.uses(np.array([0, 1, 3]), ["onion", "cumin", " "])
+    assert uses.tolist() == [[True, False, False], [True, False, False], [False, True, False]]
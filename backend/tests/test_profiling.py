@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import profiling
+from metrics import request_id_var, request_profile_var
+from profiling import ProfileStore, ProfilingMiddleware, RequestProfile
+
+def spin_mine(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def spin_child(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def spin_other(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+# Spins outlast the interpreter's 5 ms switch interval, so the sampler thread gets the GIL mid-spin
+
+def sampled_functions(profile):
+    return {frame[0] for (_, stack) in profile.sampler.snapshot() for frame in stack}
+
+def test_loop_samples_exclude_other_requests():
+    profile = RequestProfile(interval=0.001)
+
+    async def child():
+        for _ in range(5):
+            spin_child(0.02)
+            await asyncio.sleep(0)
+
+    async def this_request():
+        request_profile_var.set(profile)
+        profile.attach_loop()
+        profile.enter_thread()
+        profile.sampler.start()
+        for _ in range(5):
+            spin_mine(0.02)
+            await asyncio.sleep(0)
+        await asyncio.create_task(child())  # inherits the profile through the task factory
+        profile.sampler.stop()
+
+    async def other_request():
+        for _ in range(10):
+            spin_other(0.02)
+            await asyncio.sleep(0)
+
+    async def scenario():
+        await asyncio.gather(asyncio.create_task(this_request()), asyncio.create_task(other_request()))
+    asyncio.run(scenario())
+
+    functions = sampled_functions(profile)
+    assert "spin_mine" in functions
+    assert "spin_child" in functions
+    assert "spin_other" not in functions
+
+def test_profile_name_is_sanitised(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "profile_store", ProfileStore(str(tmp_path)))
+    sent = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def authorize(scope):
+        return True
+
+    async def send(message):
+        sent.append(message)
+
+    async def scenario():
+        request_id_var.set("../a/b c")
+        scope = {"type": "http", "headers": [(b"x-profile", b"collapsed")], "query_string": b""}
+        await ProfilingMiddleware(app, authorize)(scope, None, send)
+    asyncio.run(scenario())
+
+    header = dict(sent[0]["headers"])[b"x-profile"].decode()
+    name = header.rsplit("/", 1)[1]
+    assert header == f"/admin/profiles/{name}"
+    assert "-___a_b_c-" in name
+    assert profiling.profile_store.path(name) is not None
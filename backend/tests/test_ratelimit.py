@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from ratelimit import AdmissionController, PriorityClass, PriorityGate
+
+def make_controller(**overrides):
+    settings = dict(global_rate=0.0, global_burst=10, max_concurrent=1, max_queue=0, queue_timeout=0.1)
+    settings.update(overrides)
+    return AdmissionController(
+        classes={"interactive": PriorityClass(priority=0, user_rate=0.0, user_burst=5, global_reserve=0.0),
+                 "bulk": PriorityClass(priority=1, user_rate=0.0, user_burst=5, global_reserve=4.0)},
+        **settings)
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def scenario():
+        gate = PriorityGate(max_concurrent=1, max_queue=4, timeout=0.5)
+        assert await gate.acquire(0) is None
+        waiter = asyncio.create_task(gate.acquire(0))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        gate.release()
+        assert gate.active == 0
+        assert await gate.acquire(0) is None
+        gate.release()
+        assert gate.active == 0
+    asyncio.run(scenario())
+
+def test_waiter_cancelled_after_handover_passes_slot_on():
+    async def scenario():
+        gate = PriorityGate(max_concurrent=1, max_queue=4, timeout=0.5)
+        assert await gate.acquire(0) is None
+        waiter = asyncio.create_task(gate.acquire(0))
+        await asyncio.sleep(0)
+        gate.release()  # hands the slot to the waiter...
+        waiter.cancel()  # ...which is cancelled before it resumes
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert gate.active == 0
+        assert await gate.acquire(0) is None
+        assert gate.active == 1
+    asyncio.run(scenario())
+
+def test_gate_rejection_refunds_tokens():
+    async def scenario():
+        controller = make_controller()
+        async with controller.admit("interactive", "a"):
+            with pytest.raises(HTTPException) as rejected:
+                async with controller.admit("interactive", "b"):
+                    pass
+        assert rejected.value.status_code == 429
+        assert controller.global_bucket.tokens == pytest.approx(9)  # only the admitted request paid
+        assert controller._user_bucket("interactive", "b").tokens == pytest.approx(5)
+    asyncio.run(scenario())
+
+def test_bulk_throttle_leaves_interactive_admissible():
+    controller = make_controller()
+    controller.throttle(30, "bulk")
+    assert controller.try_admit("bulk", "a").status_code == 429
+    assert controller.try_admit("interactive", "a") is None  # the reserve kept for it survives the drain
+
+def test_interactive_throttle_also_pauses_bulk():
+    controller = make_controller()
+    controller.throttle(30, "interactive")
+    assert controller.try_admit("interactive", "a").status_code == 429
+    assert controller.try_admit("bulk", "a").status_code == 429
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from result_cache import ResultCache, model_fingerprint, query_key
+
+def test_query_key_ignores_ingredient_order_and_duplicates_but_not_times():
+    key = query_key("v1", ["onion", "tomato"], 20, 30, None)
+    assert key == query_key("v1", ["tomato", "onion", "onion"], 20, 30, None)
+    assert key != query_key("v1", ["onion", "tomato"], 21, 30, None)
+    assert key != query_key("v2", ["onion", "tomato"], 20, 30, None)
+    assert key != query_key("v1", ["onion", "tomato"], 20, 30, {"allergies": ["peanut"]})
+
+def test_model_fingerprint_depends_on_content_not_location(tmp_path):
+    a, b = tmp_path / "a.pkl", tmp_path / "sub" / "b.pkl"
+    b.parent.mkdir()
+    a.write_bytes(b"model")
+    b.write_bytes(b"model")
+    assert model_fingerprint(str(a)) == model_fingerprint(str(b))
+    assert model_fingerprint(str(a), settings=("float32",)) != model_fingerprint(str(a), settings=("float64",))
+    b.write_bytes(b"model v2")
+    assert model_fingerprint(str(a)) != model_fingerprint(str(b))
+
+def test_lru_evicts_least_recently_used():
+    cache = ResultCache(max_size=2, ttl=60)
+    for key in ("a", "b"):
+        cache.get_or_compute(key, lambda key=key: key.upper())
+    cache.get_or_compute("a", lambda: "unused")  # a is now most recent
+    cache.get_or_compute("c", lambda: "C")
+    assert cache.get_or_compute("a", lambda: "recomputed") == "A"
+    assert cache.get_or_compute("b", lambda: "recomputed") == "recomputed"
+
+def test_concurrent_misses_compute_once():
+    cache = ResultCache(max_size=8, ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["value"] * 5
+    assert len(calls) == 1
+
+def test_set_version_clears_local_entries():
+    cache = ResultCache(max_size=8, ttl=60)
+    cache.set_version("v1")
+    cache.get_or_compute("k", lambda: 1)
+    cache.set_version("v2")
+    assert cache.get_or_compute("k", lambda: 2) == 2
@@ -0,0 +1,43 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.metrics.pairwise import cosine_similarity
+
+from sharded_scorer import ShardedScorer, row_view
+
+def catalog(n_rows=503, n_terms=60, seed=11):
+    rng = np.random.default_rng(seed)
+    matrix = sp.random(n_rows, n_terms, density=0.08, format="csr", random_state=seed)
+    matrix = sp.vstack([matrix, matrix[:20]], format="csr")  # duplicate rows give exact ties
+    prep = rng.integers(5, 60, matrix.shape[0]).astype(np.float64)
+    cook = rng.integers(5, 90, matrix.shape[0]).astype(np.float64)
+    return matrix, prep, cook
+
+def reference_top_k(matrix, prep, cook, query, user_prep, user_cook, k):
+    scores = (cosine_similarity(query, matrix)[0] * 0.8
+              + 0.1 * (1 - np.abs(prep - user_prep) / prep.max())
+              + 0.1 * (1 - np.abs(cook - user_cook) / cook.max()))
+    order = np.lexsort((np.arange(len(scores)), -scores))[:k]
+    return order, scores[order]
+
+def test_row_view_shares_storage():
+    matrix, _, _ = catalog()
+    view = row_view(matrix, 100, 200)
+    vector = np.arange(matrix.shape[1], dtype=np.float64)
+    np.testing.assert_allclose(view @ vector, matrix[100:200] @ vector)
+    assert np.shares_memory(view.data, matrix.data) and np.shares_memory(view.indices, matrix.indices)
+
+def test_sharded_top_k_equals_unsharded():
+    matrix, prep, cook = catalog()
+    rng = np.random.default_rng(5)
+    for n_shards in (1, 3, 8):
+        scorer = ShardedScorer(matrix, prep, cook, prep.max(), cook.max(), n_shards)
+        try:
+            for _ in range(5):
+                query = sp.random(1, matrix.shape[1], density=0.2, format="csr", random_state=rng)
+                for k in (1, 10, 50):
+                    rows, scores = scorer.top_k(query, 30.0, 45.0, k)
+                    expected_rows, expected_scores = reference_top_k(matrix, prep, cook, query, 30.0, 45.0, k)
+                    np.testing.assert_array_equal(rows, expected_rows)
+                    np.testing.assert_allclose(scores, expected_scores, rtol=1e-9)
+        finally:
+            scorer.shutdown()
@@ -0,0 +1,46 @@
+import pickle
+import threading
+
+import pandas as pd
+
+import translation
+from translation import FakeTranslatorBackend, TranslationCache, TranslationService
+
+class FlakyBackend(FakeTranslatorBackend):
+    def translate(self, text, target_lang):
+        if text == "bad":
+            raise RuntimeError("upstream down")
+        return super().translate(text, target_lang)
+
+def test_batch_keeps_order_dedupes_and_caches():
+    backend = FakeTranslatorBackend()
+    service = TranslationService(backend=backend, cache=TranslationCache(), rate_limit=0)
+    assert service.translate_batch(["a", "b", "a", ""], "fr") == ["[fr] a", "[fr] b", "[fr] a", ""]
+    assert backend.calls == 2
+    assert service.translate_batch(["b"], "fr") == ["[fr] b"]
+    assert backend.calls == 2
+    service.shutdown()
+
+def test_failures_come_back_unchanged_and_are_not_cached():
+    service = TranslationService(backend=FlakyBackend(), cache=TranslationCache(), rate_limit=0, retries=2, retry_delay=0)
+    assert service.translate_batch(["bad", "good"], "es") == ["bad", "[es] good"]
+    assert service.cache.get_many(["bad"], "es") == {}
+    service.shutdown()
+
+def test_batches_share_one_worker_pool():
+    service = TranslationService(backend=FakeTranslatorBackend(), cache=TranslationCache(), max_workers=2, rate_limit=0)
+    before = threading.active_count()
+    for i in range(20):
+        service.translate_batch([f"{i}-{j}" for j in range(4)], "hi")
+    assert threading.active_count() - before <= 2
+    service.shutdown()
+
+def test_pretranslate_skips_the_source_language(tmp_path, monkeypatch):
+    model_path = tmp_path / "model.pkl"
+    with open(model_path, "wb") as f:
+        pickle.dump({"dataframe": pd.DataFrame({"RecipeName": ["Dal", "Poha", None]})}, f)
+    calls = []
+    monkeypatch.setattr(translation.translation_service, "translate_batch",
+                        lambda texts, lang: calls.append((tuple(texts), lang)))
+    translation.pretranslate_catalog(str(model_path), ["en", "fr", "hi"])
+    assert calls == [(("Dal", "Poha"), "fr"), (("Dal", "Poha"), "hi")]
@@ -0,0 +1,60 @@
+import random
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+from fastapi.testclient import TestClient
+
+import main
+from trending import CountMinSketch, TrendingCounter
+
+def test_count_min_sketch_never_undercounts():
+    sketch = CountMinSketch(width=64, depth=4)
+    rng = random.Random(7)
+    truth = Counter(f"view:{rng.randrange(500)}" for _ in range(5000))
+    for key, count in truth.items():
+        sketch.add(key, count)
+    keys = list(truth)
+    estimates = sketch.estimate_many(keys)
+    assert all(estimate >= truth[key] for key, estimate in zip(keys, estimates))
+    assert [sketch.estimate(key) for key in keys] == estimates.tolist()
+
+def test_top_ranks_by_weighted_actions_within_the_window():
+    counter = TrendingCounter(bucket_seconds=60, buckets=10, width=256, depth=4, heavy_hitters=8)
+    now = 10_000.0
+    counter.record(1, "view", count=4, now=now)      # 2.0
+    counter.record(2, "cook", now=now)               # 3.0
+    counter.record(3, "cook", count=5, now=now - 3600)  # outside a 10-minute window
+    counter.record(4, "share", now=now)              # not a trending action
+    top = counter.top(window_seconds=600, now=now)
+    assert [t["recipe_id"] for t in top] == [2, 1]
+    assert [t["recipe_id"] for t in counter.top(window_seconds=600, action="view", now=now)] == [1]
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "trending.npz")
+    counter = TrendingCounter(bucket_seconds=60, buckets=10, width=128, depth=2)
+    counter.record(5, "like", count=3)
+    counter.save(path)
+    restored = TrendingCounter(bucket_seconds=60, buckets=10, width=128, depth=2)
+    assert restored.load(path)
+    assert restored.top(600) == counter.top(600)
+    assert not TrendingCounter(bucket_seconds=60, buckets=10, width=256, depth=2).load(path)
+
+def test_admin_trending_names_are_joined_on_srno(monkeypatch):
+    counter = TrendingCounter(bucket_seconds=60, buckets=10, width=256, depth=4)
+    for srno, count in ((10, 3), (20, 2), (30, 1)):
+        counter.record(srno, "cook", count=count)
+    srnos = np.array([10, 20, 30])
+    # Mongo mode: the collection no longer has Srno 20, so the fetched rows skip it
+    catalog = {10: "Dal", 30: "Poha"}
+    monkeypatch.setattr(main, "trending", counter)
+    monkeypatch.setattr(main, "model_ready", lambda: True)
+    monkeypatch.setattr(main, "rows_for_srnos", lambda ids: pd.Index(srnos).get_indexer(np.asarray(ids)))
+    monkeypatch.setattr(main, "fetch_recipe_rows", lambda rows: pd.DataFrame(
+        [{"Srno": s, "RecipeName": catalog[s]} for s in srnos[rows] if s in catalog]))
+    main.app.dependency_overrides[main.require_admin] = lambda: None
+    try:
+        body = TestClient(main.app).get("/admin/trending").json()
+    finally:
+        main.app.dependency_overrides.pop(main.require_admin)
+    assert [(r["recipe_id"], r["recipe_name"]) for r in body["recipes"]] == [(10, "Dal"), (20, None), (30, "Poha")]
@@ -0,0 +1,54 @@
+import json
+import shutil
+
+import pytest
+
+from user_manager import UserManager
+
+def make_manager(tmp_path):
+    return UserManager(data_dir=str(tmp_path), fsync="always", compact_every=1000)
+
+def test_crash_after_snapshot_does_not_replay_logged_records(tmp_path):
+    manager = make_manager(tmp_path)
+    for i in range(3):
+        manager.add_interaction("view", f"recipe {i}")
+    old_log = manager.logpath
+    shutil.copy(old_log, tmp_path / "kept.log")
+    manager.compact()
+    manager.close()
+    shutil.copy(tmp_path / "kept.log", old_log)  # as if the crash came before the old log was removed
+
+    reloaded = make_manager(tmp_path)
+    assert [i["recipe_name"] for i in reloaded.get_profile()["interactions"]] == ["recipe 0", "recipe 1", "recipe 2"]
+    reloaded.close()
+
+def test_crash_before_snapshot_keeps_the_old_generation(tmp_path, monkeypatch):
+    manager = make_manager(tmp_path)
+    for i in range(3):
+        manager.add_interaction("view", f"recipe {i}")
+
+    def crash(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(manager, "_write_snapshot", crash)
+    with pytest.raises(OSError):
+        manager.compact()
+    manager.close()
+
+    reloaded = make_manager(tmp_path)
+    assert len(reloaded.get_profile()["interactions"]) == 3
+    reloaded.compact()
+    reloaded.close()
+    assert len(make_manager(tmp_path).get_profile()["interactions"]) == 3
+
+def test_torn_last_line_is_dropped_and_later_appends_survive(tmp_path):
+    manager = make_manager(tmp_path)
+    manager.add_interaction("like", "recipe 0")
+    manager.close()
+    with open(manager.logpath, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"op": "interaction", "interaction": {"recipe_name": "torn"}})[:20])
+
+    reloaded = make_manager(tmp_path)
+    assert [i["recipe_name"] for i in reloaded.get_profile()["interactions"]] == ["recipe 0"]
+    reloaded.add_interaction("cook", "recipe 1")
+    reloaded.close()
+    assert [i["recipe_name"] for i in make_manager(tmp_path).get_profile()["interactions"]] == ["recipe 0", "recipe 1"]
@@ -0,0 +1,51 @@
+import string
+import nltk
+from nltk.corpus import stopwords
+
+COOKING_STOPWORDS = {
+    "teaspoon", "tsp", "tablespoon", "tbsp", "cup", "gram", "gms", "g", "kg", "ml", "liter", "litre", "l", "lb", "oz", "pinch", "bunch", "sprig", "cloves",
+    "chopped", "sliced", "diced", "minced", "grated", "crushed", "beaten", "whisked", "sifted", "melted", "slit", "halved", "quartered", "cubed",
+    "peeled", "cored", "seeded", "washed", "cleaned", "dried", "roasted", "toasted", "fried", "boiled", "warm", "cold", "hot", "lukewarm",
+    "taste", "size", "small", "medium", "large", "fresh", "whole", "powder", "seeds", "oil", "leaves", "wedges", "fillet", "fillets", "boneless", "skinless",
+    "water", "salt", "ice"
+}
+
+_english_stopwords = None
+
+def english_stopwords():
+    # stopwords.words() re-reads the corpus on every call; load it once
+    global _english_stopwords
+    if _english_stopwords is None:
+        _english_stopwords = frozenset(stopwords.words('english'))
+    return _english_stopwords
+
+def clean_ingredient_text(text):
+    text = text.lower()
+    text = ''.join([i for i in text if not i.isdigit()])
+    text = text.replace("/", " ").replace(".", " ")
+    try:
+        tokens = nltk.word_tokenize(text)
+    except:
+        tokens = text.split()
+    english = english_stopwords()
+    clean_tokens = []
+    for word in tokens:
+        word = word.strip(string.punctuation)
+        if not word: continue
+        if word in COOKING_STOPWORDS: continue
+        if word in english: continue
+        if len(word) < 2: continue
+        clean_tokens.append(word)
+    return ' '.join(clean_tokens)
+
+def preprocess_text(text):
+    return clean_ingredient_text(text)
+
+def recipe_document(ingredients):
+    """Text the TF-IDF model indexes for one recipe's ingredient string."""
+    if ingredients is None:
+        return ""
+    text = str(ingredients)
+    if text.lower() == "nan":
+        return ""
+    return clean_ingredient_text(text.replace('[', ' ').replace(']', ' ').replace("'", ' '))
@@ -0,0 +1,234 @@
+import argparse
+import concurrent.futures
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from database import get_translations_collection
+from logging_setup import get_logger
+
+logger = get_logger("translation")
+
+# Locales the frontend ships (frontend/src/locales); the catalog itself is written in SOURCE_LANG
+SUPPORTED_LANGS = ["en", "es", "fr", "hi"]
+SOURCE_LANG = "en"
+
+TRANSLATE_MAX_WORKERS = int(os.getenv("TRANSLATE_MAX_WORKERS", "4"))
+# Upstream calls per second across all workers
+TRANSLATE_RATE_LIMIT = float(os.getenv("TRANSLATE_RATE_LIMIT", "5"))
+# Translations kept in memory per worker (LRU); the rest are a collection lookup away
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "50000"))
+
+# --- Backends ---
+
+class GoogleTranslatorBackend:
+    name = "google"
+
+    def translate(self, text: str, target_lang: str) -> str:
+        from deep_translator import GoogleTranslator
+        return GoogleTranslator(source='auto', target=target_lang).translate(text)
+
+class FakeTranslatorBackend:
+    """Offline backend for tests and load runs: tags the text with the target language."""
+    name = "fake"
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def translate(self, text: str, target_lang: str) -> str:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return f"[{target_lang}] {text}"
+
+# --- Cache ---
+
+def cache_key(text: str, target_lang: str) -> str:
+    return hashlib.sha1(f"{target_lang}\x00{text}".encode("utf-8")).hexdigest()
+
+class TranslationCache:
+    """
+    (text, target_lang) -> translation. Kept in a bounded in-memory LRU and written through
+    to the `translations` collection so it survives restarts and is shared by workers.
+    """
+
+    def __init__(self, collection=None, max_size=TRANSLATION_CACHE_SIZE):
+        self.collection = collection
+        self.max_size = max_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, texts, target_lang):
+        found = {}
+        pending = {}
+        with self._lock:
+            for text in texts:
+                key = cache_key(text, target_lang)
+                if key in self._memory:
+                    found[text] = self._memory[key]
+                    self._memory.move_to_end(key)
+                else:
+                    pending[key] = text
+
+        if pending and self.collection is not None:
+            try:
+                for doc in self.collection.find({"_id": {"$in": list(pending)}}):
+                    found[pending[doc["_id"]]] = doc["translated"]
+                    with self._lock:
+                        self._remember(doc["_id"], doc["translated"])
+            except Exception as e:
+                logger.warning(f"Translation cache lookup failed: {e}")
+
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+        return found
+
+    def _remember(self, key, translated):
+        self._memory[key] = translated
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def set_many(self, translations, target_lang):
+        if not translations:
+            return
+        docs = []
+        with self._lock:
+            for text, translated in translations.items():
+                key = cache_key(text, target_lang)
+                self._remember(key, translated)
+                docs.append({"_id": key, "text": text, "target_lang": target_lang, "translated": translated})
+        if self.collection is not None:
+            from pymongo import ReplaceOne
+            try:
+                self.collection.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs], ordered=False)
+            except Exception as e:
+                logger.warning(f"Translation cache write failed: {e}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._memory),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+# --- Service ---
+
+class RateLimiter:
+    """Spaces upstream calls at least 1/rate seconds apart across threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class TranslationService:
+    def __init__(self, backend=None, cache=None, max_workers=TRANSLATE_MAX_WORKERS,
+                 rate_limit=TRANSLATE_RATE_LIMIT, retries=3, retry_delay=1.0):
+        self.backend = backend or GoogleTranslatorBackend()
+        self.cache = cache or TranslationCache()
+        self.max_workers = max_workers
+        self.limiter = RateLimiter(rate_limit)
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _pool(self):
+        """One long-lived pool for upstream calls, shared by every batch; created on first use."""
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=max(1, self.max_workers), thread_name_prefix="translate-upstream")
+            return self._executor
+
+    def shutdown(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def _translate_one(self, text, target_lang):
+        for attempt in range(self.retries):
+            self.limiter.wait()
+            try:
+                translated = self.backend.translate(text, target_lang)
+                if translated:
+                    return translated
+                return None
+            except Exception as e:
+                logger.warning(f"Translate attempt {attempt + 1}/{self.retries} failed ({self.backend.name}): {e}")
+                if attempt < self.retries - 1:
+                    time.sleep(self.retry_delay * (attempt + 1))
+        return None
+
+    def translate_batch(self, texts, target_lang):
+        """
+        Translates a list of strings, preserving order. Duplicates and cached strings
+        cost nothing; misses go upstream concurrently under the rate limit. Strings
+        that fail to translate come back unchanged and are not cached.
+        """
+        unique = [t for t in dict.fromkeys(texts) if t and t.strip()]
+        results = self.cache.get_many(unique, target_lang)
+        missing = [t for t in unique if t not in results]
+
+        if missing:
+            fresh = {}
+            for text, translated in zip(missing, self._pool().map(lambda t: self._translate_one(t, target_lang), missing)):
+                if translated:
+                    fresh[text] = translated
+            self.cache.set_many(fresh, target_lang)
+            results.update(fresh)
+
+        return [results.get(t, t) for t in texts]
+
+    def translate(self, text, target_lang):
+        return self.translate_batch([text], target_lang)[0]
+
+translation_service = TranslationService(cache=TranslationCache(get_translations_collection()))
+
+def set_translator_backend(backend):
+    """Swaps the upstream translator, e.g. for FakeTranslatorBackend in tests."""
+    translation_service.backend = backend
+
+# --- Offline catalog pre-translation ---
+
+def pretranslate_catalog(model_path, langs=SUPPORTED_LANGS, chunk_size=200):
+    with open(model_path, 'rb') as f:
+        df = pickle.load(f)['dataframe']
+    names = [str(n) for n in df['RecipeName'].dropna().unique()]
+    langs = [lang for lang in langs if lang != SOURCE_LANG]  # the names are already in the source language
+    print(f"Pre-translating {len(names)} recipe names into {', '.join(langs)}...")
+    for lang in langs:
+        t0 = time.perf_counter()
+        for start in range(0, len(names), chunk_size):
+            translation_service.translate_batch(names[start:start + chunk_size], lang)
+        elapsed = time.perf_counter() - t0
+        print(f"  {lang}: done in {elapsed:.1f}s. Cache: {translation_service.cache.stats()}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill the translation cache with the catalog's recipe names.")
+    parser.add_argument("--model", default="recipe_recommender_model.pkl")
+    parser.add_argument("--langs", nargs="+", default=SUPPORTED_LANGS)
+    args = parser.parse_args()
+    pretranslate_catalog(args.model, args.langs)
@@ -0,0 +1,215 @@
+"""
+Trending recipes from the /interaction stream, in bounded memory.
+
+Time is cut into fixed buckets (an hour by default). Each bucket holds a count-min sketch
+of (action, recipe) events plus a small heavy-hitters table of the keys with the highest
+estimates seen in it. A window query adds up the sketches of the buckets it spans and ranks
+the union of their heavy hitters by the summed estimates. Memory is
+buckets x depth x width counters however many recipes or events there are.
+
+Counts are per process; with several workers each one sees its own share of the stream.
+State is saved to TRENDING_STATE_PATH on shutdown and loaded at startup.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from logging_setup import get_logger
+
+logger = get_logger("trending")
+
+TRENDING_BUCKET_SECONDS = int(os.getenv("TRENDING_BUCKET_SECONDS", "3600"))
+TRENDING_BUCKETS = int(os.getenv("TRENDING_BUCKETS", "168"))          # a week of hourly buckets
+TRENDING_SKETCH_WIDTH = int(os.getenv("TRENDING_SKETCH_WIDTH", "2048"))
+TRENDING_SKETCH_DEPTH = int(os.getenv("TRENDING_SKETCH_DEPTH", "4"))
+TRENDING_HEAVY_HITTERS = int(os.getenv("TRENDING_HEAVY_HITTERS", "256"))  # candidates tracked per bucket
+# Window the cold-start popularity prior is computed over, and how long a computed prior is reused
+TRENDING_PRIOR_WINDOW = int(os.getenv("TRENDING_PRIOR_WINDOW", "86400"))
+TRENDING_PRIOR_TTL = float(os.getenv("TRENDING_PRIOR_TTL", "60"))
+TRENDING_STATE_PATH = os.getenv("TRENDING_STATE_PATH", str(os.path.join(os.path.dirname(os.path.abspath(__file__)), "trending_state.npz")))
+
+# How much one event of each action counts towards a recipe's trending score
+TRENDING_ACTION_WEIGHTS = {"cook": 3.0, "like": 2.0, "view": 0.5, "unlike": -2.0}
+
+class CountMinSketch:
+    """depth x width counters; estimates never undercount and overcount by at most ~e/width of the total."""
+
+    def __init__(self, width=TRENDING_SKETCH_WIDTH, depth=TRENDING_SKETCH_DEPTH, counts=None):
+        if depth > 8:
+            raise ValueError("depth must be at most 8")
+        self.width = width
+        self.depth = depth
+        self.counts = counts if counts is not None else np.zeros((depth, width), dtype=np.int32)
+        self._rows = np.arange(depth)
+
+    def columns(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8 * self.depth).digest()
+        return np.frombuffer(digest, dtype=np.uint64) % np.uint64(self.width)
+
+    def add(self, key, count=1):
+        """Adds `count` to `key` and returns its new estimate."""
+        columns = self.columns(key)
+        self.counts[self._rows, columns] += count
+        return int(self.counts[self._rows, columns].min())
+
+    def estimate(self, key):
+        return int(self.counts[self._rows, self.columns(key)].min())
+
+    def estimate_many(self, keys):
+        """Estimates for a list of keys with one gather over the counters."""
+        if not keys:
+            return np.zeros(0, dtype=np.int64)
+        columns = np.array([self.columns(key) for key in keys], dtype=np.intp)  # [n_keys, depth]
+        return self.counts[self._rows, columns].min(axis=1)
+
+class Bucket:
+    def __init__(self, start, width, depth, capacity):
+        self.start = start
+        self.sketch = CountMinSketch(width, depth)
+        self.heavy = {}  # key -> estimate within this bucket
+        self.capacity = capacity
+
+    def add(self, key, count=1):
+        estimate = self.sketch.add(key, count)
+        if key in self.heavy or len(self.heavy) < self.capacity:
+            self.heavy[key] = estimate
+            return
+        smallest = min(self.heavy, key=self.heavy.get)
+        if estimate > self.heavy[smallest]:
+            del self.heavy[smallest]
+            self.heavy[key] = estimate
+
+def event_key(action, recipe_id):
+    return f"{action}:{recipe_id}"
+
+class TrendingCounter:
+    """Ring of `buckets` time buckets of `bucket_seconds` each; see the module docstring."""
+
+    def __init__(self, bucket_seconds=TRENDING_BUCKET_SECONDS, buckets=TRENDING_BUCKETS, width=TRENDING_SKETCH_WIDTH,
+                 depth=TRENDING_SKETCH_DEPTH, heavy_hitters=TRENDING_HEAVY_HITTERS, action_weights=TRENDING_ACTION_WEIGHTS):
+        self.bucket_seconds = bucket_seconds
+        self.n_buckets = buckets
+        self.width = width
+        self.depth = depth
+        self.heavy_hitters = heavy_hitters
+        self.action_weights = action_weights
+        self.events = 0
+        self._buckets = {}  # bucket start -> Bucket
+        self._prior = (0.0, {}, 1.0)  # (expires at, recipe id -> score, log1p of the top score)
+        self._lock = threading.Lock()
+
+    def _bucket_start(self, now):
+        return int(now // self.bucket_seconds) * self.bucket_seconds
+
+    def _expire(self, now):
+        oldest = self._bucket_start(now) - (self.n_buckets - 1) * self.bucket_seconds
+        for start in [s for s in self._buckets if s < oldest]:
+            del self._buckets[start]
+
+    def record(self, recipe_id, action, count=1, now=None):
+        """Counts one event. Actions without a trending weight are ignored."""
+        if action not in self.action_weights:
+            return
+        now = time.time() if now is None else now
+        start = self._bucket_start(now)
+        with self._lock:
+            bucket = self._buckets.get(start)
+            if bucket is None:
+                self._expire(now)
+                bucket = self._buckets[start] = Bucket(start, self.width, self.depth, self.heavy_hitters)
+            bucket.add(event_key(action, int(recipe_id)), count)
+            self.events += count
+
+    def _window(self, window_seconds, now):
+        """Summed sketch and candidate recipe ids over the buckets overlapping the last `window_seconds`."""
+        oldest = self._bucket_start(now - window_seconds)
+        buckets = [b for s, b in self._buckets.items() if s >= oldest]
+        if not buckets:
+            return None, set()
+        sketch = CountMinSketch(self.width, self.depth, np.sum([b.sketch.counts for b in buckets], axis=0, dtype=np.int64))
+        candidates = {int(key.split(":", 1)[1]) for b in buckets for key in b.heavy}
+        return sketch, candidates
+
+    def top(self, window_seconds=86400, limit=20, action=None, now=None):
+        """
+        Hottest recipes in the window as dicts with recipe_id, score and per-action counts,
+        highest first. With `action`, ranks by that action's count alone.
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            sketch, candidates = self._window(window_seconds, now)
+        if sketch is None:
+            return []
+        actions = list(self.action_weights)
+        candidates = sorted(candidates)
+        estimates = sketch.estimate_many([event_key(a, r) for r in candidates for a in actions]).reshape(len(candidates), len(actions))
+        if action:
+            scores = estimates[:, actions.index(action)].astype(np.float64)
+        else:
+            scores = estimates @ np.array([self.action_weights[a] for a in actions])
+        results = []
+        for i in np.flatnonzero(scores > 0):
+            counts = dict(zip(actions, estimates[i].tolist()))
+            results.append({"recipe_id": candidates[i], "score": round(float(scores[i]), 2), "counts": counts})
+        results.sort(key=lambda r: (-r["score"], r["recipe_id"]))
+        return results[:limit]
+
+    def popularity(self, recipe_ids, window_seconds=TRENDING_PRIOR_WINDOW, ttl=TRENDING_PRIOR_TTL):
+        """
+        Trending score per recipe id scaled to [0, 1] (log-damped, relative to the hottest recipe).
+        The ranking behind it is recomputed at most every `ttl` seconds.
+        """
+        expires, scores, ceiling = self._prior
+        if time.monotonic() > expires:
+            top = self.top(window_seconds, limit=self.heavy_hitters)
+            scores = {r["recipe_id"]: r["score"] for r in top}
+            ceiling = float(np.log1p(top[0]["score"])) if top else 1.0
+            self._prior = (time.monotonic() + ttl, scores, ceiling)
+        if not scores:
+            return np.zeros(len(recipe_ids), dtype=np.float32)
+        return np.array([np.log1p(scores.get(int(i), 0.0)) / ceiling for i in recipe_ids], dtype=np.float32)
+
+    def stats(self):
+        with self._lock:
+            return {"events": self.events, "buckets": len(self._buckets), "bucket_seconds": self.bucket_seconds,
+                    "sketch": [self.depth, self.width],
+                    "memory_bytes": sum(b.sketch.counts.nbytes for b in self._buckets.values())}
+
+    # --- Persistence ---
+
+    def save(self, path=TRENDING_STATE_PATH):
+        with self._lock:
+            starts = sorted(self._buckets)
+            counts = np.array([self._buckets[s].sketch.counts for s in starts]) if starts else np.zeros((0, self.depth, self.width), dtype=np.int32)
+            heavy = json.dumps({str(s): self._buckets[s].heavy for s in starts})
+            events = self.events
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, starts=np.array(starts, dtype=np.int64), counts=counts, heavy=np.array(heavy),
+                 events=np.array(events), meta=np.array([self.bucket_seconds, self.depth, self.width]))
+        os.replace(tmp_path, path)
+
+    def load(self, path=TRENDING_STATE_PATH):
+        """Restores saved buckets if they were written with the same bucket and sketch sizes. Returns True if loaded."""
+        if not os.path.exists(path):
+            return False
+        with np.load(path) as data:
+            if data["meta"].tolist() != [self.bucket_seconds, self.depth, self.width]:
+                logger.warning("Trending state was saved with different bucket/sketch settings; starting empty.")
+                return False
+            heavy = json.loads(str(data["heavy"]))
+            with self._lock:
+                self._buckets = {}
+                for start, counts in zip(data["starts"].tolist(), data["counts"]):
+                    bucket = Bucket(start, self.width, self.depth, self.heavy_hitters)
+                    bucket.sketch.counts = counts.astype(np.int32)
+                    bucket.heavy = heavy.get(str(start), {})
+                    self._buckets[start] = bucket
+                self.events = int(data["events"])
+                self._expire(time.time())
+        return True
+
+trending = TrendingCounter()
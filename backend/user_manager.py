@@ -1,28 +1,63 @@
 
+import atexit
 import json
 import os
+import threading
 from typing import Dict, List, Any
 from datetime import datetime
 
+# "always": fsync before add_interaction/update_profile return (no write-behind)
+# "batch":  buffered, fsync once per flushed batch (default)
+# "never":  buffered, left to the OS page cache
+FSYNC_POLICIES = ("always", "batch", "never")
+
 class UserManager:
-    def __init__(self, data_dir: str = "data", filename: str = "user_profile.json"):
+    """
+    File-backed single-user profile. State lives in a JSON snapshot plus an append-only log of
+    changes since it was taken. Writes are appended to the log (write-behind, flushed every
+    `flush_interval` seconds or `batch_size` records) and the log is folded back into the
+    snapshot every `compact_every` records, so a write costs the same however long the history.
+    Compaction starts a new log generation before the snapshot is written, and the snapshot
+    names the generation it pairs with, so a crash in between never replays records twice.
+    Only the newest `max_interactions` interactions are kept verbatim; older ones are rolled up
+    into `interaction_summary`.
+    """
+
+    def __init__(self, data_dir: str = "data", filename: str = "user_profile.json", fsync: str = "batch",
+                 flush_interval: float = 1.0, batch_size: int = 100, compact_every: int = 1000,
+                 max_interactions: int = 500):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}")
         self.data_dir = data_dir
         self.filepath = os.path.join(data_dir, filename)
+        self.log_generation = 0
+        self.logpath = self._log_path(0)
+        self.fsync = fsync
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.compact_every = compact_every
+        self.max_interactions = max_interactions
+
+        self._lock = threading.RLock()
+        self._wake = threading.Condition(self._lock)
+        self._pending: List[str] = []
+        self._log_records = 0
+        self._trimmed_on_load = False
+        self._closed = False
+
         self.profile = self._load_or_create_profile()
+        self._log = open(self.logpath, 'a', encoding='utf-8')
+        if self._log_records >= self.compact_every or self._trimmed_on_load:
+            self.compact()
 
-    def _load_or_create_profile(self) -> Dict[str, Any]:
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
-        
-        if os.path.exists(self.filepath):
-            try:
-                with open(self.filepath, 'r') as f:
-                    return json.load(f)
-            except json.JSONDecodeError:
-                print("Error decoding user profile. Resetting to default.")
-        
-        # Default Profile Structure
-        default_profile = {
+        self._flusher = None
+        if self.fsync != "always":
+            self._flusher = threading.Thread(target=self._flush_loop, name="user-manager-flush", daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
+
+    def _default_profile(self) -> Dict[str, Any]:
+        return {
             "name": "Guest Cook",
             "experience_level": "intermediate", # beginner, intermediate, advanced
             "dietary_preferences": [], # vegetarian, vegan, gluten-free, etc.
@@ -32,24 +67,175 @@ class UserManager:
                 "liked_cuisines": [],
                 "disliked_ingredients": []
             },
-            "interactions": [] # history of viewed/liked recipes
+            "interactions": [], # newest max_interactions of viewed/liked recipes
+            "interaction_summary": {"total": 0, "by_action": {}, "first_timestamp": None, "last_timestamp": None},
         }
-        self._save_profile(default_profile)
-        return default_profile
 
-    def _save_profile(self, profile: Dict[str, Any]):
-        with open(self.filepath, 'w') as f:
-            json.dump(profile, f, indent=4)
+    def _log_path(self, generation: int) -> str:
+        base = os.path.splitext(self.filepath)[0]
+        return f"{base}.log" if generation == 0 else f"{base}.{generation}.log"
+
+    def _load_or_create_profile(self) -> Dict[str, Any]:
+        if not os.path.exists(self.data_dir):
+            os.makedirs(self.data_dir)
+
+        profile = None
+        if os.path.exists(self.filepath):
+            try:
+                with open(self.filepath, 'r') as f:
+                    profile = json.load(f)
+            except json.JSONDecodeError:
+                print("Error decoding user profile. Resetting to default.")
+
+        if profile is None:
+            profile = self._default_profile()
+            self._write_snapshot(profile, 0)
+        self.log_generation = profile.pop("log_generation", 0)
+        self.logpath = self._log_path(self.log_generation)
+        if self.log_generation > 0 and os.path.exists(self._log_path(self.log_generation - 1)):
+            os.remove(self._log_path(self.log_generation - 1))  # crashed before compact() removed it; already in the snapshot
+        profile.setdefault("interactions", [])
+        profile.setdefault("interaction_summary", self._default_profile()["interaction_summary"])
+        self.profile = profile
+
+        # Replay changes made since the snapshot. A torn last line (crash mid-append) is cut off
+        # so the next append starts on a fresh line.
+        if os.path.exists(self.logpath):
+            complete = 0
+            with open(self.logpath, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    complete += len(line)
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self._apply(record)
+                    self._log_records += 1
+            if complete < os.path.getsize(self.logpath):
+                os.truncate(self.logpath, complete)
+        self._trimmed_on_load = self._roll_up(force=True)  # snapshots from before the cap may hold the full history
+        return profile
+
+    def _write_snapshot(self, profile: Dict[str, Any], log_generation: int):
+        tmp_path = self.filepath + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({**profile, "log_generation": log_generation}, f, indent=4)
+            f.flush()
+            if self.fsync != "never":
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.filepath)
+
+    # --- In-memory state ---
+
+    def _apply(self, record: Dict[str, Any]):
+        if record.get("op") == "profile":
+            for key, value in record["updates"].items():
+                if key in self.profile:
+                    self.profile[key] = value
+        elif record.get("op") == "interaction":
+            self.profile["interactions"].append(record["interaction"])
+            self._roll_up()
+
+    def _roll_up(self, force: bool = False):
+        """
+        Folds interactions beyond max_interactions into interaction_summary. Trims in chunks of
+        a quarter of the cap so the list shift is amortised across appends.
+        """
+        interactions = self.profile["interactions"]
+        slack = 0 if force else max(1, self.max_interactions // 4)
+        if len(interactions) <= self.max_interactions + slack:
+            return False
+        excess = len(interactions) - self.max_interactions
+        summary = self.profile["interaction_summary"]
+        for interaction in interactions[:excess]:
+            summary["total"] += 1
+            action = interaction.get("action", "unknown")
+            summary["by_action"][action] = summary["by_action"].get(action, 0) + 1
+            if summary["first_timestamp"] is None:
+                summary["first_timestamp"] = interaction.get("timestamp")
+            summary["last_timestamp"] = interaction.get("timestamp")
+        del interactions[:excess]
+        return True
+
+    # --- Log ---
+
+    def _append(self, record: Dict[str, Any]):
+        line = json.dumps(record, separators=(",", ":")) + "\n"
+        with self._lock:
+            self._apply(record)
+            self._pending.append(line)
+            if self.fsync == "always":
+                self._flush_locked()
+            elif len(self._pending) >= self.batch_size:
+                self._wake.notify()
+
+    def _flush_locked(self):
+        if not self._pending:
+            return
+        self._log.write("".join(self._pending))
+        self._log.flush()
+        if self.fsync != "never":
+            os.fsync(self._log.fileno())
+        self._log_records += len(self._pending)
+        self._pending.clear()
+        if self._log_records >= self.compact_every:
+            self.compact()
+
+    def _flush_loop(self):
+        with self._lock:
+            while not self._closed:
+                self._wake.wait(self.flush_interval)
+                try:
+                    self._flush_locked()
+                except OSError as e:
+                    print(f"Error writing user profile log: {e}")
+
+    def flush(self):
+        """Writes buffered changes to the log now."""
+        with self._lock:
+            self._flush_locked()
+
+    def compact(self):
+        """Writes the current profile as the new snapshot and switches to a fresh log generation."""
+        with self._lock:
+            generation = self.log_generation + 1
+            new_log = open(self._log_path(generation), 'w', encoding='utf-8')
+            try:
+                self._write_snapshot(self.profile, generation)  # already includes anything still buffered
+            except BaseException:
+                new_log.close()
+                raise
+            self._pending.clear()
+            self._log.close()
+            old_path = self.logpath
+            self._log, self.log_generation, self.logpath = new_log, generation, self._log_path(generation)
+            self._log_records = 0
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass  # removed at the next load instead
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._flush_locked()
+            self._log.close()
+            self._wake.notify_all()
+
+    # --- API ---
 
     def get_profile(self) -> Dict[str, Any]:
         return self.profile
 
     def update_profile(self, updates: Dict[str, Any]) -> Dict[str, Any]:
         """Updates basic info, dietary prefs, allergies, goals."""
-        for key, value in updates.items():
-            if key in self.profile:
-                self.profile[key] = value
-        self._save_profile(self.profile)
+        updates = {key: value for key, value in updates.items() if key in self.profile}
+        if updates:
+            self._append({"op": "profile", "updates": updates})
         return self.profile
 
     def add_interaction(self, action: str, recipe_name: str, details: Dict[str, Any] = None):
@@ -60,9 +246,7 @@ class UserManager:
             "recipe_name": recipe_name,
             "details": details or {}
         }
-        self.profile["interactions"].append(interaction)
-        # Keep interactions list manageable? For now, keep all.
-        self._save_profile(self.profile)
+        self._append({"op": "interaction", "interaction": interaction})
 
     def get_user_constraints(self):
         """Returns specific constraints for recipe filtering."""
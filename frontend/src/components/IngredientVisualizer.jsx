@@ -1,22 +1,28 @@
 import React, { useEffect, useState } from 'react';
 
-const IngredientVisualizer = ({ imageSrc, detectedItems }) => {
+const loadImage = (src) => new Promise((resolve, reject) => {
+  const img = new Image();
+  img.crossOrigin = "Anonymous"; // If needed for objectURLs or external images
+  img.onload = () => resolve(img);
+  img.onerror = reject;
+  img.src = src;
+});
+
+// imageSrcs are the uploaded photos in request order; item.image says which one item.bbox is in
+const IngredientVisualizer = ({ imageSrcs, detectedItems }) => {
   const [crops, setCrops] = useState({});
 
   useEffect(() => {
-    if (!imageSrc || !detectedItems || detectedItems.length === 0) return;
+    if (!imageSrcs || imageSrcs.length === 0 || !detectedItems || detectedItems.length === 0) return;
 
-    const img = new Image();
-    img.src = imageSrc;
-    img.crossOrigin = "Anonymous"; // If needed for objectURLs or external images
-    
-    img.onload = () => {
+    Promise.all(imageSrcs.map(loadImage)).then(images => {
       const newCrops = {};
       const canvas = document.createElement('canvas');
       const ctx = canvas.getContext('2d');
 
       detectedItems.forEach(item => {
-        if (item.bbox && item.bbox.length === 4) {
+        const img = images[item.image ?? 0];
+        if (img && item.bbox && item.bbox.length === 4) {
           const [ymin, xmin, ymax, xmax] = item.bbox;
           
           // Convert normalized (0-1000) to pixels
@@ -40,8 +46,8 @@ const IngredientVisualizer = ({ imageSrc, detectedItems }) => {
         }
       });
       setCrops(newCrops);
-    };
-  }, [imageSrc, detectedItems]);
+    }).catch(err => console.error("Could not load image for crops:", err));
+  }, [imageSrcs, detectedItems]);
 
   const itemsWithBbox = detectedItems.filter(item => item.bbox);
 
@@ -15,13 +15,13 @@ const RecipeCard = ({ recipe, onInteraction }) => {
       const newLikedState = !isLiked;
       setIsLiked(newLikedState);
       if (onInteraction) {
-          onInteraction(newLikedState ? 'like' : 'unlike', recipe.name);
+          onInteraction(newLikedState ? 'like' : 'unlike', recipe.name, { recipe_id: recipe.id });
       }
   };
 
   const handleView = (type, url) => {
       if (onInteraction) {
-          onInteraction('view', recipe.name, { type, url });
+          onInteraction('view', recipe.name, { type, url, recipe_id: recipe.id });
       }
   };
 
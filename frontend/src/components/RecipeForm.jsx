@@ -13,7 +13,7 @@ const RecipeForm = ({ onSubmit, isLoading }) => {
   const hiddenFileInput = useRef(null);
   const webcamRef = useRef(null);
   const [detectedItems, setDetectedItems] = useState([]);
-  const [imagePreview, setImagePreview] = useState(null);
+  const [imagePreviews, setImagePreviews] = useState([]);
   const [showCamera, setShowCamera] = useState(false);
 
   const handleSubmit = (e) => {
@@ -55,16 +55,16 @@ const RecipeForm = ({ onSubmit, isLoading }) => {
   }, [webcamRef]);
 
   const handleImageUpload = async (e) => {
-    const file = e.target.files[0];
-    if (!file) return;
+    // Fridge, pantry and counter can be picked together; they are detected in one request
+    const files = Array.from(e.target.files || []);
+    if (files.length === 0) return;
 
-    // Create preview
-    const objectUrl = URL.createObjectURL(file);
-    setImagePreview(objectUrl);
+    // Create previews
+    setImagePreviews(files.map(file => URL.createObjectURL(file)));
 
     setIsDetecting(true);
     const formData = new FormData();
-    formData.append('file', file);
+    files.forEach(file => formData.append('files', file));
     formData.append('text_input', ingredients);
 
     try {
@@ -105,7 +105,7 @@ const RecipeForm = ({ onSubmit, isLoading }) => {
   };
 
   const clearImage = () => {
-      setImagePreview(null);
+      setImagePreviews([]);
       setDetectedItems([]);
   };
 
@@ -176,6 +176,7 @@ const RecipeForm = ({ onSubmit, isLoading }) => {
               <input
                   type="file"
                   accept="image/*"
+                  multiple
                   ref={hiddenFileInput}
                   onChange={handleImageUpload}
                   style={{ display: 'none' }}
@@ -213,11 +214,13 @@ const RecipeForm = ({ onSubmit, isLoading }) => {
           </div>
 
           {/* Image Preview Section */}
-          {imagePreview && (
-              <div style={{ marginTop: '1rem', position: 'relative', display: 'inline-block' }}>
+          {imagePreviews.length > 0 && (
+              <div style={{ marginTop: '1rem', position: 'relative', display: 'inline-flex', gap: '0.5rem', flexWrap: 'wrap' }}>
+                  {imagePreviews.map((preview, idx) => (
                   <img 
-                      src={imagePreview} 
-                      alt="Preview" 
+                      key={idx}
+                      src={preview} 
+                      alt={`Preview ${idx + 1}`} 
                       style={{ 
                           maxHeight: '200px', 
                           maxWidth: '100%', 
@@ -225,10 +228,11 @@ const RecipeForm = ({ onSubmit, isLoading }) => {
                           border: '2px solid var(--border)' 
                       }} 
                   />
+                  ))}
                   <button
                       type="button"
                       onClick={clearImage}
-                      title="Remove Image"
+                      title="Remove Images"
                       style={{
                           position: 'absolute',
                           top: '-10px',
@@ -299,8 +303,8 @@ const RecipeForm = ({ onSubmit, isLoading }) => {
                   ))}
               </div>
           )}
-        {detectedItems.length > 0 && imagePreview && (
-              <IngredientVisualizer imageSrc={imagePreview} detectedItems={detectedItems} />
+        {detectedItems.length > 0 && imagePreviews.length > 0 && (
+              <IngredientVisualizer imageSrcs={imagePreviews} detectedItems={detectedItems} />
           )}
 
         </div>
@@ -13,7 +13,7 @@ const RecipeList = ({ recipes, onInteraction }) => {
   return (
     <div className="grid">
       {recipes.map((recipe, index) => (
-        <RecipeCard key={index} recipe={recipe} onInteraction={onInteraction} />
+        <RecipeCard key={recipe.id ?? index} recipe={recipe} onInteraction={onInteraction} />
       ))}
     </div>
   );
@@ -134,15 +134,18 @@ const CookingMode = () => {
         if (!translations[currentStep]?.[lang]) {
             setIsTranslating(true);
             try {
-                const text = recipe.instructions[currentStep];
-                const res = await axios.post(`${API_BASE_URL}/translate`, {
-                    text: text,
+                // Translate every step in one round trip so later steps are instant
+                const res = await axios.post(`${API_BASE_URL}/translate/batch`, {
+                    texts: recipe.instructions,
                     target_lang: lang
                 });
-                setTranslations(prev => ({
-                    ...prev,
-                    [currentStep]: { ...prev[currentStep] || {}, [lang]: res.data.translated_text }
-                }));
+                setTranslations(prev => {
+                    const next = { ...prev };
+                    res.data.translated_texts.forEach((text, step) => {
+                        next[step] = { ...next[step] || {}, [lang]: text };
+                    });
+                    return next;
+                });
             } catch (err) {
                 console.error("Translation failed", err);
             } finally {
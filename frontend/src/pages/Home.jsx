@@ -1,6 +1,5 @@
 
 import React, { useState } from 'react';
-import axios from 'axios';
 import RecipeForm from '../components/RecipeForm';
 import RecipeList from '../components/RecipeList';
 
@@ -10,26 +9,73 @@ const Home = ({ userProfile, onInteraction }) => {
   const [recipes, setRecipes] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [enriching, setEnriching] = useState(false);
+
+  // Applies one line of the /recommend/stream NDJSON response
+  const applyEvent = (event) => {
+    switch (event.type) {
+      case 'recipes':
+        setRecipes(event.recipes);
+        setLoading(false);
+        break;
+      case 'enrichment':
+        setRecipes(prev => (prev || []).map(r => r.id === event.id ? { ...r, youtube_link: event.youtube_link } : r));
+        break;
+      case 'translation': {
+        const byId = Object.fromEntries(event.recipes.map(t => [t.id, t]));
+        setRecipes(prev => (prev || []).map(r => byId[r.id] ? { ...r, ...byId[r.id] } : r));
+        break;
+      }
+      case 'ai_recipe':
+        setRecipes(prev => [event.recipe, ...(prev || [])]);
+        break;
+      case 'error':
+        throw new Error(event.detail);
+      default:
+        break;
+    }
+  };
 
   const fetchRecommendations = async (inputData) => {
     setLoading(true);
+    setEnriching(true);
     setError(null);
     setRecipes(null);
 
     try {
-      const response = await axios.post(`${API_BASE_URL}/recommend`, inputData, {
+      const token = localStorage.getItem('auth_token');
+      const response = await fetch(`${API_BASE_URL}/recommend/stream`, {
+        method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-        }
+          ...(token ? { Authorization: `Bearer ${token}` } : {}),
+        },
+        body: JSON.stringify(inputData),
       });
-      console.log("API Response:", response.data);
-      setRecipes(response.data);
+      if (!response.ok) {
+        const body = await response.json().catch(() => ({}));
+        throw new Error(body.detail || response.statusText);
+      }
+
+      // Render the ranked cards as soon as they arrive, then patch in links and the AI recipe
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => applyEvent(JSON.parse(line)));
+      }
     } catch (err) {
       console.error("API Error:", err);
-      const errorMessage = err.response?.data?.detail || err.message || 'Unknown error';
+      const errorMessage = err.message || 'Unknown error';
       setError(`Failed to fetch recommendations: ${errorMessage}. Please ensure the backend is running on port 8010.`);
     } finally {
       setLoading(false);
+      setEnriching(false);
     }
   };
 
@@ -51,7 +97,12 @@ const Home = ({ userProfile, onInteraction }) => {
 
       {!loading && recipes && (
         <div style={{ marginTop: '3rem' }}>
-           <h2 style={{ textAlign: 'center', marginBottom: '2rem', fontSize: '2rem' }}>Your Recommendations</h2>
+           <h2 style={{ textAlign: 'center', marginBottom: enriching ? '0.5rem' : '2rem', fontSize: '2rem' }}>Your Recommendations</h2>
+           {enriching && (
+             <p style={{ textAlign: 'center', marginBottom: '2rem', color: 'var(--text-muted)' }}>
+               Finding videos and more ideas...
+             </p>
+           )}
            <RecipeList 
               recipes={recipes} 
               onInteraction={onInteraction}